@@ -1,6 +1,9 @@
-import math
 import numpy as np
-from tqdm.auto import tqdm
+
+try:
+    from numba import njit
+except ImportError: # senza numba il serbatoio della PdC centralizzata è simulato con lo stesso ciclo in Python puro
+    njit = None
 
 def hp_energy_consumption(cacer_config, phi_hc_nd_ac, n_intervals, months, hours, t_ext, t_int, rh_ext, delta_t, monthly_range_heat = range(1, 13), monthly_range_cool = range(5, 10), scheduling = range(0, 24)):
 
@@ -37,62 +40,56 @@ def hp_energy_consumption(cacer_config, phi_hc_nd_ac, n_intervals, months, hours
     if cacer_config.hvac_type == 'autonomous':
         
         hp_energy_consumption_array = np.zeros((n_intervals, cacer_config.user_numbers))
+
+        months_array = np.asarray(months)[:n_intervals]
+        hours_array = np.asarray(hours)[:n_intervals]
         
         for user in range(cacer_config.user_numbers):
-            
-            for n in tqdm(range(n_intervals), desc = f"  Iterations"):
-
-                hp_energy_consumption_array[n, user] = hp_performances_autonomous(cacer_config.users[user], 
-                                                                                  phi_hc_nd_ac[n, user], 
-                                                                                  t_ext[n], 
-                                                                                  t_int[n, user], 
-                                                                                  rh_ext[n], 
-                                                                                  months[n],
-                                                                                  hours[n], 
-                                                                                  cacer_config.hvac_type,
-                                                                                  monthly_range_heat,
-                                                                                  monthly_range_cool,
-                                                                                  scheduling)
+
+            # Prestazioni della PdC valutate su tutti gli intervalli insieme
+            hp_energy_consumption_array[:, user] = hp_performances_autonomous(cacer_config.users[user], 
+                                                                              phi_hc_nd_ac[:n_intervals, user], 
+                                                                              t_ext[:n_intervals], 
+                                                                              t_int[:n_intervals, user], 
+                                                                              rh_ext[:n_intervals], 
+                                                                              months_array,
+                                                                              hours_array, 
+                                                                              cacer_config.hvac_type,
+                                                                              monthly_range_heat,
+                                                                              monthly_range_cool,
+                                                                              scheduling)
 
     #--------------------------------------- CENTRALIZED HP SYSTEM ---------------------------------------
 
     else:
 
-        hp_energy_consumption_array = np.empty(n_intervals, cacer_config.user_numbers)
+        hp_energy_consumption_array = np.zeros((n_intervals, cacer_config.user_numbers))
 
         # ????
         if delta_t == "1H":
             time_interval = 3600 # 1 hour
         else:
             time_interval = 900 # 15 minutes
-
-        total_th_load = np.zeros(n_intervals)
-
-        compressor_status = 0
         
         t_cut_in = cacer_config.users[0].hp_aux.t_cut_in # [C] Temperatura di cut-in del compressore
         t_cut_off = t_cut_in + cacer_config.users[0].hp_aux.t_dead_band # [C] Temperatura di cut-off del compressore
-        t_water_tank = t_cut_off # [C] Temperatura iniziale dell'acqua nel serbatoio
 
         # Sum over all users of the thermal load
+        total_th_load = np.zeros(n_intervals)
         for i in range(phi_hc_nd_ac.shape[1]):
-            total_th_load = total_th_load + phi_hc_nd_ac[:, i]
+            total_th_load = total_th_load + phi_hc_nd_ac[:n_intervals, i]
         
-        for n in tqdm(range(n_intervals), desc = "Simulate centralized heat pump system over each time interval"):
-            
-            hp_energy_consumption_array[n], t_water_tank, compressor_status = hp_performances_centralized(cacer_config.users[0], 
-                                                                                                          t_ext[n], 
-                                                                                                          t_water_tank, 
-                                                                                                          rh_ext[n], 
-                                                                                                          months[n], 
-                                                                                                          cacer_config.hvac_type, 
-                                                                                                          total_th_load[n], 
-                                                                                                          t_cut_off, 
-                                                                                                          t_cut_off, 
-                                                                                                          t_cut_in, 
-                                                                                                          time_interval, 
-                                                                                                          compressor_status
-                                                                                                          )
+        p_el, t_water_tank = hp_centralized_tank_simulation(cacer_config.users[0], 
+                                                            total_th_load, 
+                                                            t_ext[:n_intervals], 
+                                                            rh_ext[:n_intervals], 
+                                                            np.asarray(months)[:n_intervals], 
+                                                            t_cut_off, 
+                                                            t_cut_in, 
+                                                            time_interval)
+
+        # Il consumo del sistema centralizzato è riportato per ciascun utente
+        hp_energy_consumption_array[:] = p_el[:, None]
 
     print("")
 
@@ -106,262 +103,285 @@ def hp_performances_autonomous(hp_user, phi_hc_nd_ac, t_ext, t_int, rh_ext, mont
     This function calculates the energy consumption of the heat pump system
     for a given user, in autonomous mode.
 
+    The inputs can be scalars or arrays with one value per time interval (e.g. a whole year of 15-minute intervals):
+    the month/hour/schedule logic and the temperature ranges are applied with masks, so all the intervals are evaluated in one call.
+
     Parameters
     ----------
     hp_user : object
         Configuration of the user
-    phi_hc_nd_ac : float
+    phi_hc_nd_ac : float or np.ndarray
         Thermal power to Node I
-    t_ext : float
+    t_ext : float or np.ndarray
         Temperature of the exterior air
-    t_int : float
+    t_int : float or np.ndarray
         Temperature of the interior air
-    rh_ext : float
+    rh_ext : float or np.ndarray
         Relative humidity of the exterior air
-    month : int
+    month : int or np.ndarray
         Month of the year
+    hour : int or np.ndarray
+        Hour of the day
     mode : str
         HVAC mode ('heating' or 'cooling')
 
     Returns
     -------
-    p_el : float
+    p_el : float or np.ndarray
         Energy consumption of the heat pump system
     """
 
+    phi_hc_nd_ac, t_ext, t_int, rh_ext = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (phi_hc_nd_ac, t_ext, t_int, rh_ext)])
+    month = np.broadcast_to(np.asarray(month).astype(int), phi_hc_nd_ac.shape)
+    hour = np.broadcast_to(np.asarray(hour).astype(int), phi_hc_nd_ac.shape)
+
+    p_el = np.zeros(phi_hc_nd_ac.shape)
+
     #--------------------------------- Controlli iniziali ---------------------------------
 
     monthly_range_heat_eff  = [x for x in monthly_range_heat if x not in monthly_range_cool]
 
-    if (phi_hc_nd_ac == 0 
-        or (int(month) not in monthly_range_cool and phi_hc_nd_ac < 0)
-        or (int(month) not in monthly_range_heat_eff and phi_hc_nd_ac > 0)
-        or (int(hour) not in scheduling)
-        ):
-        
-        return 0
+    active = ((phi_hc_nd_ac != 0)
+              & ~(~np.isin(month, list(monthly_range_cool)) & (phi_hc_nd_ac < 0))
+              & ~(~np.isin(month, monthly_range_heat_eff) & (phi_hc_nd_ac > 0))
+              & np.isin(hour, list(scheduling))
+              )
 
-    else:
-        
-        #--------------------------------- Temperatura esterna > -8 °C ---------------------------------
-        
-        if t_ext > -8: 
+    #--------------------------------- Temperatura esterna > -8 °C ---------------------------------
 
-            eta = hp_efficiency(hp_user, t_ext, t_int, month, mode, phi_hc_nd_ac, monthly_range_cool) # [-] Efficienza PdC autonoma (COP = thermal load / electric load)
-            
-            q_max = hp_power_curve_max(hp_user, t_ext, t_int, month, phi_hc_nd_ac, monthly_range_cool) # [W] Potenza termica massima erogabile
+    hp = active & (t_ext > -8)
 
-            # si pongono in valore assoluto il carico termico dell'edificio e la potenza termica massima erogabile
-            if phi_hc_nd_ac < 0 or q_max < 0:  
-                phi_hc_nd_ac = - phi_hc_nd_ac
-                q_max = - q_max
+    if np.any(hp):
 
-            #--------------------------------- External temperature in range (-8; 5] °C ---------------------------------
+        phi = phi_hc_nd_ac[hp]
 
-            if t_ext <= 5: 
+        eta = np.asarray(hp_efficiency(hp_user, t_ext[hp], t_int[hp], month[hp], mode, phi, monthly_range_cool), dtype=float) # [-] Efficienza PdC autonoma (COP = thermal load / electric load)
+        
+        q_max = np.asarray(hp_power_curve_max(hp_user, t_ext[hp], t_int[hp], month[hp], phi, monthly_range_cool), dtype=float) # [W] Potenza termica massima erogabile
 
-                # Su Design Builder è attiva l'opzione timed-defrost sotto i 5 gradi
-                pe_defrost, heat_cap_mult, input_pw_mult = defrost_op(t_ext, rh_ext)    # [W] Potenza elettrica aggiuntiva per defrost
-                
-                q_max = q_max * heat_cap_mult # [W] Potenza massima di pompa di calore corretta per defrost
-                
-                eta = eta / input_pw_mult # [-] Efficienza corretta per defrost (COP = thermal load / electric load)
+        # si pongono in valore assoluto il carico termico dell'edificio e la potenza termica massima erogabile
+        negative = (phi < 0) | (q_max < 0)
+        phi = np.where(negative, -phi, phi)
+        q_max = np.where(negative, -q_max, q_max)
 
-            #--------------------------------- External temperature in range (5; : ) °C ---------------------------------
-            
-            else:
-                
-                pe_defrost = 0 # the defrost is not active
-            
-            #--------------------------------- Electric power consumption calculation ---------------------------------
+        #--------------------------------- External temperature in range (-8; 5] °C ---------------------------------
 
-            ##################################################################################
-            # Annullare la potenza quando non è attivo il periodo di riscaldamento o di raffrescamento!!!
-            # Questo lo si può fare anche esternamente annuallando phi_hc_nd_ac, attenzione però perchè rimane pe_defros e q_max!!!
-            ##################################################################################
+        # Su Design Builder è attiva l'opzione timed-defrost sotto i 5 gradi; sopra i 5 gradi il defrost non è attivo
+        defrost = t_ext[hp] <= 5
+        pe_defrost = np.zeros(phi.shape)
 
-            # [W] Fabbisogno termico <= Potenza massima PdC
-            if phi_hc_nd_ac <= q_max: 
-                
-                # eta = thermal power / thermal load [-]
-                p_el = phi_hc_nd_ac / eta + pe_defrost # [W]
+        if np.any(defrost):
+            pe_defrost[defrost], heat_cap_mult, input_pw_mult = defrost_op(t_ext[hp][defrost], rh_ext[hp][defrost]) # [W] Potenza elettrica aggiuntiva per defrost
             
-            # [W] Fabbisogno termico > Potenza massima PdC
-            else:
+            q_max[defrost] = q_max[defrost] * heat_cap_mult # [W] Potenza massima di pompa di calore corretta per defrost
+            
+            eta[defrost] = eta[defrost] / input_pw_mult # [-] Efficienza corretta per defrost (COP = thermal load / electric load)
 
-                # q_max / eta = electri load at the maximum thermal load [W]
-                # phi_hc_nd_ac - q_max = electrical load with auxiliary generator (eta = 1)
-                # pe_defrost = electrical load due to defrost
+        #--------------------------------- Electric power consumption calculation ---------------------------------
 
-                p_el = (q_max / eta + (phi_hc_nd_ac - q_max)) + pe_defrost # [W]
-        
-        #--------------------------------- Temperatura esterna <= -8 °C ---------------------------------
+        # [W] Fabbisogno termico <= Potenza massima PdC: eta = thermal power / thermal load [-]
+        # [W] Fabbisogno termico > Potenza massima PdC: q_max / eta = electric load at the maximum thermal load [W],
+        #     phi_hc_nd_ac - q_max = electrical load with auxiliary generator (eta = 1), pe_defrost = electrical load due to defrost
+        p_el[hp] = np.where(phi <= q_max, 
+                            phi / eta + pe_defrost, 
+                            (q_max / eta + (phi - q_max)) + pe_defrost) # [W]
+    
+    #--------------------------------- Temperatura esterna <= -8 °C ---------------------------------
 
-        else:
-            
-            q_max = hp_user.hp_aux.q_heater # [W] Potenza massima di pompa di calore
-            
-            eta = 1 # ????
-            
-            pe_defrost = 0 # the defrost is not active
-            
-            # in this case the p_el is equal to the thermal load ????
-            
-            ##################################################################################################
-            # così però non si tiene conto della potenza massima erogabile dal sistema di pompa di calore...
-            ##################################################################################################
+    # in this case the p_el is equal to the thermal load (eta = 1) ????
+
+    ##################################################################################################
+    # così però non si tiene conto della potenza massima erogabile dal sistema di pompa di calore...
+    ##################################################################################################
 
-            p_el = phi_hc_nd_ac / eta # [W]
+    aux = active & ~(t_ext > -8)
+    p_el[aux] = phi_hc_nd_ac[aux] / 1 # [W]
 
-    return p_el
+    return p_el[()]
 
 ##################################################################################################################################################################################################
 
-def hp_performances_centralized(hp_user, t_ext, t_water_tank, rh_ext, month, mode, total_th_load, T_cut_off, T_cut_in, time_interval, compressor_status, monthly_range_heat = (1, 12), monthly_range_cool = (5, 9)):
+def hp_centralized_tank_simulation(hp_user, total_th_load, t_ext, rh_ext, months, T_cut_off, T_cut_in, time_interval, t_water_tank = None, compressor_status = 0, monthly_range_cool = (5, 9)):
 
     """
-    Calcola le prestazioni del sistema di pompa di calore centralizzato.
+    Simula il sistema di pompa di calore centralizzato con accumulo termico su tutti gli intervalli.
+    In riscaldamento con accumulo termico il compressore segue un'isteresi sulla temperatura del serbatoio: acceso, la pompa di calore
+    eroga la potenza massima e il serbatoio si scalda dell'eccesso rispetto al carico (se il carico supera la potenza massima interviene
+    la resistenza q_heater e il serbatoio non cambia), fino a T_cut_off dove il compressore si spegne; spento, il serbatoio copre il carico
+    e si raffredda fino a T_cut_in, dove il compressore si riaccende. Solo lo stato del serbatoio e del compressore è simulato in sequenza,
+    con un ciclo compilato con numba se disponibile, mentre efficienza e consumi sono calcolati su tutti gli intervalli insieme.
 
     Parameters
     ----------
     hp_user : HpUserConfig
         Configurazione utente del sistema di pompa di calore
-    t_ext : float
+    total_th_load : np.ndarray
+        Carico termico totale dell'edificio per ciascun intervallo [W]
+    t_ext : np.ndarray
         Temperatura esterna dell'aria [C]
-    t_water_tank : float
-        Temperatura dell'acqua nel serbatoio [C]
-    rh_ext : float
+    rh_ext : np.ndarray
         Umidita relativa esterna dell'aria [%]
-    month : int
-        Mese dell'anno considerato
-    mode : str
-        Modalita' di funzionamento del sistema di pompa di calore
-        'heating' o 'cooling'
-    total_th_load : float
-        Carico termico totale dell'edificio [W]
+    months : np.ndarray
+        Mese di ciascun intervallo
     T_cut_off : float
         Temperatura di cut-off del compressore [C]
     T_cut_in : float
         Temperatura di cut-in del compressore [C]
     time_interval : float
         Intervallo di tempo considerato per la simulazione [s]
-    compressor_status : int
-        Stato del compressore (0: spento, 1: acceso)
+    t_water_tank : float, optional
+        Temperatura iniziale dell'acqua nel serbatoio [C]; se None è pari a T_cut_off
+    compressor_status : int, optional
+        Stato iniziale del compressore (0: spento, 1: acceso)
 
     Returns
     -------
-    p_el : float
-        Consumo elettrico del sistema di pompa di calore [W]
-    t_water_tank : float
-        Temperatura dell'acqua nel serbatoio [C]
-    compressor_status : int
-        Stato del compressore (0: spento, 1: acceso)
+    p_el : np.ndarray
+        Consumo elettrico del sistema di pompa di calore per ciascun intervallo [W]
+    t_water_tank : np.ndarray
+        Temperatura dell'acqua nel serbatoio alla fine di ciascun intervallo [C]
     """
-    Pel_fans = hp_user.hp_aux.pel_fans # [W] Consumo elettrico ventilatori PdC centralizzata, da simulazione di Design Builder
-    eta_fans = hp_user.hp_aux.eta_fans # [W/W] Efficienza ventilatori PdC centralizzata, da simulazione di Design Builder
-    
-    Pel_pumps = hp_user.hp_aux.pel_pumps # [W] Consumo elettrico pompe di calore, da simulazione di Design Builder
-    eta_pumps = hp_user.hp_aux.eta_pumps # [W/W] Efficienza pompe del sistema, da simulazione di Design Builder
-    
-    cp_water = hp_user.hp_aux.cp_water # [J/(kg.K)]
-    m_water_tank = hp_user.hp_aux.v_tank*hp_user.hp_aux.rho_water
-    
-    q_heater = hp_user.hp_aux.q_heater
+    total_th_load = np.asarray(total_th_load, dtype=float)
+    t_ext = np.asarray(t_ext, dtype=float)
+    months = np.asarray(months).astype(int)
+
+    if t_water_tank is None:
+        t_water_tank = T_cut_off # [C] Temperatura iniziale dell'acqua nel serbatoio
+
+    aux = hp_user.hp_aux
+    m_water_tank = aux.v_tank*aux.rho_water
+
+    monthly_range_cool = range(monthly_range_cool[0], monthly_range_cool[1] + 1)
+    cooling = np.isin(months, list(monthly_range_cool)) # Modalità raffrescamento PdC centralizzata
+    storage = ~cooling & (aux.thermal_storage == True) # Modalità riscaldamento PdC centralizzata con accumulo termico
+
+    #--------------------------------- Stato del serbatoio e del compressore ---------------------------------
+
+    hp_params = hp_user.hp_heating.hp_parameters
+    alpha = np.array([hp_params[f'alpha{i}_power'] for i in range(1, 10)], dtype=float)
+
+    q_max = np.zeros(len(t_ext)) # [W] Potenza massima di pompa di calore negli intervalli con accumulo termico
+    status = np.zeros(len(t_ext), dtype=np.int64) # Stato del compressore all'inizio di ciascun intervallo
+    t_water_tank_end = np.zeros(len(t_ext)) # Temperatura dell'acqua nel serbatoio alla fine di ciascun intervallo
+
+    tank_loop = _tank_hysteresis_loop_compiled if njit is not None else _tank_hysteresis_loop
+    tank_loop(alpha, float(hp_params['q_power']), float(hp_params['p_th_nom']), t_ext, total_th_load, storage, m_water_tank*aux.cp_water/time_interval, 
+              float(T_cut_in), float(T_cut_off), float(t_water_tank), int(compressor_status), q_max, status, t_water_tank_end)
+
+    t_water_tank_start = np.concatenate(([t_water_tank], t_water_tank_end[:-1]))
+
+    #--------------------------------- Consumo elettrico PdC centralizzata ---------------------------------
 
     t_ext_wb = wet_bulb_temperature(t_ext, rh_ext) # [C] Temperatura bulbo umido esterno
-    eta = hp_efficiency(hp_user, t_ext_wb, t_water_tank, month, mode) # [-] Efficienza PdC centralizzata
-    Q_max = hp_power_curve_max(hp_user, t_ext, t_water_tank, month) # [W] Potenza massima di pompa di calore
+    eta = hp_efficiency(hp_user, t_ext_wb, t_water_tank_start, months, 'centralized', monthly_range_cool = monthly_range_cool) # [-] Efficienza PdC centralizzata
 
-    
-    ##################################################################################
-    # Attivare anche limitazione su phi_hc_nd_ac
-    ##################################################################################
+    p_el = np.select([cooling, 
+                      ~storage, 
+                      (status == 1) & (total_th_load > q_max), 
+                      status == 1], 
+                     [np.abs(total_th_load)/eta+aux.pel_fans*aux.eta_fans+aux.pel_pumps*aux.eta_pumps, # raffrescamento
+                      (total_th_load)/eta+aux.pel_fans*aux.eta_fans+aux.pel_pumps*aux.eta_pumps, # riscaldamento senza accumulo termico
+                      aux.q_heater+aux.pel_fans*aux.eta_fans+aux.pel_pumps*aux.eta_pumps, # compressore acceso, carico superiore alla potenza massima
+                      q_max/eta+aux.pel_fans*aux.eta_fans+aux.pel_pumps*aux.eta_pumps], # compressore acceso
+                     aux.pel_pumps*aux.eta_pumps) # compressore spento
 
-    # Calcolo consumo elettrico PdC centralizzata
-    if int(month)>=monthly_range_cool[0] and int(month)<= monthly_range_cool[1]:
-        
-        # Modalità raffrescamento PdC centralizzata
-        if total_th_load<0:
-            total_th_load=-total_th_load
-        p_el=(total_th_load)/eta+Pel_fans*eta_fans+Pel_pumps*eta_pumps
-    
-    else:
-        # Modalità riscaldamento PdC centralizzata
-        if hp_user.hp_aux.thermal_storage==True:
-            
-            # Gestione accumulo termico
-            if total_th_load>Q_max and compressor_status==1:
-                p_el=q_heater+Pel_fans*eta_fans+Pel_pumps*eta_pumps
+    return p_el, t_water_tank_end
+
+##################################################################################################################################################################################################
+
+def _tank_hysteresis_loop(alpha, q_power, p_th_nom, t_ext, total_th_load, storage, tank_capacity, T_cut_in, T_cut_off, t_water_tank, compressor_status, q_max_out, status_out, t_water_tank_out):
+
+    """
+    Time loop of the tank / compressor state machine. With the compressor on, the tank is heated by the maximum power of the heat pump
+    minus the load (unchanged if the load exceeds the maximum power) and the compressor switches off at T_cut_off; with the compressor
+    off, the tank covers the load and cools down, and the compressor switches on at T_cut_in. Intervals without storage leave the state
+    unchanged. Written so that it runs both in pure Python and compiled with numba. The maximum power of the heat pump (hp_operating_curve in heating mode) depends on the tank temperature,
+    so it is computed in the loop; tank_capacity is m_water_tank * cp_water / time_interval [W/K].
+    """
+    a1, a2, a3, a4, a5, a6, a7, a8, a9 = alpha[0], alpha[1], alpha[2], alpha[3], alpha[4], alpha[5], alpha[6], alpha[7], alpha[8]
+
+    for n in range(len(t_ext)):
+
+        status_out[n] = compressor_status
+
+        if storage[n]:
+
+            x = t_ext[n]
+            y = t_water_tank
+            q_max = p_th_nom*(a1 * x + a2 * x**2 + a3 * x**3 + a4 * y + a5 * y**2 + a6 * y**3 + a7 * y*x + a8 * y*x**2 + a9 * x*y**2 + q_power)
+            q_max_out[n] = q_max
+
+            if compressor_status == 1:
                 
-                if t_water_tank>=T_cut_off:
-                    compressor_status=0 # Spegnimento compressore
-            
-            elif total_th_load<=Q_max and compressor_status==1:
-                p_el= Q_max/eta+Pel_fans*eta_fans+Pel_pumps*eta_pumps
-                t_water_tank= t_water_tank+(Q_max-total_th_load)/(m_water_tank*cp_water/time_interval)
+                if total_th_load[n] <= q_max:
+                    t_water_tank = t_water_tank+(q_max-total_th_load[n])/tank_capacity
                 
-                if t_water_tank>=T_cut_off:
-                    compressor_status=0 # Spegnimento compressore
-            
-            elif compressor_status==0:
-                p_el=Pel_pumps*eta_pumps
-                t_water_tank= t_water_tank-(total_th_load)/(m_water_tank*cp_water/time_interval)
+                if t_water_tank >= T_cut_off:
+                    compressor_status = 0 # Spegnimento compressore
+
+            else:
+                t_water_tank = t_water_tank-(total_th_load[n])/tank_capacity
                 
-                if t_water_tank<=T_cut_in:
-                    compressor_status=1 # Accensione compressore
-        else:
-            p_el = (total_th_load)/eta+Pel_fans*eta_fans+Pel_pumps*eta_pumps
+                if t_water_tank <= T_cut_in:
+                    compressor_status = 1 # Accensione compressore
+
+        t_water_tank_out[n] = t_water_tank
+
+    return t_water_tank, compressor_status
 
-    return p_el, t_water_tank, compressor_status
+_tank_hysteresis_loop_compiled = njit(cache=True)(_tank_hysteresis_loop) if njit is not None else None
 
 ##################################################################################################################################################################################################
 
-def hp_efficiency(hp_user, t_ext, t_int, month, mode, phi_hc_nd_ac, monthly_range_cool = range(5, 10)):
+def hp_efficiency(hp_user, t_ext, t_int, month, mode, phi_hc_nd_ac = None, monthly_range_cool = range(5, 10)):
 
     """
     Calcola l'efficienza del sistema di pompa di calore.
+    Gli ingressi possono essere scalari o array (un valore per intervallo).
     
     Parameters
     ----------
     hp_user : HpUserConfig
         Configurazione utente del sistema di pompa di calore
-    t_ext : float
+    t_ext : float or np.ndarray
         Temperatura esterna dell'aria [C]
-    t_int : float
+    t_int : float or np.ndarray
         Temperatura interna dell'edificio [C]
-    month : int
+    month : int or np.ndarray
         Mese dell'anno considerato
     mode : str
         Modalita' di funzionamento del sistema di pompa di calore
         'heating' o 'cooling'
+    phi_hc_nd_ac : float or np.ndarray, optional
+        Carico termico [W]; se None la modalità (riscaldamento/raffrescamento) dipende solo dal mese
     
     Returns
     -------
-    eta : float
+    eta : float or np.ndarray
         Efficienza del sistema di pompa di calore
     """
 
-    # active cooling
-    if (int(month) in monthly_range_cool and phi_hc_nd_ac < 0):
-        
-        hp_params = hp_user.hp_cooling.hp_parameters # parameter of the heat pump in the cooling mode    
-        f_seasonal_eta = hp_user.hp_cooling.f_seasonal_eta # seasonal efficiency
-    
-    # active heating
-    else:
-        
-        hp_params = hp_user.hp_heating.hp_parameters # parameter of the heat pump in the heating mode
-        f_seasonal_eta = hp_user.hp_heating.f_seasonal_eta # seasonal efficiency
+    # active cooling / active heating
+    cooling = cooling_mode(month, phi_hc_nd_ac, monthly_range_cool)
 
     #########################################################################################################
 
     # we extract a curve for evaluating the efficiency of the heat pump
     
-    x=t_ext # [°C]
-    y=t_int # [°C]
+    x = np.asarray(t_ext, dtype=float) # [°C]
+    y = np.asarray(t_int, dtype=float) # [°C]
+
+    efficiency = {}
+    f_seasonal_eta = {}
+    for hp_mode, hp_mode_params in (('cooling', hp_user.hp_cooling), ('heating', hp_user.hp_heating)):
+
+        hp_params = hp_mode_params.hp_parameters # parameter of the heat pump in the cooling / heating mode
+        f_seasonal_eta[hp_mode] = hp_mode_params.f_seasonal_eta # seasonal efficiency
+
+        alpha = [hp_params[f'alpha{i}_eff'] for i in range(1, 10)]
+        efficiency[hp_mode] = hp_operating_curve(1, alpha, x, y, hp_params['q_eff'])
 
-    alpha = [hp_params[f'alpha{i}_eff'] for i in range(1, 10)]
-    efficiency = hp_operating_curve(1, alpha, x, y, hp_params['q_eff'])
+    efficiency, f_seasonal_eta = (np.where(cooling, values['cooling'], values['heating']) for values in (efficiency, f_seasonal_eta))
 
     ##################################################################################################
     # Perchè dovrebbe essere il contrario?
@@ -376,77 +396,102 @@ def hp_efficiency(hp_user, t_ext, t_int, month, mode, phi_hc_nd_ac, monthly_rang
     else:     
         eta = f_seasonal_eta / efficiency     # Formula COP definita da Design builder per PdC aria-aria (Inverso dell'EIR (Energy Input Ratio))
     
-    return eta
+    return eta[()]
 
 ##################################################################################################################################################################################################
 
-def hp_power_curve_max(hp_user, t_ext, t_int, month, phi_hc_nd_ac, monthly_range_cool = range(5, 10)):
+def hp_power_curve_max(hp_user, t_ext, t_int, month, phi_hc_nd_ac = None, monthly_range_cool = range(5, 10)):
 
     """
     Calcola la potenza massima erogabile dal sistema di pompa di calore
     in funzione delle temperature esterna e interna dell'edificio e del mese dell'anno.
+    Gli ingressi possono essere scalari o array (un valore per intervallo).
     
     Parameters
     ----------
     hp_user : HpUserConfig
         Configurazione utente del sistema di pompa di calore
-    t_ext : float
+    t_ext : float or np.ndarray
         Temperatura esterna dell'aria [C]
-    t_int : float
+    t_int : float or np.ndarray
         Temperatura interna dell'edificio [C]
-    month : int
+    month : int or np.ndarray
         Mese dell'anno considerato
+    phi_hc_nd_ac : float or np.ndarray, optional
+        Carico termico [W]; se None la modalità (riscaldamento/raffrescamento) dipende solo dal mese
     
     Returns
     -------
-    Q_max : float
+    Q_max : float or np.ndarray
         Potenza massima erogabile dal sistema di pompa di calore [W]
-    Q_min : float
-        Potenza minima erogabile dal sistema di pompa di calore [W]
     """
 
-    # active cooling
-    if (int(month) in monthly_range_cool and phi_hc_nd_ac < 0):
-        
-        x = wet_bulb_temperature(t_int, rh=50) # [°C]
-        y = t_ext # [°C]
-        
-        hp_params = hp_user.hp_cooling.hp_parameters # parameter of the heat pump in the cooling mode
+    # active cooling / active heating
+    cooling = cooling_mode(month, phi_hc_nd_ac, monthly_range_cool)
 
-    # active heating
-    else:
+    t_ext = np.asarray(t_ext, dtype=float)
+    t_int = np.asarray(t_int, dtype=float)
 
-        x = t_ext # [°C]
-        y = t_int # [°C]
-        
-        hp_params = hp_user.hp_heating.hp_parameters # parameter of the heat pump in the heating mode
+    Q_max = {}
+    for hp_mode, hp_params, x, y in (('cooling', hp_user.hp_cooling.hp_parameters, wet_bulb_temperature(t_int, rh=50), t_ext), # [°C]
+                                     ('heating', hp_user.hp_heating.hp_parameters, t_ext, t_int)): # [°C]
+
+        alpha = [hp_params[f'alpha{i}_power'] for i in range(1, 10)]
+        Q_max[hp_mode] = hp_operating_curve(hp_params['p_th_nom'], alpha, x, y, q = hp_params['q_power'])
 
-    alpha = [hp_params[f'alpha{i}_power'] for i in range(1, 10)]
-    Q_max = hp_operating_curve(hp_params['p_th_nom'], alpha, x, y, q = hp_params['q_power'])
+    Q_max = np.where(cooling, Q_max['cooling'], Q_max['heating'])
     
-    return Q_max
+    return Q_max[()]
+
+##################################################################################################################################################################################################
+
+def cooling_mode(month, phi_hc_nd_ac = None, monthly_range_cool = range(5, 10)):
+
+    """
+    Restituisce True negli intervalli in cui la PdC funziona in raffrescamento (mese di raffrescamento e carico termico negativo)
+
+    Parameters
+    ----------
+    month : int or np.ndarray
+        Mese dell'anno considerato
+    phi_hc_nd_ac : float or np.ndarray, optional
+        Carico termico [W]; se None si considera solo il mese
+    monthly_range_cool : range
+        Mesi di raffrescamento
+
+    Returns
+    -------
+    cooling : bool or np.ndarray of bool
+    """
+
+    cooling = np.isin(np.asarray(month).astype(int), list(monthly_range_cool))
+
+    if phi_hc_nd_ac is not None:
+        cooling = cooling & (np.asarray(phi_hc_nd_ac) < 0)
+
+    return cooling
 
 ##################################################################################################################################################################################################
 
 def defrost_op(t_ext, rh_ext):
 
-    """ Vedi EnergyPlus engineering reference per le formule sotto riportate """
+    """ Vedi EnergyPlus engineering reference per le formule sotto riportate (ingressi scalari o array) """
 
     ah_ratio=ah_ratio_calculator(t_ext, rh_ext)     # Air-humidity Ratio
  
     # Vedi EnergyPlus engineering reference per le formule sotto riportate
     
-    T_coil=0.82*(t_ext)-8.589       # [C] Temperatura coil esterno PdC aria-aria, da EnergyPlus
+    T_coil=0.82*(np.asarray(t_ext, dtype=float))-8.589       # [C] Temperatura coil esterno PdC aria-aria, da EnergyPlus
     ah_ratio_coil=ah_ratio_calculator(T_coil, 100)  # [-] Air-humidity Ratio coil esterno PdC aria-aria, da EnergyPlus
-    delta=float(ah_ratio-ah_ratio_coil)
-    delta_ah=max(10^-6, delta)     # [-] Differenza tra Air-humidity Ratio coil esterno PdC aria-aria e Air-humidity Ratio vapore acqueo a t_ext
+    delta=ah_ratio-ah_ratio_coil
+    delta_ah=np.maximum(10^-6, delta)     # [-] Differenza tra Air-humidity Ratio coil esterno PdC aria-aria e Air-humidity Ratio vapore acqueo a t_ext
     heat_cap_mult=0.909-107.33*delta_ah
     input_pw_mult=0.9-36.45*delta_ah
     
     #Q_defrost = 0.01*0.05833*(7.222-t_ext)*(5.9645/1.01667)*1000        # [W] Capacità termica aggiuntiva dovuta a Defrost
     Pe_defrost=(5.9645/1.01667)*0.05833*1000        # [W] Potenza elettrica aggiuntiva per defrost, da moltiplicare poi per l'RTF della PdC
 
-    return Pe_defrost, heat_cap_mult, input_pw_mult
+    return Pe_defrost, heat_cap_mult[()], input_pw_mult[()]
 
 ##################################################################################################################################################################################################
 
@@ -465,21 +510,25 @@ def ah_ratio_calculator(t_ext, rh_ext):
 
 def Psat_calculator(t_ext):
 
-    P_sat = 611.21 * math.exp((18.678 - t_ext / 234.5) * (t_ext / (t_ext + 257.14)))      # [Pa] Pressione di saturazione vapore acqueo a t_ext (Arden-Buck equation)
+    t_ext = np.asarray(t_ext, dtype=float)
+
+    P_sat = 611.21 * np.exp((18.678 - t_ext / 234.5) * (t_ext / (t_ext + 257.14)))      # [Pa] Pressione di saturazione vapore acqueo a t_ext (Arden-Buck equation)
 
-    return P_sat
+    return P_sat[()]
 
 ##################################################################################################################################################################################################
 
 def wet_bulb_temperature(T_db, rh):
 
-        T_wb = (T_db * math.atan(0.151977 * (rh + 8.313659) ** 0.5) +
-        math.atan(T_db + rh) -
-        math.atan(rh - 1.676331) +
-        0.00391838 * (rh ** 1.5) * math.atan(0.023101 * rh) -
+        T_db = np.asarray(T_db, dtype=float)
+
+        T_wb = (T_db * np.arctan(0.151977 * (rh + 8.313659) ** 0.5) +
+        np.arctan(T_db + rh) -
+        np.arctan(rh - 1.676331) +
+        0.00391838 * (rh ** 1.5) * np.arctan(0.023101 * rh) -
         4.686035)
 
-        return T_wb
+        return T_wb[()]
 
 ##################################################################################################################################################################################################
 
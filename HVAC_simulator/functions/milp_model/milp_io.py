@@ -289,7 +289,7 @@ def milp_results (set_HVAC, set_N, phi_hc_nd_ac, ee_tot, omega_m_ac, omega_s_ac,
         results_phi_hc_nd_ac_array=np.array(results_phi_hc_nd_ac[user])
         th_load = th_load+results_phi_hc_nd_ac_array[:]
 
-        return th_load, hp_energy, t_start_dayahead
+    return th_load, hp_energy, t_start_dayahead
     
 ###############################################################################################################################
 
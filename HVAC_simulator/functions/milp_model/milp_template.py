@@ -0,0 +1,352 @@
+"""Modello MILP giornaliero riutilizzabile (template).
+
+La struttura del modello del giorno (variabili, vincoli e funzione obiettivo) è costruita una sola volta con le funzioni di
+milp_io e milp_constraints; per i giorni successivi sono aggiornati solo i termini noti e i coefficienti che dipendono dal giorno
+(produzione PV, temperatura esterna e flussi termici, modalità della PdC, temperature iniziali, stato del serbatoio).
+
+Il modello è risolto in memoria con HiGHS (highspy) se disponibile, altrimenti con CBC.
+"""
+
+import numpy as np
+import pulp as plp
+from pulp.apis.coin_api import PULP_CBC_CMD
+
+from HVAC_simulator.functions.milp_model.milp_io import *
+from HVAC_simulator.functions.milp_model.milp_constraints import *
+
+###############################################################################################################################
+
+class HiGHSWarmStart(plp.HiGHS):
+
+    """
+    HiGHS con soluzione iniziale: i valori correnti delle variabili del modello (la soluzione del giorno precedente,
+    se il template è già stato risolto) sono passati al solutore prima della risoluzione. Se la soluzione non è
+    ammissibile per il nuovo giorno HiGHS la scarta.
+    """
+
+    def callSolver(self, lp):
+        start = [(var.index, var.varValue) for var in lp.variables() if var.varValue is not None]
+
+        if start:
+            index, value = zip(*start)
+            lp.solverModel.setSolution(len(index), np.array(index, dtype=np.int32), np.array(value, dtype=float))
+
+        super().callSolver(lp)
+
+###############################################################################################################################
+
+def milp_solver(gap_rel = 0.005, time_limit = None, msg = True, warm_start = False, threads = None):
+
+    """
+    Restituisce il solutore MILP: HiGHS tramite la sua API Python (il modello è passato in memoria, senza file LP)
+    se highspy è installato, altrimenti CBC.
+
+    Parameters
+    ----------
+    gap_rel : float
+        Gap relativo di ottimalità
+    time_limit : float, optional
+        Tempo massimo di calcolo [s]; se None, senza limite
+    msg : bool
+        Stampa il log del solutore
+    warm_start : bool
+        Parte dai valori correnti delle variabili (soluzione del giorno precedente)
+    threads : int, optional
+        Numero massimo di thread del solutore; se None, default del solutore
+
+    Returns
+    -------
+    solver : pulp.LpSolver
+    """
+
+    if plp.HiGHS().available():
+        highs = HiGHSWarmStart if warm_start else plp.HiGHS
+        return highs(msg=msg, gapRel=gap_rel, timeLimit=time_limit, threads=threads)
+
+    return PULP_CBC_CMD(presolve = True, cuts= True, msg=msg, gapRel=gap_rel, timeLimit=time_limit, warmStart=warm_start, threads=threads)
+
+###############################################################################################################################
+
+def milp_gap(opt_model):
+
+    """
+    Gap relativo di ottimalità dell'ultima risoluzione del modello (NaN se non disponibile, es. con CBC)
+
+    Parameters
+    ----------
+    opt_model : pulp.LpProblem
+        Modello risolto
+
+    Returns
+    -------
+    gap : float
+    """
+
+    solver_model = getattr(opt_model, 'solverModel', None)
+
+    if solver_model is None or not hasattr(solver_model, 'getInfo'):
+        return np.nan
+
+    return float(solver_model.getInfo().mip_gap)
+
+###############################################################################################################################
+
+def milp_solution_status(opt_model):
+
+    """
+    Stato dell'ultima risoluzione del modello e presenza di una soluzione ammissibile. Con HiGHS lo stato è quello del
+    solutore, perché PuLP riporta come ottima anche una risoluzione interrotta dal limite di tempo senza soluzione.
+
+    Parameters
+    ----------
+    opt_model : pulp.LpProblem
+        Modello risolto
+
+    Returns
+    -------
+    status : str
+        Stato della risoluzione
+    feasible : bool
+        True se le variabili contengono una soluzione ammissibile
+    """
+
+    solver_model = getattr(opt_model, 'solverModel', None)
+
+    if solver_model is not None and hasattr(solver_model, 'getInfo'):
+        return solver_model.modelStatusToString(solver_model.getModelStatus()), solver_model.getInfo().primal_solution_status == 2
+
+    return plp.LpStatus[opt_model.status], opt_model.sol_status in (plp.LpSolutionOptimal, plp.LpSolutionIntegerFeasible)
+
+###############################################################################################################################
+
+def milp_horizon_data(data, n_intervals):
+
+    """
+    Dati del problema MILP per un orizzonte di n_intervals intervalli (es. 48 ore invece di un giorno): insiemi degli
+    intervalli e costi dell'energia, ripetuti ogni giorno, della lunghezza dell'orizzonte.
+
+    Parameters
+    ----------
+    data : dict
+        Dati costanti del problema (vedi milp_day_model)
+    n_intervals : int
+        Numero di intervalli dell'orizzonte
+
+    Returns
+    -------
+    data : dict
+        Copia dei dati con sets, n_intervals, costo_prel e rid dell'orizzonte
+    """
+
+    set_P, set_HVAC = data['sets'][:2]
+
+    horizon_data = dict(data)
+    horizon_data['sets'] = milp_intervals(len(set_P), len(set_HVAC), n_intervals)
+    horizon_data['n_intervals'] = n_intervals
+    horizon_data['costo_prel'] = [[row[n % len(row)] for n in range(n_intervals)] for row in data['costo_prel']]
+    horizon_data['rid'] = [[row[n % len(row)] for n in range(n_intervals)] for row in data['rid']]
+
+    return horizon_data
+
+###############################################################################################################################
+
+def milp_day_model(data, start_time_optimization, t_start_dayahead, storage = False, t_water_tank_0 = None, k_compressor_status_0 = None):
+
+    """
+    Costruisce il modello MILP di un giorno (template), con le stesse funzioni usate per ogni giorno da optimized.
+
+    Parameters
+    ----------
+    data : dict
+        Dati costanti del problema: cacer_type, sets (set_P, set_HVAC, set_N, set_T, set_Temp), n_intervals, dt, e_cast_pv, t_ext,
+        phi_ia, phi_st, phi_m, hp_users_list, prosumer_p_contr, consumer_p_contr, mode_pdc, eta, q_max, q_min, costo_prel, rid,
+        M, T_MAX, T_MIN, INC e, per la PdC autonoma (CER), pe_defrost e q_crankcase_activation
+    start_time_optimization : int
+        Primo intervallo del giorno
+    t_start_dayahead : np.ndarray
+        Temperature iniziali dei nodi per ciascun utente
+    storage : bool
+        Se True il modello include l'accumulo termico della PdC centralizzata (AUC in riscaldamento)
+    t_water_tank_0, k_compressor_status_0 : float, int
+        Temperatura iniziale del serbatoio e stato iniziale del compressore (solo con accumulo termico)
+
+    Returns
+    -------
+    template : dict
+        opt_model (pulp.LpProblem), variables (dict delle variabili), storage
+    """
+    d = data
+    set_P, set_HVAC, set_N, set_T, set_Temp = d['sets']
+    hp_aux = d['hp_users_list'][0].hp_aux
+
+    opt_model = plp.LpProblem(name="MIP_Model")  # modello di ottimizzazione
+
+    v = {}
+
+    #---------------------------------------- MILP VARIABLES ENERGY AND THERMAL -----------------------------------------
+
+    v['e_in_vars'], v['e_out_vars'], v['k_vars'], v['l_vars'], v['e_in_virtual_vars'], v['e_out_virtual_vars'], v['a_vars'], v['b_vars'] = milp_energy_variables(set_P, set_N) # Energy variables
+
+    v['phi_hc_nd_ac'], v['omega_m_ac'], v['omega_s_ac'], v['t_int'] = milp_thermal_variables(set_Temp, set_HVAC, set_N) # Thermal variables
+
+    #---------------------------------------- MILP VARIABLES HEAT PUMP AND THERMAL STORAGE -----------------------------------------
+
+    if d['cacer_type'] == 'CER':
+        v['q_hp'], v['ee_binary'], v['ee_tot'], v['q_heater'], v['q_crankcase'] = milp_hp_autonomous_variables(set_HVAC, set_N) # Heat pump variables for CER type CACER
+
+    elif d['cacer_type'] == 'AUC':
+        v['q_hp'], v['ee_binary'], v['ee_tot'] = milp_hp_centralized_variables(set_N) # Heat pump variables for AUC type CACER
+
+        if storage:
+            m_water_tank, h_water_tank_0 = milp_hp_centralized_storage_constants(hp_aux, t_water_tank_0) # Thermal storage constants
+            v['k_compressor_on'], v['k_compressor_off'], v['k_compressor_status'], v['t_water_tank'], v['delta_h'] = milp_hp_centralized_storage_variables(set_N, set_Temp, h_water_tank_0) # Thermal storage variables
+
+    #---------------------------------------- MILP CONSTRAINTS ENERGY AND THERMAL -----------------------------------------
+
+    opt_model, constraints = milp_energy_constraints(opt_model, v['e_in_vars'], v['e_out_vars'], d['e_cast_pv'], v['ee_tot'], v['k_vars'], v['l_vars'], set_P, set_N,
+                                                     set_HVAC, d['prosumer_p_contr'], d['consumer_p_contr'], v['e_in_virtual_vars'], v['e_out_virtual_vars'],
+                                                     v['a_vars'], v['b_vars'], d['M'], start_time_optimization, d['dt'], d['cacer_type']) # Energy constraints
+
+    opt_model, constraints = milp_thermal_constraints(opt_model, d['hp_users_list'], set_HVAC, v['t_int'], v['omega_s_ac'], v['omega_m_ac'], set_T,
+                                                      t_start_dayahead, set_Temp, d['t_ext'], start_time_optimization,
+                                                      d['phi_ia'], d['phi_st'], d['phi_m'], v['phi_hc_nd_ac'], d['T_MAX'], d['T_MIN'], constraints) # Thermal constraints
+
+    #---------------------------------------- MILP CONSTRAINTS HEAT PUMP AND THERMAL STORAGE -----------------------------------------
+
+    if d['cacer_type'] == 'CER':
+        opt_model, constraints = milp_hp_autonomous_constraints(opt_model, v['phi_hc_nd_ac'], v['q_crankcase'], v['q_heater'], v['q_hp'], d['q_min'], d['q_max'], v['ee_tot'], v['ee_binary'],
+                                                                d['mode_pdc'], set_N, set_HVAC, d['dt'], d['eta'], d['pe_defrost'], d['hp_users_list'], start_time_optimization,
+                                                                d['q_crankcase_activation'], constraints) # Autonomous heat pump constraints (CER type CACER)
+
+        # MILP OBJECTIVE FUNCTION CER TYPE
+        objective = plp.lpSum(plp.lpSum(v['e_in_vars'][p,n]*d['costo_prel'][p][n-1] - v['e_out_vars'][p,n]*d['rid'][p][n-1] for p in set_P) + plp.lpSum((v['ee_tot'][n,pdc])*d['costo_prel'][pdc][n-1] for pdc in set_HVAC)
+                                -(plp.lpSum(v['e_out_vars'][p,n] for p in set_P)- v['e_out_virtual_vars'][n])*d['INC']
+                    for n in set_N)/1000
+
+    elif d['cacer_type'] == 'AUC':
+
+        # Thermal storage constraints (AUC type CACER)
+        if storage:
+            set_S = range(2, d['n_intervals']+1)
+            opt_model, constraints = milp_hp_centralized_storage_constraints(opt_model, v['ee_tot'], v['phi_hc_nd_ac'],
+                                        v['delta_h'], v['t_water_tank'], v['k_compressor_status'], v['k_compressor_off'], v['k_compressor_on'],
+                                        hp_aux, start_time_optimization, set_HVAC, set_T, set_N, set_S, d['q_max'], d['eta'], d['M'],
+                                        t_water_tank_0, k_compressor_status_0, m_water_tank, d['dt']) # Centralized thermal storage constraints
+
+        else:
+            opt_model, constraints = milp_hp_centralized_constraints(opt_model, v['phi_hc_nd_ac'], v['q_hp'], d['q_min'], d['q_max'], v['ee_tot'], v['ee_binary'], d['mode_pdc'], set_N, set_HVAC,
+                                                                     d['dt'], d['eta'], start_time_optimization, hp_aux, constraints) # Centralized heat pump constraints (AUC type CACER)
+
+        # MILP OBJECTIVE FUNCTION AUC TYPE
+        objective = plp.lpSum(plp.lpSum(v['e_in_vars'][p,n]*d['costo_prel'][p][n-1] - v['e_out_vars'][p,n]*d['rid'][p][n-1] for p in set_P) + (v['ee_tot'][n])*d['costo_prel'][0][n-1]
+                                -(plp.lpSum(v['e_out_vars'][p,n] for p in set_P)- v['e_out_virtual_vars'][n])*d['INC']
+                    for n in set_N)/1000
+
+    opt_model.sense = plp.LpMinimize # Per la minimizzazione LpMinimize, per la massimizzazione LpMaximize
+
+    opt_model.setObjective(objective)
+
+    return {'opt_model': opt_model, 'variables': v, 'storage': storage}
+
+###############################################################################################################################
+
+def milp_update_day(template, data, start_time_optimization, t_start_dayahead, t_water_tank_0 = None, k_compressor_status_0 = None):
+
+    """
+    Aggiorna il template per il giorno che inizia all'intervallo start_time_optimization: termini noti e coefficienti
+    che dipendono dal giorno assumono gli stessi valori che avrebbero nel modello costruito da zero con milp_day_model.
+
+    Parameters
+    ----------
+    template : dict
+        Modello restituito da milp_day_model
+    data : dict
+        Dati costanti del problema (vedi milp_day_model)
+    start_time_optimization : int
+        Primo intervallo del giorno
+    t_start_dayahead : np.ndarray
+        Temperature iniziali dei nodi per ciascun utente
+    t_water_tank_0, k_compressor_status_0 : float, int
+        Temperatura iniziale del serbatoio e stato iniziale del compressore (solo con accumulo termico)
+    """
+    d = data
+    set_P, set_HVAC, set_N, set_T, set_Temp = d['sets']
+    v = template['variables']
+    c = template['opt_model'].constraints
+    s = start_time_optimization
+    dt = d['dt']
+
+    #---------------------------------------- ENERGY: produzione PV -----------------------------------------
+
+    for p in set_P:
+        for n in set_N:
+            c["10_constraint_{0}_{1}".format(p,n)].changeRHS(-(d['e_cast_pv'][s+n-1]*dt))
+
+    #---------------------------------------- THERMAL: temperatura esterna, flussi termici e temperature iniziali -----------------------------------------
+
+    for p in set_HVAC:
+        building = d['hp_users_list'][p].building
+
+        for n in set_T:
+            t_ext = d['t_ext'][s+n-2]
+            q_i = -building.H_ve*t_ext-d['phi_ia'][s+n-2][p]
+            q_s = -d['phi_st'][s+n-2][p]-building.H_tr_w*t_ext
+            q_m = -building.H_tr_em*t_ext -(d['phi_m'][s+n-2][p]+building.U_ground*building.A_floor*15)
+
+            for row, name in enumerate(("30", "31", "32")):
+                c["{0}_constraint_{1}_{2}".format(name,n,p)].changeRHS(q_i*(building.B[row][0])+q_s*(building.B[row][1])+q_m*(building.B[row][2]))
+
+        c["20a_constraint_{0}".format(p)].changeRHS(t_start_dayahead[p][2])
+        c["20e_constraint_{0}".format(p)].changeRHS(t_start_dayahead[p][1])
+        c["20f_constraint_{0}".format(p)].changeRHS(t_start_dayahead[p][0])
+
+    #---------------------------------------- HEAT PUMP: modalità, efficienza e potenze -----------------------------------------
+
+    if d['cacer_type'] == 'CER':
+        for n in set_N:
+            heating = d['mode_pdc'][s+n-1] == "heating"
+
+            for p in set_HVAC:
+                k = s+n-1
+                q_heater_max = d['hp_users_list'][p].hp_aux.q_heater
+
+                c["37a_constraint_{0}_{1}".format(n,p)].expr[v['q_crankcase'][n,p]] = -1 if heating else 0
+                c["37a_constraint_{0}_{1}".format(n,p)].expr[v['q_heater'][n,p]] = -1 if heating else 0
+
+                c37b = c["37b_constraint_{0}_{1}".format(n,p)]
+                c37b.expr[v['q_hp'][n,p]] = -((1 / d['eta'][k][p])*dt) if heating else (1 / d['eta'][k][p])*dt
+                c37b.expr[v['q_crankcase'][n,p]] = -dt if heating else 0
+                c37b.expr[v['q_heater'][n,p]] = -dt if heating else 0
+                c37b.changeRHS(d['pe_defrost'][k, p]*dt if heating else 0)
+
+                c["Q_heater_upper_bound_{0}_{1}".format(n,p)].changeRHS(q_heater_max*(1-d['q_crankcase_activation'][k,p]))
+                c["Q_crankase_upper_bound_{0}_{1}".format(n,p)].changeRHS(q_heater_max*d['q_crankcase_activation'][k,p])
+
+                c["EE_lower_bound_{0}_{1}".format(n,p)].expr[v['ee_binary'][n,p]] = -(d['q_min'][k][p] if heating else d['q_max'][k][p])
+                c["EE_upper_bound_{0}_{1}".format(n,p)].expr[v['ee_binary'][n,p]] = -(d['q_max'][k][p] if heating else d['q_min'][k][p])
+
+    elif d['cacer_type'] == 'AUC' and not template['storage']:
+        for n in set_N:
+            heating = d['mode_pdc'][s+n-1] == "heating"
+            k = s+n-1
+
+            c["37_constraint_pemin{0}".format(n)].expr[v['ee_binary'][n]] = -(d['q_min'][k] if heating else d['q_max'][k])
+            c["37_constraint_pemax{0}".format(n)].expr[v['ee_binary'][n]] = -(d['q_max'][k] if heating else d['q_min'][k])
+            c["37b_constraint_{0}".format(n)].expr[v['q_hp'][n]] = (-(1 / d['eta'][k]))*dt if heating else (1 / d['eta'][k])*dt
+
+    elif d['cacer_type'] == 'AUC' and template['storage']:
+        hp_aux = d['hp_users_list'][0].hp_aux
+
+        for n in set_T:
+            c["47b_constraint_{0}".format(n)].expr[v['k_compressor_status'][n-1]] = -(d['q_max'][s+n-2])
+
+        for n in set_N:
+            c["47e_constraint_{0}".format(n)].expr[v['k_compressor_status'][n]] = -((hp_aux.pel_fans/hp_aux.eta_fans+d['q_max'][s+n-1]*(1 /d['eta'][s+n-1]))*(dt))
+
+        c["48a_constraint"].changeRHS(t_water_tank_0)
+        for name in ("49a_constraint", "49b_constraint", "49c_constraint"):
+            c[name].changeRHS(k_compressor_status_0)
+
+        m_water_tank, h_water_tank_0 = milp_hp_centralized_storage_constants(hp_aux, t_water_tank_0)
+        for n in set_N:
+            v['delta_h'][n].upBound = h_water_tank_0
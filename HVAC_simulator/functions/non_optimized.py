@@ -4,7 +4,7 @@ from simple_colors import blue
 import yaml
 
 from HVAC_simulator.functions.io import read_weather_parameters, df_results_generator
-from HVAC_simulator.functions.thermal_load import thermal_load_calculator
+from HVAC_simulator.functions.thermal_load import thermal_load_calculator_batch
 from HVAC_simulator.functions.hp_energy_consumption import hp_energy_consumption
 
 from src.Functions_General import clear_folder_content
@@ -90,6 +90,22 @@ def non_optimized(cacer):
 
     print (blue("Non-optimized HVAC simulation:", ["bold", "underlined"]), '\n')
 
+    #--------------------------------------------- THERMAL LOAD ESTIMATION ---------------------------------------------
+
+    # Fabbisogno energetico degli edifici di tutti i tipi di utente, simulati insieme
+    print("Thermal load of the buildings of all the user types:\n")
+    thermal_loads = thermal_load_calculator_batch(cacer.hp_users_type, 
+                                                  df_climate_data, 
+                                                  n_intervals, 
+                                                  months, 
+                                                  hours, 
+                                                  coordinates, 
+                                                  t_ext, 
+                                                  monthly_range_heat, 
+                                                  monthly_range_cool, 
+                                                  scheduling_heating, 
+                                                  scheduling_cooling)
+
     for u in range(len(cacer.hp_users_type)):
 
         print(f"Simulating user type:", blue(f'{cacer.hp_users_type[u].user_name}\n'))
@@ -97,21 +113,10 @@ def non_optimized(cacer):
         print(f"- Comfort temperature heating setpoint: {cacer.hp_users_type[u].th_comfort_heating} °C")
         print(f"- Comfort temperature cooling setpoint: {cacer.hp_users_type[u].th_comfort_cooling} °C\n")
 
-        #--------------------------------------------- THERMAL LOAD ESTIMATION ---------------------------------------------
+        #--------------------------------------------- THERMAL LOAD RESULTS ---------------------------------------------
 
-        # Funzione per il calcolo del fabbisogno energetico dell'edificio
         print("- Thermal load:\n")
-        phi_hc_nd_ac, t_int = thermal_load_calculator(cacer.hp_users_type[u], 
-                                                      df_climate_data, 
-                                                      n_intervals, 
-                                                      months, 
-                                                      hours, 
-                                                      coordinates, 
-                                                      t_ext, 
-                                                      monthly_range_heat, 
-                                                      monthly_range_cool, 
-                                                      scheduling_heating, 
-                                                      scheduling_cooling)
+        phi_hc_nd_ac, t_int = thermal_loads[u]
 
         for uu in range(cacer.hp_users_type[u].user_numbers):
             t_int_uu = t_int[:, uu]
@@ -2,16 +2,18 @@ import calendar
 import pandas as pd 
 import numpy as np
 import pulp as plp
-from pulp.apis.coin_api import PULP_CBC_CMD
 import time
 from simple_colors import blue
 from tqdm.auto import tqdm
 import yaml
+from concurrent.futures import ProcessPoolExecutor
 
 from HVAC_simulator.functions.io import read_weather_parameters, df_results_generator, users_list_generator
-from HVAC_simulator.functions.thermal_load import th_fluxes_generator
+from HVAC_simulator.functions.thermal_load import th_fluxes_matrix, thermal_nodes_simulation
+from HVAC_simulator.functions.solar_irradiance import solar_thermal_contribution
 from HVAC_simulator.functions.milp_model.milp_io import *
 from HVAC_simulator.functions.milp_model.milp_constraints import *
+from HVAC_simulator.functions.milp_model.milp_template import milp_day_model, milp_update_day, milp_solver, milp_gap, milp_solution_status, milp_horizon_data
 
 from src.Functions_Energy_Model import create_coordinates_dataset, suppress_printing
 
@@ -26,7 +28,9 @@ ELECTRICITY_COST = 0.35 # Electricity cost [€/kWh]
 RID = 0.15 # Feed-in tariff [€/kWh]
 INC = 0.13 # Incentive for energy fed into the grid [€/kWh]
 
-def optimized(cacer, month='Gen', year=2005):
+LISTA_MESI = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic']
+
+def optimized(cacer, month='Gen', year=2005, horizon_hours=24, commit_hours=24, time_limit=None):
 
     """
     Function to optimize the energy consumption of a non-optimized Heat Pump system for an office building with a setpoint temperature.
@@ -35,12 +39,14 @@ def optimized(cacer, month='Gen', year=2005):
     ----------
     cacer : CacerConfig
         Configuration of the CACER
-    climate_data_file : str
-        File path of the climate data file
-    location : str
-        Location of the building
-    pv_data_file : str
-        File path of the PV data file
+    month : str
+        Month of the optimization (from 'Gen' to 'Dic')
+    year : int
+        Year of the optimization
+    horizon_hours, commit_hours : float
+        Lookahead of each solve and hours kept from it [h] (rolling horizon, see optimize_days); 24 and 24 for the day-ahead optimization
+    time_limit : float, optional
+        Wall-clock budget of each solve [s], after which the rule-based schedule is used if no solution was found; if None, no limit
 
     Returns
     -------
@@ -50,6 +56,143 @@ def optimized(cacer, month='Gen', year=2005):
     
     print(blue("Optimized HVAC simulation:", ["bold", "underlined"]), '\n')
 
+    inputs = optimization_inputs(cacer, year) # Read the inputs of the whole year
+
+    #-------------------INPUT TIME-------------------
+    mese = month # Scegli il mese per l'ottimizzazione (Gen, Feb,... Ott...)
+    anno = year # Inserisci l'anno per l'ottimizzazione
+
+    mese_numero = LISTA_MESI.index(mese) + 1
+    first_day = sum(calendar.monthrange(anno, m)[1] for m in range(1, mese_numero)) # First day of the month in the year
+    _, month_days = calendar.monthrange(anno, mese_numero)
+
+    print(f" - Simulation month:", blue(mese), blue(anno), f"with", blue(month_days), f"days \n")
+
+    # Stato iniziale dei nodi dell'edificio al primo giorno del mese
+    t_start_dayahead = np.ones((len(inputs['milp_data']['hp_users_list']),3))*T_MIN # Initial day-ahead temperature setpoint for each user type
+
+    df_total_results, report, _ = optimize_days(inputs, first_day, month_days, t_start_dayahead, **inputs['storage_state_0'], time_limit=time_limit, 
+                                                horizon_hours=horizon_hours, commit_hours=commit_hours)
+    
+    print("\nOptimization completed!\n")
+    print(f" - Solves: {len(report)}, solved to optimality: {(report['status'] == 'Optimal').sum()}, rule-based fallback: {report['fallback'].sum()}")
+    print(f" - Solve time: total {report['solve time [s]'].sum():.1f} s, max {report['solve time [s]'].max():.1f} s\n")
+
+    return df_total_results
+
+#######################################################################################################################################################################
+
+def optimized_year(cacer, year=2005, n_workers=None, warm_start=True, horizon_hours=24, commit_hours=24, time_limit=None):
+
+    """
+    Optimizes the whole year, solving the months in parallel. The days of a month are solved in sequence, since they are
+    coupled through the final temperatures of the building nodes (and the state of the thermal storage); the first day
+    of each month starts from the state of the non-optimized (fixed comfort range) simulation at the month boundary.
+
+    Parameters
+    ----------
+    cacer : CacerConfig
+        Configuration of the CACER
+    year : int
+        Year of the optimization
+    n_workers : int, optional
+        Number of worker processes optimizing the months in parallel. If None, config['n_workers'] is used (1 = sequential)
+    warm_start : bool
+        Each day's MILP starts from the solution of the previous day
+    horizon_hours, commit_hours : float
+        Lookahead of each solve and hours kept from it [h] (rolling horizon, see optimize_days)
+    time_limit : float, optional
+        Wall-clock budget of each solve [s], after which the rule-based schedule is used if no solution was found; if None, no limit
+
+    Returns
+    -------
+    df_total_results : pandas.DataFrame
+        DataFrame containing the energy consumption and thermal load of the Heat Pump system for the whole year
+    report : pandas.DataFrame
+        Solver status, objective, optimality gap, timing and fallback of each solve (see optimize_days)
+    """
+
+    print(blue("Optimized HVAC simulation (whole year):", ["bold", "underlined"]), '\n')
+
+    config = yaml.safe_load(open("config.yml", 'r'))
+
+    if n_workers is None:
+        n_workers = config.get("n_workers", 1)
+
+    inputs = optimization_inputs(cacer, year) # Read the inputs of the whole year
+
+    n_days = inputs['total_intervals'] // inputs['n_intervals']
+
+    # Primo giorno e numero di giorni di ciascun mese (limitati ai dati disponibili)
+    month_days = [calendar.monthrange(year, m)[1] for m in range(1, 13)]
+    first_days = np.cumsum([0] + month_days[:-1])
+    months = [(m, first_days[m], min(month_days[m], n_days - first_days[m])) for m in range(12) if first_days[m] < n_days]
+
+    # Stato iniziale di ciascun mese dalla simulazione non ottimizzata
+    t_start_months = warmup_states(inputs, [first_day*inputs['n_intervals'] for _, first_day, _ in months])
+
+    print(f" - Simulation year:", blue(year), f"with", blue(len(months)), f"months on", blue(n_workers), f"workers \n")
+
+    tasks = [(first_day, days, t_start, f" - {LISTA_MESI[m]}: ") for (m, first_day, days), t_start in zip(months, t_start_months)]
+    options = {'warm_start': warm_start, 'horizon_hours': horizon_hours, 'commit_hours': commit_hours, 'time_limit': time_limit}
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers = n_workers, initializer = _optimized_worker_init, initargs = (inputs, options)) as executor:
+            results = list(executor.map(_optimized_month_worker, tasks))
+    else:
+        _optimized_worker_init(inputs, options)
+        results = [_optimized_month_worker(task) for task in tasks]
+
+    df_total_results = pd.concat([df for df, _ in results], axis=0, ignore_index=True)
+    report = pd.concat([r for _, r in results], axis=0, ignore_index=True)
+
+    print("\nOptimization completed!\n")
+    solved = report['status'] == 'Optimal'
+
+    print(f" - Solves: {len(report)}, solved to optimality: {solved.sum()}, rule-based fallback: {report['fallback'].sum()}")
+    print(f" - Optimality gap of the solved problems: mean {report['gap'][solved].mean():.4f}, max {report['gap'][solved].max():.4f}")
+    print(f" - Solve time: total {report['solve time [s]'].sum():.1f} s, max {report['solve time [s]'].max():.1f} s\n")
+
+    return df_total_results, report
+
+def _optimized_worker_init(inputs, options):
+    """Initializer of the worker processes of optimized_year: the inputs of the year and the solve options are received once per worker."""
+
+    global _optimized_worker_data
+    _optimized_worker_data = {'inputs': inputs, 'options': options}
+
+def _optimized_month_worker(task):
+    """Optimize the days of a month in a worker process (one solver thread per worker)."""
+
+    first_day, days, t_start_dayahead, desc = task
+    data = _optimized_worker_data
+    inputs = data['inputs']
+
+    return optimize_days(inputs, first_day, days, t_start_dayahead, **inputs['storage_state_0'], **data['options'], 
+                         threads=1, msg=False, desc=desc)[:2]
+
+#######################################################################################################################################################################
+
+def optimization_inputs(cacer, year=2005):
+
+    """
+    Reads and computes once the inputs of the MILP problem for the whole year (climate data, PV production, thermal fluxes
+    and heat pump constants), shared by all the days of the optimization.
+
+    Parameters
+    ----------
+    cacer : CacerConfig
+        Configuration of the CACER
+    year : int
+        Year of the optimization
+
+    Returns
+    -------
+    inputs : dict
+        milp_data (constant data of the MILP problem, see milp_day_model), n_intervals, dt, total_intervals, df_climate_data
+        and storage_state_0 (initial state of the thermal storage, empty if there is none)
+    """
+
     config = yaml.safe_load(open("config.yml", 'r'))
 
     location = config['provincia_it'] # getting the location from the configuration file
@@ -60,39 +203,33 @@ def optimized(cacer, month='Gen', year=2005):
 
     pv_data_file = config['filename_output_csv_gen_pv'] # File path of the solar PV data
 
-    #-------------------INPUT TIME-------------------
-    mese = month # Scegli il mese per l'ottimizzazione (Gen, Feb,... Ott...)
-    anno = year # Inserisci l'anno per l'ottimizzazione
-
-    dt, n_intervals, total_intervals, e_cast_pv, month_days = time_forecast_data_generator(mese, anno, pv_data_file, cacer.simulation_interval) # Generate time forecast data
-
-    print(f" - Simulation month:", blue(mese), blue(anno), f"with", blue(month_days), f"days \n")
+    dt, n_intervals, _, e_cast_pv, _ = time_forecast_data_generator('Gen', year, pv_data_file, cacer.simulation_interval) # Generate time forecast data
 
     #-------------------USERS' VARIABLES CHARACTERIZATION-------------------
-    df_total_results, user_name_list, n_prosumers, hp_users_list, prosumer_p_contr, consumer_p_contr, hp_hvac_users_list = users_list_generator(cacer.hp_users_type, n_intervals, P_CONTRACT_USER, M) # Generate users' list and variables
-    df_climate_data, months, t_ext, rh_ext = read_weather_parameters(climate_data_filename) # Read climate data parameters
+    _, user_name_list, n_prosumers, hp_users_list, prosumer_p_contr, consumer_p_contr, hp_hvac_users_list = users_list_generator(cacer.hp_users_type, n_intervals, P_CONTRACT_USER, M) # Generate users' list and variables
+    df_climate_data, months, hours, t_ext, rh_ext = read_weather_parameters(climate_data_filename) # Read climate data parameters
+
+    year_days = 366 if calendar.isleap(year) else 365
+    total_intervals = min(n_intervals*year_days, len(t_ext)) # Intervals of the year (limited to the climate data)
     
     mode_pdc = mode_pdc_generator(months, total_intervals) # Generate heating/cooling mode based on months
     
     n_consumers = len(hp_users_list) # Number of consumers with heat pumps
-    t_start_dayahead = np.ones((n_consumers,3))*T_MIN # Initial day-ahead temperature setpoint for each user type
 
-    # Generate thermal fluxes for each user type
-    for config in range(len(cacer.hp_users_type)):
-        phi_ia, phi_st, phi_m = th_fluxes_generator(cacer.hp_users_type[config], df_climate_data, coordinates) 
+    # Generate thermal fluxes of all the users at once (columns in the same order as hp_users_list)
+    Irradiance, Irradiance_roof = solar_thermal_contribution(df_climate_data, coordinates)
+    phi_ia, phi_st, phi_m = th_fluxes_matrix([user.building for user in hp_users_list], df_climate_data.shape[0], Irradiance, Irradiance_roof)
     
     #------------------- MONEY INPUT CONSTANTS-------------------
     costo_prel      =   [[ELECTRICITY_COST for _ in range(n_intervals)] for _ in range(n_consumers)] # Electricity cost for each consumer and interval
     rid             =   [[RID for _ in range(n_intervals)] for _ in range(n_consumers)] # Feed-in tariff for each consumer and interval
 
-    #####################################################################################################################
-    ##################################### MILP OPTIMIZATION PROBLEM #####################################################
-    #####################################################################################################################
-
     #---------------------------------------- MILP CONSTANTS ENERGY AND THERMAL -----------------------------------------  
 
     set_P, set_HVAC, set_N, set_T, set_Temp = milp_intervals(n_prosumers, n_consumers, n_intervals) # Generate MILP model sets
 
+    storage_state_0 = {}
+
     #---------------------------------------- CER -----------------------------------------
 
     if cacer.cacer_type == 'CER':
@@ -106,106 +243,246 @@ def optimized(cacer, month='Gen', year=2005):
         eta, q_max, q_min = milp_hp_centralized_constants(total_intervals, hp_users_list, hp_hvac_users_list, t_water_tank_0, t_ext, months) # Generate MILP model constants for AUC type CACER
         
         if cacer.hp_users_type[0].users[0].hp_heating.thermal_storage == True:
-            t_water_tank_0 = (cacer.hp_users_type[0].users[0].hp_aux.t_cut_in + cacer.hp_users_type[0].users[0].hp_aux.t_dead_band) # Initial water tank temperature
-            k_compressor_status_0 = 0 # Initial compressor status
+            storage_state_0 = {'t_water_tank_0': t_water_tank_0, 'k_compressor_status_0': 0} # Initial water tank temperature and compressor status
 
-    for day in tqdm(range(month_days), desc = " - Day: "):  
-        
-        start_time_optimization = n_intervals*(day)
+    # Dati costanti del problema MILP, comuni a tutti i giorni
+    milp_data = {'cacer_type': cacer.cacer_type, 'sets': (set_P, set_HVAC, set_N, set_T, set_Temp), 'n_intervals': n_intervals, 'dt': dt, 
+                 'e_cast_pv': e_cast_pv, 't_ext': t_ext, 'phi_ia': phi_ia, 'phi_st': phi_st, 'phi_m': phi_m, 'hp_users_list': hp_users_list, 
+                 'prosumer_p_contr': prosumer_p_contr, 'consumer_p_contr': consumer_p_contr, 'mode_pdc': mode_pdc, 'eta': eta, 'q_max': q_max, 'q_min': q_min, 
+                 'costo_prel': costo_prel, 'rid': rid, 'M': M, 'T_MAX': T_MAX, 'T_MIN': T_MIN, 'INC': INC}
+    
+    if cacer.cacer_type == 'CER':
+        milp_data.update({'pe_defrost': pe_defrost, 'q_crankcase_activation': q_crankcase_activation})
 
-        opt_model = plp.LpProblem(name="MIP_Model")  # modello di ottimizzazione     
+    return {'milp_data': milp_data, 'n_intervals': n_intervals, 'dt': dt, 'total_intervals': total_intervals, 'df_climate_data': df_climate_data, 
+            'storage_state_0': storage_state_0}
 
-        #---------------------------------------- MILP VARIABLES ENERGY AND THERMAL -----------------------------------------                                                                                                               
+#######################################################################################################################################################################
 
-        e_in_vars, e_out_vars, k_vars, l_vars, e_in_virtual_vars, e_out_virtual_vars, a_vars, b_vars = milp_energy_variables(set_P, set_N) # Energy variables
-        
-        phi_hc_nd_ac, omega_m_ac, omega_s_ac, t_int = milp_thermal_variables(set_Temp, set_HVAC, set_N) # Thermal variables
+def optimize_days(inputs, first_day, n_days, t_start_dayahead, t_water_tank_0=None, k_compressor_status_0=None, warm_start=True, gap_rel=0.005, 
+                  time_limit=None, threads=None, msg=True, desc=" - Day: ", horizon_hours=24, commit_hours=24, fallback=True):
 
-        #---------------------------------------- MILP VARIABLES HEAT PUMP AND THERMAL STORAGE ----------------------------------------- 
+    """
+    Solves the MILP problem of consecutive days with a rolling horizon: each solve optimizes horizon_hours from the current state
+    and only the first commit_hours are kept, the next solve starting from the state at the end of them. With the default
+    horizon and commit step of 24 hours this is the day-ahead optimization, one solve per day.
 
-        #---------------------------------------- CER -----------------------------------------
+    If a solve does not find a feasible solution (infeasible problem, or time_limit reached without a solution), the committed
+    intervals follow the rule-based schedule of the non-optimized simulation (see fallback_schedule).
 
-        if cacer.cacer_type == 'CER':
-            q_hp, ee_binary, ee_tot, q_heater, q_crankcase = milp_hp_autonomous_variables(set_HVAC, set_N) # Heat pump variables for CER type CACER
+    Parameters
+    ----------
+    inputs : dict
+        Inputs of the year (see optimization_inputs)
+    first_day : int
+        First day to optimize (day of the year, starting from 0)
+    n_days : int
+        Number of days to optimize
+    t_start_dayahead : np.ndarray
+        Initial temperatures of the nodes (M, S, I) of each user [C]
+    t_water_tank_0, k_compressor_status_0 : float, int
+        Initial water tank temperature and compressor status (only with the thermal storage)
+    warm_start : bool
+        Each MILP starts from the solution of the previous solve
+    gap_rel, threads, msg
+        Solver options (see milp_solver)
+    time_limit : float, optional
+        Wall-clock budget of each solve [s]; if None, no limit
+    desc : str
+        Description of the progress bar
+    horizon_hours : float
+        Lookahead of each solve [h], not less than commit_hours
+    commit_hours : float
+        Hours kept from each solve [h]
+    fallback : bool
+        Use the rule-based schedule when a solve has no feasible solution (otherwise an error is raised)
 
-        #---------------------------------------- AUC -----------------------------------------
+    Returns
+    -------
+    df_total_results : pandas.DataFrame
+        Energy consumption and thermal load of the Heat Pump system in the optimized days
+    report : pandas.DataFrame
+        Start, horizon, solver status, objective, optimality gap, model update and solve time of each solve, and whether
+        the fallback schedule was used
+    state : dict
+        Final state (t_start_dayahead, t_water_tank_0, k_compressor_status_0)
+    """
+    milp_data = inputs['milp_data']
+    n_intervals, dt, df_climate_data = inputs['n_intervals'], inputs['dt'], inputs['df_climate_data']
+    total_intervals = inputs['total_intervals']
+    set_HVAC = milp_data['sets'][1]
+    mode_pdc = milp_data['mode_pdc']
+    storage_enabled = bool(inputs['storage_state_0'])
 
-        elif cacer.cacer_type == 'AUC':
-            q_hp, ee_binary, ee_tot = milp_hp_centralized_variables(set_N) # Heat pump variables for AUC type CACER
+    horizon = int(round(horizon_hours*n_intervals/24)) # Intervals of each solve
+    commit = int(round(commit_hours*n_intervals/24)) # Intervals kept from each solve
 
-            if cacer.hp_users_type[0].users[0].hp_heating.thermal_storage == True and mode_pdc[start_time_optimization] == 'heating':
-                m_water_tank, h_water_tank_0 = milp_hp_centralized_storage_constants(cacer.hp_users_type[0].users[0].hp_aux, t_water_tank_0) # Thermal storage constants
-                k_compressor_on, k_compressor_off, k_compressor_status, t_water_tank, delta_h = milp_hp_centralized_storage_variables(set_N, set_Temp, h_water_tank_0) # Thermal storage variables
+    if not 0 < commit <= horizon:
+        raise ValueError("The commit step must be positive and not longer than the horizon")
 
-        #---------------------------------------- MILP CONSTRAINTS ENERGY AND THERMAL -----------------------------------------
-        
-        opt_model, constraints = milp_energy_constraints(opt_model, e_in_vars, e_out_vars, e_cast_pv, ee_tot, k_vars, l_vars, set_P, set_N, 
-                                                       set_HVAC, prosumer_p_contr, consumer_p_contr, e_in_virtual_vars, e_out_virtual_vars, 
-                                                       a_vars, b_vars, M, start_time_optimization, dt, cacer.cacer_type)# Energy constraints
+    t_start_dayahead = np.array(t_start_dayahead, dtype=float)
+    df_total_results = pd.DataFrame()
+    report = []
 
-        opt_model, constraints = milp_thermal_constraints(opt_model, hp_users_list, set_HVAC, t_int, omega_s_ac, omega_m_ac, set_T, 
-                                                        t_start_dayahead, set_Temp, t_ext, start_time_optimization, 
-                                                        phi_ia, phi_st, phi_m, phi_hc_nd_ac, T_MAX, T_MIN, constraints) # Thermal constraints
-        
-        #---------------------------------------- MILP CONSTRAINTS HEAT PUMP AND THERMAL STORAGE -----------------------------------------
+    # Il modello MILP è costruito una sola volta per ciascuna struttura (con o senza accumulo termico, lunghezza dell'orizzonte);
+    # per gli altri passi sono aggiornati solo i termini noti e i coefficienti
+    templates = {}
 
-        #---------------------------------------- CER -----------------------------------------
-        
-        if cacer.cacer_type == 'CER':
-            opt_model, constraints = milp_hp_autonomous_constraints(opt_model, phi_hc_nd_ac, q_crankcase, q_heater, q_hp, q_min, q_max, ee_tot, ee_binary, 
-                                                                  mode_pdc, set_N, set_HVAC, dt, eta, pe_defrost, hp_users_list, start_time_optimization,
-                                                                    q_crankcase_activation, constraints) # Autonomous heat pump constraints (CER type CACER)
-            
-            # MILP OBJECTIVE FUNCTION CER TYPE 
-            objective = plp.lpSum(plp.lpSum(e_in_vars[p,n]*costo_prel[p][n-1] - e_out_vars[p,n]*rid[p][n-1] for p in set_P) + plp.lpSum((ee_tot[n,pdc])*costo_prel[pdc][n-1] for pdc in set_HVAC) 
-                                    -(plp.lpSum(e_out_vars[p,n] for p in set_P)- e_out_virtual_vars[n])*INC  
-                        for n in set_N)/1000
-        
-        #---------------------------------------- AUC -----------------------------------------
-        
-        elif cacer.cacer_type == 'AUC':
-            
-            # Thermal storage constraints (AUC type CACER)
-            if cacer.hp_users_type[0].users[0].hp_heating.thermal_storage == True and mode_pdc[start_time_optimization] == 'heating': 
-                set_S = range(2, n_intervals+1) 
-                opt_model, constraints = milp_hp_centralized_storage_constraints(opt_model, ee_tot, phi_hc_nd_ac, 
-                                            delta_h, t_water_tank, k_compressor_status, k_compressor_off, k_compressor_on, 
-                                            cacer.hp_users_type[0].users[0].hp_aux, start_time_optimization, set_HVAC, set_T, set_N, set_S, q_max, eta, M, 
-                                            t_water_tank_0, k_compressor_status_0, m_water_tank, dt) # Centralized thermal storage constraints
-
-            
-            else:             
-                opt_model, constraints = milp_hp_centralized_constraints(opt_model, phi_hc_nd_ac, q_hp, q_min, q_max, ee_tot, 
-                                                                    ee_binary, mode_pdc, set_N, set_HVAC, dt, eta, 
-                                                                    start_time_optimization, hp_users_list[0].hp_aux, constraints) # Centralized heat pump constraints
-             
-            # MILP OBJECTIVE FUNCTION AUC TYPE
-            objective = plp.lpSum(plp.lpSum(e_in_vars[p,n]*costo_prel[p][n-1] - e_out_vars[p,n]*rid[p][n-1] for p in set_P) + (ee_tot[n])*costo_prel[0][n-1] 
-                                    -(plp.lpSum(e_out_vars[p,n] for p in set_P)- e_out_virtual_vars[n])*INC  
-                        for n in set_N)/1000
-        
-        #---------------------------------------- MILP SOLVER -----------------------------------------
+    first_interval, last_interval = n_intervals*first_day, n_intervals*(first_day + n_days)
+    starts = range(first_interval, last_interval, commit)
 
-        opt_model.sense = plp.LpMinimize # Per la minimizzazione LpMinimize, per la massimizzazione LpMaximize 
-        
-        opt_model.setObjective(objective)
+    for start_time_optimization in tqdm(starts, desc = desc):  
+
+        n_commit = min(commit, last_interval - start_time_optimization)
+        n_horizon = max(min(horizon, total_intervals - start_time_optimization), n_commit) # The horizon is shortened at the end of the data
+
+        storage = storage_enabled and mode_pdc[start_time_optimization] == 'heating'
+
+        if storage:
+            storage_state = {'t_water_tank_0': t_water_tank_0, 'k_compressor_status_0': k_compressor_status_0}
+        else:
+            storage_state = {}
+
+        build_time = time.perf_counter()
+
+        key = (storage, n_horizon)
+        if key not in templates:
+            horizon_data = milp_data if n_horizon == n_intervals else milp_horizon_data(milp_data, n_horizon)
+            templates[key] = (milp_day_model(horizon_data, start_time_optimization, t_start_dayahead, storage, **storage_state), horizon_data)
+        else:
+            milp_update_day(templates[key][0], templates[key][1], start_time_optimization, t_start_dayahead, **storage_state)
+
+        build_time = time.perf_counter() - build_time
+
+        opt_model = templates[key][0]['opt_model']
+        v = templates[key][0]['variables']
+
+        #---------------------------------------- MILP SOLVER -----------------------------------------
         
-        # Solver CBC per risoluzione di un problema di ottimizzazione misto-interi 
-        opt_model.solve(PULP_CBC_CMD( presolve = True, cuts= True,msg=True, gapRel=0.005)) #timeLimit = 60*5, gapRel=0.05  # 0.005 Euro ---> 5*60 = 5 minuti
+        # HiGHS in memoria (o CBC se highspy non è installato) per risoluzione di un problema di ottimizzazione misto-interi 
+        solve_time = time.perf_counter()
+        opt_model.solve(milp_solver(gap_rel=gap_rel, time_limit=time_limit, msg=msg, warm_start=warm_start, threads=threads)) # 0.005 Euro
+        solve_time = time.perf_counter() - solve_time
+
+        status, feasible = milp_solution_status(opt_model)
+
+        if not feasible and not fallback:
+            raise ValueError("HVAC MILP not solved at interval " + str(start_time_optimization) + ": " + status)
+
+        report.append({'interval': start_time_optimization, 'datetime': df_climate_data['datetime'].iloc[start_time_optimization], 'horizon': n_horizon, 
+                       'status': status, 'objective': plp.value(opt_model.objective) if feasible else np.nan, 'gap': milp_gap(opt_model) if feasible else np.nan, 
+                       'update time [s]': build_time, 'solve time [s]': solve_time, 'fallback': not feasible})
         
         #---------------------------------------- MILP RESULTS -----------------------------------------
 
-        if cacer.hp_users_type[0].users[0].hp_heating.thermal_storage == True and mode_pdc[start_time_optimization] == 'heating':
-            k_compressor_status_0, t_water_tank_0=milp_hp_storage_results(k_compressor_status, t_water_tank, set_N) # Get thermal storage results for next day
+        if feasible:
+            set_C = range(1, n_commit+1) # Intervals kept from the solve
 
-        th_load, hp_energy, t_start_dayahead=milp_results(set_HVAC, set_N, phi_hc_nd_ac, ee_tot, omega_m_ac, omega_s_ac, t_int, 
-                                                          t_start_dayahead, n_intervals, cacer.cacer_type) # Get MILP results for each day
+            if storage:
+                k_compressor_status_0, t_water_tank_0=milp_hp_storage_results(v['k_compressor_status'], v['t_water_tank'], set_C) # Get thermal storage results for the next solve
+
+            th_load, hp_energy, t_start_dayahead=milp_results(set_HVAC, set_C, v['phi_hc_nd_ac'], v['ee_tot'], v['omega_m_ac'], v['omega_s_ac'], v['t_int'], 
+                                                              t_start_dayahead, n_commit, milp_data['cacer_type']) # Get MILP results of the committed intervals
+        else:
+            th_load, hp_energy, t_start_dayahead=fallback_schedule(inputs, start_time_optimization, n_commit, t_start_dayahead) # Rule-based schedule
         
-        df_total_results=df_results_generator(th_load, hp_energy, dt, df_climate_data, n_intervals, user_name_list, df_total_results, start_time_optimization) # Generate results DataFrame
-    
-    print("\nOptimization completed!\n")
+        heating = np.asarray(mode_pdc[start_time_optimization:start_time_optimization+n_commit]) == 'heating'
+        hp_energy_heating, hp_energy_cooling = np.where(heating, hp_energy, 0), np.where(heating, 0, hp_energy)
 
-    return df_total_results
+        df_total_results=df_results_generator(th_load, hp_energy_heating, hp_energy_cooling, dt, df_climate_data, n_commit, df_total_results, start_time_optimization) # Generate results DataFrame
+
+    state = {'t_start_dayahead': t_start_dayahead, 't_water_tank_0': t_water_tank_0, 'k_compressor_status_0': k_compressor_status_0}
+
+    return df_total_results, pd.DataFrame(report), state
+
+#######################################################################################################################################################################
+
+def fallback_schedule(inputs, start_time, n, t_start_dayahead):
+
+    """
+    Rule-based schedule of the non-optimized simulation, used when the MILP problem has no solution: the heat pump keeps the
+    indoor temperature within [T_MIN, T_MAX] in the heating / cooling mode of the MILP problem, and its electrical energy is the
+    thermal energy divided by the efficiency (plus the defrost power of the autonomous heat pumps when heating). The state of
+    the thermal storage is left unchanged.
+
+    Parameters
+    ----------
+    inputs : dict
+        Inputs of the year (see optimization_inputs)
+    start_time : int
+        First interval of the schedule
+    n : int
+        Number of intervals of the schedule
+    t_start_dayahead : np.ndarray
+        Initial temperatures of the nodes (M, S, I) of each user [C]
+
+    Returns
+    -------
+    th_load : np.ndarray
+        Thermal load of all the users in each interval [W]
+    hp_energy : np.ndarray
+        Electrical energy of the heat pumps in each interval [Wh]
+    t_start_dayahead : np.ndarray
+        Final temperatures of the nodes (M, S, I) of each user [C]
+    """
+    milp_data = inputs['milp_data']
+    dt = inputs['dt']
+    window = slice(start_time, start_time + n)
+    buildings = [user.building for user in milp_data['hp_users_list']]
+    heating = np.asarray(milp_data['mode_pdc'][window]) == 'heating'
+
+    _, phi_hc_nd_ac, t_end = thermal_nodes_simulation(buildings, np.asarray(milp_data['t_ext'][window], dtype=float), milp_data['phi_ia'][window], milp_data['phi_st'][window], 
+                                                      milp_data['phi_m'][window], ~heating, heating, T_MIN, T_MAX, np.asarray(t_start_dayahead)[:, ::-1], return_state=True)
+
+    eta = np.asarray(milp_data['eta'][window], dtype=float)
+
+    if milp_data['cacer_type'] == 'CER':
+        hp_on = phi_hc_nd_ac != 0
+        hp_energy = (np.abs(phi_hc_nd_ac)/eta + np.where(heating[:, None] & hp_on, milp_data['pe_defrost'][window], 0)).sum(axis=1)*dt
+    else:
+        hp_energy = np.abs(phi_hc_nd_ac).sum(axis=1)/eta*dt
+
+    return phi_hc_nd_ac.sum(axis=1), hp_energy, t_end[:, ::-1].copy()
+
+#######################################################################################################################################################################
+
+def warmup_states(inputs, start_intervals):
+
+    """
+    Initial state of the building nodes at the given intervals, from the non-optimized simulation of the 5R3C model from the
+    start of the year, with the heat pump keeping the indoor temperature within [T_MIN, T_MAX] in the heating / cooling mode
+    of the MILP problem.
+
+    Parameters
+    ----------
+    inputs : dict
+        Inputs of the year (see optimization_inputs)
+    start_intervals : list of int
+        Intervals at which the state is needed (increasing)
+
+    Returns
+    -------
+    t_start : list of np.ndarray
+        Temperatures of the nodes (M, S, I) of each user at each interval, as t_start_dayahead [C]
+    """
+    milp_data = inputs['milp_data']
+    buildings = [user.building for user in milp_data['hp_users_list']]
+    mode_pdc = np.asarray(milp_data['mode_pdc'])
+    t_ext = np.asarray(milp_data['t_ext'], dtype=float)
+
+    t_end = np.ones((len(buildings), 3))*T_MIN # (I, S, M) as in thermal_nodes_simulation
+    t_start, previous = [], 0
+
+    for start in start_intervals:
+        if start > previous:
+            window = slice(previous, start)
+            _, _, t_end = thermal_nodes_simulation(buildings, t_ext[window], milp_data['phi_ia'][window], milp_data['phi_st'][window], milp_data['phi_m'][window], 
+                                                   mode_pdc[window] == 'cooling', mode_pdc[window] == 'heating', T_MIN, T_MAX, t_end, return_state=True)
+            previous = start
+
+        t_start.append(t_end[:, ::-1].copy()) # (M, S, I) as t_start_dayahead
+
+    return t_start
 
 #######################################################################################################################################################################
 
@@ -237,9 +514,7 @@ def time_forecast_data_generator(mese, anno, pv_data_file, simulation_interval):
     month_days : int
         Number of days in the month
     """
-    lista_mesi = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic']
-    
-    mese_numero = lista_mesi.index(mese) + 1  # Convert month name to number (1-12)
+    mese_numero = LISTA_MESI.index(mese) + 1  # Convert month name to number (1-12)
     _, month_days=calendar.monthrange(anno, mese_numero)
     
     df_e_cast_pv=  pd.read_csv(pv_data_file, sep=',', decimal='.', parse_dates=['datetime'])
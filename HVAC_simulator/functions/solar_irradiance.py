@@ -1,51 +1,93 @@
+import hashlib
 import pandas as pd
 import numpy as np
 
 from pvlib import location
 from pvlib import irradiance
 
+# Superfici dell'edificio: 8 orientamenti per le pareti verticali e per le falde del tetto
+ORIENTATIONS = ['N','NE','E','SE','S','SW','W','NW']
+SURFACE_AZIMUTHS = np.arange(0,360,45)     #np.arange(start, stop, step)
+TILT_WALLS = 90
+TILT_ROOF = 30
+
+# Irraggiamento delle superfici già calcolato, per (località, superfici, dati climatici)
+_irradiance_cache = {}
+
 def solar_thermal_contribution(solar_data, coordinates):
 
-    site = location.Location(coordinates[0][0], coordinates[0][1], 
-                                tz=coordinates[0][4], 
-                                altitude=coordinates[0][3], 
-                                name=coordinates[0][2])
-        
-    orientations = ['N','NE','E','SE','S','SW','W','NW']
-    surface_orientations = np.arange(0,360,45)     #np.arange(start, stop, step)
+    """
+    Irraggiamento (POA) sulle pareti e sulle falde del tetto per gli 8 orientamenti. La posizione del sole è calcolata una
+    sola volta per tutte le superfici e il risultato è conservato in memoria, per località, superfici e dati climatici
+    (hash di datetime, ghi, dhi e dni): le simulazioni successive con lo stesso file climatico non lo ricalcolano.
 
-    # Initialise dataframes
-    surface_irradiance = pd.DataFrame()  
-    surface_irradiance_roof = pd.DataFrame()
-    
+    Parameters
+    ----------
+    solar_data : pandas.DataFrame
+        Dati climatici (datetime, ghi, dhi, dni)
+    coordinates : list
+        Dataset della località (latitudine, longitudine, nome, altitudine, fuso orario)
+
+    Returns
+    -------
+    surface_irradiance, surface_irradiance_roof : pandas.DataFrame
+        Irraggiamento sulle pareti e sul tetto, intervalli x orientamenti [W/m^2]
+    """
     solar_data['datetime'] = pd.to_datetime(solar_data['datetime'])
     solar_data['datetime'] = solar_data['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S.%f')
     times=solar_data['datetime']
-        
-    # Get irradiance data for all wall orientations
 
-    for so in surface_orientations:
-        si = get_irradiance(site, times, 90, so, solar_data)       #epw (energy plus weather file?) 
-        si_roof = get_irradiance(site, times, 30, so, solar_data)   # tilt=30°, south-facing roof
-        surface_irradiance = pd.concat([surface_irradiance, si.POA], axis=1)     # POA = Plane of Array (piano focale)
-        surface_irradiance_roof = pd.concat([surface_irradiance_roof, si_roof.POA], axis=1) # POA = Plane of Array (piano focale)
+    key = (tuple(coordinates[0]), TILT_WALLS, TILT_ROOF, tuple(SURFACE_AZIMUTHS), weather_hash(solar_data))
+
+    if key not in _irradiance_cache:
+
+        site = location.Location(coordinates[0][0], coordinates[0][1], 
+                                    tz=coordinates[0][4], 
+                                    altitude=coordinates[0][3], 
+                                    name=coordinates[0][2])
+
+        # Posizione del sole, la stessa per tutte le superfici
+        solar_position = site.get_solarposition(times=times)
+
+        # Get irradiance data for all wall orientations
+        surface_irradiance = pd.concat([get_irradiance(site, times, TILT_WALLS, so, solar_data, solar_position).POA for so in SURFACE_AZIMUTHS], axis=1)     # POA = Plane of Array (piano focale)
+        surface_irradiance_roof = pd.concat([get_irradiance(site, times, TILT_ROOF, so, solar_data, solar_position).POA for so in SURFACE_AZIMUTHS], axis=1) # tilt=30°
 
-    surface_irradiance.columns = orientations 
-    surface_irradiance_roof.columns = orientations
+        surface_irradiance.columns = ORIENTATIONS 
+        surface_irradiance_roof.columns = ORIENTATIONS
+
+        _irradiance_cache[key] = (surface_irradiance, surface_irradiance_roof)
+
+    surface_irradiance, surface_irradiance_roof = _irradiance_cache[key]
     
-    return surface_irradiance, surface_irradiance_roof
+    return surface_irradiance.copy(), surface_irradiance_roof.copy()
+
+###############################################################################################################################
+
+def weather_hash(solar_data):
+
+    """ Hash dei dati climatici usati per l'irraggiamento (istanti e componenti della radiazione) """
+
+    h = hashlib.sha1()
+    h.update(pd.to_datetime(solar_data['datetime']).values.astype('datetime64[ns]').view(np.int64).tobytes())
+
+    for column in ('ghi', 'dhi', 'dni'):
+        h.update(np.ascontiguousarray(solar_data[column].values, dtype=float).tobytes())
+
+    return h.hexdigest()
 
 ###############################################################################################################################
 
-def get_irradiance(site_location, times, tilt, surface_azimuth, solar_data):
+def get_irradiance(site_location, times, tilt, surface_azimuth, solar_data, solar_position = None):
     
         # Generate clearsky data using the Ineichen model, which is the default
         # The get_clearsky method returns a dataframe with values for GHI, DNI,
         # and DHI
         #clearsky = site_location.get_clearsky(times)
 
-        # Get solar azimuth and zenith to pass to the transposition function
-        solar_position = site_location.get_solarposition(times=times)
+        # Get solar azimuth and zenith to pass to the transposition function (if not already computed for the site)
+        if solar_position is None:
+            solar_position = site_location.get_solarposition(times=times)
 
         # Use the get_total_irradiance function to transpose the GHI to POA
         POA_irradiance = irradiance.get_total_irradiance(surface_tilt=tilt,
@@ -66,9 +108,7 @@ def get_irradiance(site_location, times, tilt, surface_azimuth, solar_data):
                              solar_azimuth=solar_position['azimuth'])
         
         # cleaning AOI vector
-        for i in range(len(AOI)): 
-            if AOI.iloc[i] > 90 or solar_position['apparent_zenith'].iloc[i] > 90:
-                AOI.iloc[i] = 90
+        AOI = AOI.mask((AOI > 90) | (solar_position['apparent_zenith'] > 90), 90)
         
         # Return DataFrame with only GHI and POA
         return pd.DataFrame({'GHI': solar_data['ghi'].values,
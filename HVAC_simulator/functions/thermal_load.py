@@ -2,6 +2,14 @@ import numpy as np
 from tqdm.auto import tqdm
 from HVAC_simulator.functions.solar_irradiance import solar_thermal_contribution
 
+try:
+    from numba import njit
+except ImportError: # senza numba il modello termico è simulato con lo stesso ciclo in Python puro
+    njit = None
+
+# Numero minimo di edifici per cui, senza numba, il passo vettoriale numpy su tutti gli edifici è più veloce del ciclo Python su ciascun edificio
+_MIN_BATCH_BUILDINGS = 32
+
 def thermal_load_calculator(cacer_config, df_climate_data, n_intervals, months, hours, location, t_ext, monthly_range_heat = range(1, 13), monthly_range_cool = range(5, 10), scheduling_heating = range(0, 24), scheduling_cooling = range(0, 24)):
 
     """
@@ -34,122 +42,257 @@ def thermal_load_calculator(cacer_config, df_climate_data, n_intervals, months,
         Temperaturee interne per ciascun utente [C]
     """
 
+    return thermal_load_calculator_batch([cacer_config], df_climate_data, n_intervals, months, hours, location, t_ext, monthly_range_heat, monthly_range_cool, scheduling_heating, scheduling_cooling)[0]
+
+#######################################################################################################################################################
+
+def thermal_load_calculator_batch(hp_users_type, df_climate_data, n_intervals, months, hours, location, t_ext, monthly_range_heat = range(1, 13), monthly_range_cool = range(5, 10), scheduling_heating = range(0, 24), scheduling_cooling = range(0, 24)):
+
+    """
+    Calcola la potenza termica scambiata dalla PdC e le temperature interne per tutti gli utenti di più tipi di utente,
+    simulando insieme gli edifici di tutti i tipi (l'irraggiamento solare è calcolato una sola volta).
+
+    Parameters
+    ----------
+    hp_users_type : list of CacerConfig
+        Configurazioni dei tipi di utente
+    df_climate_data, n_intervals, months, hours, location, t_ext, monthly_range_heat, monthly_range_cool, scheduling_heating, scheduling_cooling :
+        Come in thermal_load_calculator
+
+    Returns
+    -------
+    thermal_loads : list of tuple
+        (phi_hc_nd_ac, t_int) per ciascun tipo di utente, come restituiti da thermal_load_calculator
+    """
+
     monthly_range_heat_eff = [x for x in monthly_range_heat if x not in monthly_range_cool]
 
-    t_int_min = cacer_config.th_comfort_heating # La temperatura minima internamente tollerata
-    t_int_max = cacer_config.th_comfort_cooling # La temperatura massima internamente tollerata
-    t_start = [cacer_config.th_comfort_heating for _ in range(3)]  # Initial indoor temperature for each user
-    t_int_0, omega_s_ac_0, omega_m_ac_0 = t_start[:] # Initial indoor temperature
+    # Intervalli in cui la PdC può funzionare in raffrescamento / riscaldamento (mese e ora di funzionamento)
+    months = np.asarray(months)[:n_intervals].astype(int)
+    hours = np.asarray(hours)[:n_intervals].astype(int)
+    cool_on = np.isin(months, list(monthly_range_cool)) & np.isin(hours, list(scheduling_cooling))
+    heat_on = np.isin(months, monthly_range_heat_eff) & np.isin(hours, list(scheduling_heating))
 
-    # Temperature interne (aria, superficie interna ed involucro edilizione), array numero di intervalli x numero di utenti
-    t_int = np.zeros((n_intervals+1, cacer_config.user_numbers))
-    omega_s_ac = np.zeros((n_intervals+1, cacer_config.user_numbers))
-    omega_m_ac = np.zeros((n_intervals+1, cacer_config.user_numbers)) 
+    t_ext = np.asarray(t_ext, dtype=float)[:n_intervals]
 
-    phi_hc_nd_ac = np.zeros((n_intervals, cacer_config.user_numbers)) # Potenza termica scambiata dalla PdC [W], array numero di intervalli x numero di utenti
+    Irradiance, Irradiance_roof = solar_thermal_contribution(df_climate_data, location)
 
-    for user in range(cacer_config.user_numbers):
+    # Edifici di tutti i tipi di utente e relativi setpoint di comfort
+    buildings = []
+    comfort = []
+    for cacer_config in hp_users_type:
+        for user in range(cacer_config.user_numbers):
+            buildings.append(cacer_config.users[user].building)
+            comfort.append((cacer_config.th_comfort_heating, cacer_config.th_comfort_cooling))
 
-        t_int[0, user], omega_s_ac[0, user], omega_m_ac[0, user] = t_start[:]
+    # Flussi termici di tutti gli edifici, array numero di intervalli x numero di edifici
+    phi_ia, phi_st, phi_m = [phi[:n_intervals] for phi in th_fluxes_matrix(buildings, df_climate_data.shape[0], Irradiance, Irradiance_roof)]
+    t_int_min, t_int_max = np.array(comfort, dtype=float).T # Temperature minime e massime internamente tollerate
+    t_start = np.repeat(t_int_min[:, None], 3, axis=1) # Initial indoor temperature for each user
 
-        phi_ia, phi_st, phi_m = th_fluxes_generator(cacer_config, df_climate_data, location)
+    # Temperature interne e potenza termica scambiata dalla PdC [W], array numero di intervalli x numero di edifici
+    t_int, phi_hc_nd_ac = thermal_nodes_simulation(buildings, t_ext, phi_ia, phi_st, phi_m, cool_on, heat_on, t_int_min, t_int_max, t_start)
 
-        #--------------------------------- Simulazione ---------------------------------
+    print("")
 
-        for n in tqdm(range(1, n_intervals + 1), desc = f"  Iterations"):
+    # Risultati per ciascun tipo di utente
+    thermal_loads = []
+    first = 0
+    for cacer_config in hp_users_type:
+        last = first + cacer_config.user_numbers
+        thermal_loads.append((phi_hc_nd_ac[:, first:last], t_int[:, first:last]))
+        first = last
 
-            # Si assume che la temperatura media del terreno in profondità sia di circa 13 gradi tutto l'anno
-            
-            ########################################################################
-            # forse si potrebbe usare l'approssimazione t_ground = T_ext !!!
-            ########################################################################
+    return thermal_loads
 
-            #------------------------------------------------------- Calcolo temperatura interna teorica -------------------------------------------------------
+#######################################################################################################################################################
 
-            t_int_theoretica = (cacer_config.users[user].building.A[0][0] * t_int_0 + 
-                                cacer_config.users[user].building.A[0][1] * omega_s_ac_0 + 
-                                cacer_config.users[user].building.A[0][2] * omega_m_ac_0 + 
+def thermal_nodes_simulation(buildings, t_ext, phi_ia, phi_st, phi_m, cool_on, heat_on, t_int_min, t_int_max, t_start, return_state = False):
 
-                                (- cacer_config.users[user].building.H_ve * t_ext[n-1] - phi_ia[n-1, user]) * (cacer_config.users[user].building.B[0][0]) + 
-                                (- phi_st[n-1, user] - cacer_config.users[user].building.H_tr_w * t_ext[n-1]) * (cacer_config.users[user].building.B[0][1]) + 
-                                (- cacer_config.users[user].building.H_tr_em * t_ext[n-1] - (phi_m[n-1][user] + cacer_config.users[user].building.U_ground * cacer_config.users[user].building.A_floor * (15 - omega_m_ac_0))) * cacer_config.users[user].building.B[0][2]
-                                )
+    """
+    Simulates the 5R3C model of a set of buildings over all the time intervals, with the heat pump keeping
+    the indoor temperature within the comfort range when it is allowed to operate.
 
-            #------------------------------------------------------- Calcolo fabbisogno termico  -------------------------------------------------------
+    The A and B matrices and the conductances of the buildings are stacked into (buildings x 3 x 3) and (buildings,)
+    arrays. With numba each building is simulated by the compiled loop; without numba the buildings are advanced
+    together by one vectorized step per interval, or one at a time by the Python loop if they are only a few.
 
-            # if the indoor temperature is outside the comfort range, the heat pump will operate to maintain the indoor temperature within the comfort range
+    Parameters
+    ----------
+    buildings : list of BuildingModel
+        Building models (A and B matrices and thermal conductances)
+    t_ext : np.ndarray
+        External temperature for each time interval [C]
+    phi_ia, phi_st, phi_m : np.ndarray
+        Thermal fluxes to nodes I, S and M, time intervals x buildings [W]
+    cool_on, heat_on : np.ndarray of bool
+        Time intervals in which the heat pump can operate in cooling / heating mode
+    t_int_min, t_int_max : np.ndarray
+        Comfort range of the indoor temperature of each building [C]
+    t_start : np.ndarray
+        Initial temperatures of the three nodes of each building, buildings x 3 [C]
+    return_state : bool
+        If True, the temperatures of the three nodes at the end of the last interval are returned too
 
-            # in particular, if the theoretical indoor temperature is higher than the maximum comfort temperature, the heat pump will operate in cooling mode to maintain the indoor temperature at the maximum comfort temperature; 
-            # if the theoretical indoor temperature is lower than the minimum comfort temperature, the heat pump will operate in heating mode to maintain the indoor temperature at the minimum comfort temperature; 
-            # if the theoretical indoor temperature is within the comfort range, the heat pump will not operate and the indoor temperature will be equal to the theoretical indoor temperature
+    Returns
+    -------
+    t_int : np.ndarray
+        Indoor temperature, n_intervals + 1 values starting from the initial one, for each building [C]
+    phi_hc_nd_ac : np.ndarray
+        Thermal power exchanged by the heat pump, time intervals x buildings [W]
+    t_end : np.ndarray
+        Only if return_state is True: final temperatures of the three nodes of each building, buildings x 3 [C],
+        in the same order as t_start
+    """
+    n_intervals, n_buildings = len(t_ext), len(buildings)
+
+    # Coefficienti dei modelli estratti una sola volta come float
+    A = np.array([b.A for b in buildings], dtype=float).reshape(n_buildings, 3, 3)
+    B = np.array([b.B for b in buildings], dtype=float).reshape(n_buildings, 3, 3)
+    H_ve = np.array([b.H_ve for b in buildings], dtype=float)
+    H_tr_w = np.array([b.H_tr_w for b in buildings], dtype=float)
+    H_tr_em = np.array([b.H_tr_em for b in buildings], dtype=float)
+    UA_ground = np.array([b.U_ground * b.A_floor for b in buildings], dtype=float)
 
-            #------------------------------------------------------- Modalità raffrescamento PdC -------------------------------------------------------
+    t_ext = np.asarray(t_ext, dtype=float)
+    phi_ia, phi_st, phi_m = (np.asarray(phi, dtype=float).reshape(n_intervals, n_buildings) for phi in (phi_ia, phi_st, phi_m))
+    cool_on, heat_on = (np.broadcast_to(np.asarray(on, dtype=bool).reshape(n_intervals, -1), (n_intervals, n_buildings)) for on in (cool_on, heat_on))
+    t_int_min, t_int_max = (np.broadcast_to(np.asarray(t, dtype=float), (n_buildings,)) for t in (t_int_min, t_int_max))
+    t_start = np.broadcast_to(np.asarray(t_start, dtype=float), (n_buildings, 3))
 
-            if (t_int_theoretica > t_int_max and int(months[n-1]) in monthly_range_cool and int(hours[n-1]) in scheduling_cooling):
-                    
-                t_int[n, user] = t_int_max
-                
-                phi_hc_nd_ac[n-1, user] = (
-                                            -t_int[n, user] + 
-                                           cacer_config.users[user].building.A[0][0] * t_int_0 + 
-                                           cacer_config.users[user].building.A[0][1] * omega_s_ac_0 + 
-                                           cacer_config.users[user].building.A[0][2]* omega_m_ac_0 + 
+    t_int = np.zeros((n_intervals + 1, n_buildings))
+    phi_hc_nd_ac = np.zeros((n_intervals, n_buildings))
+    t_end = np.zeros((n_buildings, 3))
 
-                                           (-phi_st[n-1, user] - cacer_config.users[user].building.H_tr_w * t_ext[n-1]) * (cacer_config.users[user].building.B[0][1]) + 
-                                           (-cacer_config.users[user].building.H_tr_em * t_ext[n-1] - (phi_m[n-1][user] + cacer_config.users[user].building.U_ground * cacer_config.users[user].building.A_floor * (15 - omega_m_ac_0))) * cacer_config.users[user].building.B[0][2]
-                                            ) / (cacer_config.users[user].building.B[0][0]) + (-cacer_config.users[user].building.H_ve * t_ext[n-1] - phi_ia[n-1, user])
-        
+    if njit is None and n_buildings >= _MIN_BATCH_BUILDINGS:
+        t_end[:] = np.column_stack(_thermal_nodes_loop_batch(A, B, H_ve, H_tr_w, H_tr_em, UA_ground, t_ext, phi_ia, phi_st, phi_m, cool_on, heat_on, t_int_min, t_int_max, *t_start.T, t_int, phi_hc_nd_ac))
 
-            #------------------------------------------------------- Modalità riscaldamento PdC -------------------------------------------------------
+        return (t_int, phi_hc_nd_ac, t_end) if return_state else (t_int, phi_hc_nd_ac)
 
-            elif (t_int_theoretica < t_int_min and int(months[n-1]) in monthly_range_heat_eff and int(hours[n-1]) in scheduling_heating):
-                
-                t_int[n, user] = t_int_min        
-                
-                phi_hc_nd_ac[n-1, user] = (
-                                            -t_int[n, user] + 
-                                           cacer_config.users[user].building.A[0][0] * t_int_0 + 
-                                           cacer_config.users[user].building.A[0][1] * omega_s_ac_0 + 
-                                           cacer_config.users[user].building.A[0][2]* omega_m_ac_0 + 
+    for b in tqdm(range(n_buildings), desc = f"  Buildings"):
 
-                                           (-phi_st[n-1, user] - cacer_config.users[user].building.H_tr_w * t_ext[n-1]) * (cacer_config.users[user].building.B[0][1]) + 
-                                           (-cacer_config.users[user].building.H_tr_em * t_ext[n-1] - (phi_m[n-1][user] + cacer_config.users[user].building.U_ground * cacer_config.users[user].building.A_floor * (15 - omega_m_ac_0))) * cacer_config.users[user].building.B[0][2]
-                                            ) / (cacer_config.users[user].building.B[0][0]) + (-cacer_config.users[user].building.H_ve * t_ext[n-1] - phi_ia[n-1, user])
+        if njit is not None:
+            t_end[b] = _thermal_nodes_loop_compiled(A[b], B[b], H_ve[b], H_tr_w[b], H_tr_em[b], UA_ground[b], t_ext, np.ascontiguousarray(phi_ia[:, b]), np.ascontiguousarray(phi_st[:, b]), np.ascontiguousarray(phi_m[:, b]), 
+                                         np.ascontiguousarray(cool_on[:, b]), np.ascontiguousarray(heat_on[:, b]), t_int_min[b], t_int_max[b], *t_start[b], t_int[:, b], phi_hc_nd_ac[:, b])
 
-            #------------------------------------------------------- Modalità PdC spenta -------------------------------------------------------
+        else:
+            # In Python puro il ciclo è più veloce su liste di float che su array numpy
+            t_int_b = [0.0] * (n_intervals + 1)
+            phi_hc_nd_ac_b = [0.0] * n_intervals
+            t_end[b] = _thermal_nodes_loop(A[b].tolist(), B[b].tolist(), float(H_ve[b]), float(H_tr_w[b]), float(H_tr_em[b]), float(UA_ground[b]), t_ext.tolist(), phi_ia[:, b].tolist(), phi_st[:, b].tolist(), phi_m[:, b].tolist(), 
+                                cool_on[:, b].tolist(), heat_on[:, b].tolist(), float(t_int_min[b]), float(t_int_max[b]), *t_start[b].tolist(), t_int_b, phi_hc_nd_ac_b)
+            t_int[:, b] = t_int_b
+            phi_hc_nd_ac[:, b] = phi_hc_nd_ac_b
 
-            else: 
-                
-                t_int[n,user] = t_int_theoretica
-                phi_hc_nd_ac[n-1, user] = 0
-                
-            #------------------------------------------------------- Si riaggiornanno le variabili -------------------------------------------------------
+    return (t_int, phi_hc_nd_ac, t_end) if return_state else (t_int, phi_hc_nd_ac)
 
-            omega_s_ac[n, user] = (cacer_config.users[user].building.A[1][0] * t_int_0 + 
-                                  cacer_config.users[user].building.A[1][1] * omega_s_ac_0 + 
-                                  cacer_config.users[user].building.A[1][2] * omega_m_ac_0 + 
+#######################################################################################################################################################
 
-                                  (-cacer_config.users[user].building.H_ve * t_ext[n-1] - phi_ia[n-1,user] - phi_hc_nd_ac[n-1,user]) * (cacer_config.users[user].building.B[1][0]) + 
-                                  (-phi_st[n-1,user] - cacer_config.users[user].building.H_tr_w * t_ext[n-1]) * (cacer_config.users[user].building.B[1][1]) + 
-                                  (-cacer_config.users[user].building.H_tr_em * t_ext[n-1] - (phi_m[n-1][user] + cacer_config.users[user].building.U_ground * cacer_config.users[user].building.A_floor * (15 - omega_m_ac_0))) * cacer_config.users[user].building.B[1][2]
-                                  )
-            
-            omega_m_ac[n, user] = (cacer_config.users[user].building.A[2][0] * t_int_0 + 
-                                  cacer_config.users[user].building.A[2][1] * omega_s_ac_0 + 
-                                  cacer_config.users[user].building.A[2][2] * omega_m_ac_0 + 
-
-                                  (-cacer_config.users[user].building.H_ve * t_ext[n-1] - phi_ia[n-1,user] - phi_hc_nd_ac[n-1,user]) * (cacer_config.users[user].building.B[2][0]) + 
-                                  (-phi_st[n-1,user]-cacer_config.users[user].building.H_tr_w * t_ext[n-1]) * (cacer_config.users[user].building.B[2][1]) + 
-                                  (-cacer_config.users[user].building.H_tr_em * t_ext[n-1] - (phi_m[n-1][user] + cacer_config.users[user].building.U_ground * cacer_config.users[user].building.A_floor * (15 - omega_m_ac_0))) * cacer_config.users[user].building.B[2][2]
-                                  )
-            
-            omega_s_ac_0, omega_m_ac_0 = map(float, (omega_s_ac[n, user], omega_m_ac[n, user]))
+def _thermal_nodes_loop(A, B, H_ve, H_tr_w, H_tr_em, UA_ground, t_ext, phi_ia, phi_st, phi_m, cool_on, heat_on, t_int_min, t_int_max, t_int_0, omega_s_ac_0, omega_m_ac_0, t_int, phi_hc_nd_ac):
 
-            t_int_0 = t_int[n, user] # temperatura interna di partenza per il prossimo intervallo
-    
-    print("")
+    """
+    Time loop of the 5R3C model, written so that it runs both in pure Python (lists) and compiled with numba (arrays).
+    The results are written in t_int and phi_hc_nd_ac; the operations are performed in the same order as the
+    original formulation, so that the results do not depend on the path used.
+    """
+    a00, a01, a02 = A[0][0], A[0][1], A[0][2]
+    a10, a11, a12 = A[1][0], A[1][1], A[1][2]
+    a20, a21, a22 = A[2][0], A[2][1], A[2][2]
+    b00, b01, b02 = B[0][0], B[0][1], B[0][2]
+    b10, b11, b12 = B[1][0], B[1][1], B[1][2]
+    b20, b21, b22 = B[2][0], B[2][1], B[2][2]
+
+    t_int[0] = t_int_0
+
+    for n in range(1, len(t_ext) + 1):
+
+        # Si assume che la temperatura media del terreno in profondità sia di circa 15 gradi tutto l'anno
+
+        # Flussi ai nodi I, S ed M (senza la potenza della PdC)
+        q_i = - H_ve * t_ext[n-1] - phi_ia[n-1]
+        q_s = - phi_st[n-1] - H_tr_w * t_ext[n-1]
+        q_m = - H_tr_em * t_ext[n-1] - (phi_m[n-1] + UA_ground * (15 - omega_m_ac_0))
+
+        #------------------------------------------------------- Calcolo temperatura interna teorica -------------------------------------------------------
+
+        t_int_theoretica = a00 * t_int_0 + a01 * omega_s_ac_0 + a02 * omega_m_ac_0 + q_i * b00 + q_s * b01 + q_m * b02
+
+        #------------------------------------------------------- Calcolo fabbisogno termico  -------------------------------------------------------
+
+        # if the theoretical indoor temperature is higher than the maximum comfort temperature, the heat pump operates in cooling mode to keep the indoor temperature at the maximum comfort temperature;
+        # if it is lower than the minimum comfort temperature, the heat pump operates in heating mode to keep the indoor temperature at the minimum comfort temperature;
+        # otherwise the heat pump is off and the indoor temperature is equal to the theoretical indoor temperature
+
+        if t_int_theoretica > t_int_max and cool_on[n-1]:
+            t_set, hp_on = t_int_max, True # Modalità raffrescamento PdC
+
+        elif t_int_theoretica < t_int_min and heat_on[n-1]:
+            t_set, hp_on = t_int_min, True # Modalità riscaldamento PdC
+
+        else:
+            t_set, hp_on = t_int_theoretica, False # Modalità PdC spenta
+
+        if hp_on:
+            phi_hc = (-t_set + a00 * t_int_0 + a01 * omega_s_ac_0 + a02 * omega_m_ac_0 + q_s * b01 + q_m * b02) / b00 + q_i
+        else:
+            phi_hc = 0.0
+
+        t_int[n] = t_set
+        phi_hc_nd_ac[n-1] = phi_hc
 
-    return phi_hc_nd_ac, t_int
+        #------------------------------------------------------- Si riaggiornanno le variabili -------------------------------------------------------
+
+        omega_s_ac_1 = a10 * t_int_0 + a11 * omega_s_ac_0 + a12 * omega_m_ac_0 + (q_i - phi_hc) * b10 + q_s * b11 + q_m * b12
+        omega_m_ac_1 = a20 * t_int_0 + a21 * omega_s_ac_0 + a22 * omega_m_ac_0 + (q_i - phi_hc) * b20 + q_s * b21 + q_m * b22
+
+        t_int_0, omega_s_ac_0, omega_m_ac_0 = t_set, omega_s_ac_1, omega_m_ac_1 # temperature di partenza per il prossimo intervallo
+
+    return t_int_0, omega_s_ac_0, omega_m_ac_0
+
+_thermal_nodes_loop_compiled = njit(cache=True)(_thermal_nodes_loop) if njit is not None else None
+
+#######################################################################################################################################################
+
+def _thermal_nodes_loop_batch(A, B, H_ve, H_tr_w, H_tr_em, UA_ground, t_ext, phi_ia, phi_st, phi_m, cool_on, heat_on, t_int_min, t_int_max, t_int_0, omega_s_ac_0, omega_m_ac_0, t_int, phi_hc_nd_ac):
+
+    """
+    Same time loop as _thermal_nodes_loop, advancing all the buildings together: the coefficients are arrays over the buildings
+    (A and B are buildings x 3 x 3) and each interval is a single vectorized step. The element-wise operations are the same,
+    so the results are identical to those of the single-building loop.
+    """
+    a00, a01, a02 = A[:, 0, 0], A[:, 0, 1], A[:, 0, 2]
+    a10, a11, a12 = A[:, 1, 0], A[:, 1, 1], A[:, 1, 2]
+    a20, a21, a22 = A[:, 2, 0], A[:, 2, 1], A[:, 2, 2]
+    b00, b01, b02 = B[:, 0, 0], B[:, 0, 1], B[:, 0, 2]
+    b10, b11, b12 = B[:, 1, 0], B[:, 1, 1], B[:, 1, 2]
+    b20, b21, b22 = B[:, 2, 0], B[:, 2, 1], B[:, 2, 2]
+
+    t_int[0] = t_int_0
+
+    for n in range(1, len(t_ext) + 1):
+
+        q_i = - H_ve * t_ext[n-1] - phi_ia[n-1]
+        q_s = - phi_st[n-1] - H_tr_w * t_ext[n-1]
+        q_m = - H_tr_em * t_ext[n-1] - (phi_m[n-1] + UA_ground * (15 - omega_m_ac_0))
+
+        t_int_theoretica = a00 * t_int_0 + a01 * omega_s_ac_0 + a02 * omega_m_ac_0 + q_i * b00 + q_s * b01 + q_m * b02
+
+        cooling = (t_int_theoretica > t_int_max) & cool_on[n-1] # Modalità raffrescamento PdC
+        heating = (t_int_theoretica < t_int_min) & heat_on[n-1] & ~cooling # Modalità riscaldamento PdC
+        hp_on = cooling | heating
+
+        t_set = np.where(cooling, t_int_max, np.where(heating, t_int_min, t_int_theoretica))
+        phi_hc = np.where(hp_on, (-t_set + a00 * t_int_0 + a01 * omega_s_ac_0 + a02 * omega_m_ac_0 + q_s * b01 + q_m * b02) / b00 + q_i, 0.0)
+
+        t_int[n] = t_set
+        phi_hc_nd_ac[n-1] = phi_hc
+
+        omega_s_ac_1 = a10 * t_int_0 + a11 * omega_s_ac_0 + a12 * omega_m_ac_0 + (q_i - phi_hc) * b10 + q_s * b11 + q_m * b12
+        omega_m_ac_1 = a20 * t_int_0 + a21 * omega_s_ac_0 + a22 * omega_m_ac_0 + (q_i - phi_hc) * b20 + q_s * b21 + q_m * b22
+
+        t_int_0, omega_s_ac_0, omega_m_ac_0 = t_set, omega_s_ac_1, omega_m_ac_1
+
+    return t_int_0, omega_s_ac_0, omega_m_ac_0
 
 #######################################################################################################################################################
 
@@ -179,20 +322,9 @@ def th_fluxes_generator(cacer_config_users, df_climate_data, location):
     Irradiance, Irradiance_roof = solar_thermal_contribution(df_climate_data, location)
 
     n_intervals = df_climate_data.shape[0] # number of time intervals
-    n_users = len(cacer_config_users.users) # number of users
-
-    th_fluxes_data_matrix = [np.zeros((n_intervals, n_users)) for _ in range(3)]
-
-    # Thermal fluxes for each user
-    for user in range(n_users):
 
-        phi_ia, phi_st, phi_m = model_th_fluxes(cacer_config_users.users[user], n_intervals, Irradiance, Irradiance_roof)
-
-        th_fluxes_data_matrix[0][:, user] = phi_ia
-        th_fluxes_data_matrix[1][:, user] = phi_st
-        th_fluxes_data_matrix[2][:, user] = phi_m
-        
-    return th_fluxes_data_matrix[0], th_fluxes_data_matrix[1], th_fluxes_data_matrix[2] 
+    # Thermal fluxes of all the users at once
+    return th_fluxes_matrix([user.building for user in cacer_config_users.users], n_intervals, Irradiance, Irradiance_roof)
 
 #######################################################################################################################################################
 
@@ -221,17 +353,50 @@ def model_th_fluxes(user, n_intervals, Irradiance, Irradiance_roof):
     phi_m : np.ndarray
         Thermal fluxes to Node M
     """
-    phi_0=np.ones(n_intervals)*200      # Da modificare, i carichi interni andrebbero associati all'archetipo di edificio
+    phi_ia, phi_st, phi_m = th_fluxes_matrix([user.building], n_intervals, Irradiance, Irradiance_roof)
 
-    # Thermal fluxes
-    phi_sol_gla = user.building.ks_gla * (np.sum(np.multiply(Irradiance, user.building.glazed_area), axis=1).values)
-    phi_sol_opa = user.building.ks_opa * (np.sum(np.multiply(Irradiance, user.building.opaque_area), axis=1).values) + user.building.ks_opa * (np.sum(np.multiply(Irradiance_roof, user.building.opaque_area_roof), axis=1).values)
-    phi_sol_infrared = np.sum(user.building.ks_infra * (user.building.opaque_area))
-    
-    phi_sol_tot = phi_sol_gla + phi_sol_opa - phi_sol_infrared
+    return phi_ia[:, 0], phi_st[:, 0], phi_m[:, 0]
+
+#######################################################################################################################################################
+
+def th_fluxes_matrix(buildings, n_intervals, Irradiance, Irradiance_roof):
+
+    """
+    Thermal fluxes of a set of buildings at once. The solar gains of all the buildings are a single matrix product of the
+    irradiance on the 8 orientations (intervals x orientations) with the surfaces of the buildings weighted by their solar
+    factors (orientations x buildings).
+
+    Parameters
+    ----------
+    buildings : list of BuildingModel
+        Building models
+    n_intervals : int
+        Number of time intervals
+    Irradiance : pandas.DataFrame
+        Solar irradiance on the exterior surfaces of the building
+    Irradiance_roof : pandas.DataFrame
+        Solar irradiance on the roof of the building
+
+    Returns
+    -------
+    phi_ia, phi_st, phi_m : np.ndarray
+        Thermal fluxes to Nodes I, S and M, time intervals x buildings
+    """
+    phi_0=np.ones((n_intervals, 1))*200      # Da modificare, i carichi interni andrebbero associati all'archetipo di edificio
+
+    # Superfici pesate con i fattori solari, orientamenti x edifici
+    solar_area = np.column_stack([b.ks_gla * np.asarray(b.glazed_area, dtype=float) + b.ks_opa * np.asarray(b.opaque_area, dtype=float) for b in buildings])
+    solar_area_roof = np.column_stack([b.ks_opa * np.asarray(b.opaque_area_roof, dtype=float) for b in buildings])
+    phi_sol_infrared = np.array([np.sum(b.ks_infra * (b.opaque_area)) for b in buildings])
+
+    k_a = np.array([b.k_a for b in buildings], dtype=float)
+    k_s = np.array([b.k_s for b in buildings], dtype=float)
+
+    # Thermal fluxes (missing irradiance values count as zero)
+    phi_sol_tot = np.nan_to_num(np.asarray(Irradiance, dtype=float)) @ solar_area + np.nan_to_num(np.asarray(Irradiance_roof, dtype=float)) @ solar_area_roof - phi_sol_infrared
 
-    phi_ia = 0.5 * phi_0
-    phi_m = user.building.k_a * (0.5 * phi_0 + 0.5 * phi_sol_tot)       
-    phi_st  = (1 - user.building.k_a - user.building.k_s) * (0.5 * phi_0 + 0.5 * phi_sol_tot) 
+    phi_ia = np.repeat(0.5 * phi_0, len(buildings), axis=1)
+    phi_m = k_a * (0.5 * phi_0 + 0.5 * phi_sol_tot)       
+    phi_st  = (1 - k_a - k_s) * (0.5 * phi_0 + 0.5 * phi_sol_tot) 
 
     return phi_ia, phi_st, phi_m
\ No newline at end of file
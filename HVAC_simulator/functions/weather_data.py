@@ -1,4 +1,6 @@
+import calendar
 import datetime as dt
+import numpy as np
 import pvlib
 from geopy.geocoders import Nominatim
 import yaml
@@ -7,6 +9,9 @@ from simple_colors import blue
 
 from src.Functions_General import clear_folder_content
 from src.Functions_Energy_Model import suppress_printing
+from src.Functions_Time import rebase_index_to_year
+
+FUTURE_YEARS = range(2020, 2061) # years of the future weather data
 
 def weather_data_generator():
 
@@ -62,7 +67,7 @@ def weather_data_generator():
     climate_data_file.index = climate_data_file.index.tz_convert(None)
 
     first_year = config['start_date'].year
-    climate_data_file.index = climate_data_file.index.map(lambda t: t.replace(year=int(first_year))) # Set index year to start_year
+    climate_data_file.index = rebase_index_to_year(climate_data_file.index, int(first_year)) # Set index year to start_year
 
     climate_data_file = climate_data_file.sort_index()
 
@@ -142,126 +147,207 @@ def create_coordinates_dataset(locations_input):
 
 def build_year_profile(year, df_noleap, feb28):
     base = df_noleap.copy()
-    base.index = base.index.map(lambda t: t.replace(year=year))
+    base.index = rebase_index_to_year(base.index, year)
 
     if pd.Timestamp(year=year, month=1, day=1).is_leap_year:
         feb29_copy = feb28.copy()
-        feb29_copy.index = feb29_copy.index.map(
-            lambda t: t.replace(year=year, month=2, day=29)
-        )
+        feb29_copy.index = rebase_index_to_year(feb29_copy.index, year) + pd.Timedelta(days=1) # Feb 28 -> Feb 29
         base = pd.concat([base, feb29_copy]).sort_index()
 
     return base
 
 #######################################################################################################################################################################
 
-def generate_future_temperature_data(delta_T_future = 1, T_mean_2020 = 15.8):
+def future_weather_base(df_weather_data_tmy):
 
-    config = yaml.safe_load(open("config.yml", 'r'))
-    df_weather_data_tmy = pd.read_csv(config['filename_weather_data'], index_col=0, parse_dates=True) # Load TMY weather data from file
+    """
+    Base profile of the future weather data: the TMY moved to a non-leap year (2020 without Feb 29) and the Feb 28 rows,
+    which are repeated as Feb 29 in the leap years.
 
-    #--------------------------------------------------------------------------------------------------------------------
+    Parameters
+    ----------
+    df_weather_data_tmy : pandas.DataFrame
+        TMY weather data (datetime index)
 
-    # delta_T_future = 1 # °C, a simple assumption for the future temperature increase 
-    # T_mean_2020 = 15.8 # °C, mean temperature in the base year (2020)
+    Returns
+    -------
+    df_noleap : pandas.DataFrame
+        Non-leap-year profile
+    feb28 : pandas.DataFrame
+        Rows of Feb 28
+    """
 
-    #--------------------------------------------------------------------------------------------------------------------
+    df = df_weather_data_tmy.copy()
 
-    df = df_weather_data_tmy[['temp_air']]
+    df.index = rebase_index_to_year(df.index, 2020) # Set index year to start_year
 
-    #--------------------------------------------------------------------------------------------------------------------
+    # extract Feb 28
+    feb28 = df[(df.index.month == 2) & (df.index.day == 28)]
 
-    df.index = df.index.map(lambda t: t.replace(year=2020)) # Set index year to start_year
+    # build a non-leap-year profile (drop Feb 29)
+    df_noleap = df[~((df.index.month == 2) & (df.index.day == 29))].sort_index()
 
-    # extract Feb 28 and Feb 29
-    feb28 = df[(df.index.month == 2) & (df.index.day == 28)]
+    return df_noleap, feb28
 
-    feb29 = feb28.copy()
-    feb29.index = feb29.index.map(
-        lambda t: t.replace(day=29)
-    )
+#######################################################################################################################################################################
 
-    df_2020_leap = pd.concat([df, feb29]).sort_index()
+def future_temperature_offsets(df_noleap, feb28, years = FUTURE_YEARS, delta_T_future = 1, T_mean_2020 = 15.8):
 
-    # build a non-leap-year profile (drop Feb 29)
-    df_noleap = df_2020_leap[~((df_2020_leap.index.month == 2) & (df_2020_leap.index.day == 29))]
+    """
+    Temperature offset of each future year, added to the base profile: linear trend of delta_T_future °C from 2020 to 2040,
+    plus the correction that brings the mean temperature of the base years to T_mean_2020 (if it is lower).
+    The mean over all the years is computed from the base profile, without building the years.
 
-    #--------------------------------------------------------------------------------------------------------------------
+    Parameters
+    ----------
+    df_noleap, feb28 : pandas.DataFrame
+        Base profile (see future_weather_base)
+    years : iterable of int
+        Future years
+    delta_T_future : float
+        Temperature increase from 2020 to 2040 [°C]
+    T_mean_2020 : float
+        Mean temperature in the base year (2020) [°C]
 
-    df_future = pd.concat(
-        [build_year_profile(y, df_noleap, feb28) for y in range(2020, 2061)]
-    )
+    Returns
+    -------
+    offsets : dict
+        Temperature offset of each year [°C]
+    """
 
-    #--------------------------------------------------------------------------------------------------------------------
+    years = list(years)
+    n_leap = sum(calendar.isleap(y) for y in years)
 
     anno_base = 2020
     anno_target = 2040
 
     trend_annuo_breve_termine = delta_T_future / (anno_target - anno_base) # °C/anno
 
-    df_future = df_future.reset_index()
+    # mean temperature of all the years (each leap year has the Feb 28 rows twice)
+    T_mean = (len(years) * df_noleap['temp_air'].sum() + n_leap * feb28['temp_air'].sum()) / (len(years) * len(df_noleap) + n_leap * len(feb28))
 
-    df_future.rename(columns={"index": "datetime"}, inplace=True)
-    df_future["year"] = df_future["datetime"].dt.year
+    return {y: (y - anno_base) * trend_annuo_breve_termine + max(T_mean_2020 - T_mean, 0) for y in years}
 
-    df_future.set_index('datetime', inplace=True)
+#######################################################################################################################################################################
 
-    df_future["delta_T"] = (df_future["year"] - anno_base) * trend_annuo_breve_termine + (max(T_mean_2020 - df_future['temp_air'].mean(), 0))
-    df_future["temp_air_scaled"] = df_future["temp_air"] + df_future["delta_T"]
+def iter_future_weather_years(df_noleap, feb28, offsets):
 
-    #--------------------------------------------------------------------------------------------------------------------
+    """
+    Generates the future weather data one year at a time, as the base profile with the leap day (if any) and the temperature
+    offset of the year, so that only one year is in memory.
 
-    df_future.drop(columns=["year", "delta_T", "temp_air"], inplace=True)
+    Parameters
+    ----------
+    df_noleap, feb28 : pandas.DataFrame
+        Base profile (see future_weather_base)
+    offsets : dict
+        Temperature offset of each year (see future_temperature_offsets)
+
+    Yields
+    ------
+    year : int
+    df_year : pandas.DataFrame
+        Weather data of the year
+    """
 
-    return df_future
+    for year, offset in offsets.items():
+        df_year = build_year_profile(year, df_noleap, feb28)
+        df_year['temp_air'] = df_year['temp_air'] + offset
+
+        yield year, df_year
 
 #######################################################################################################################################################################
 
-def future_weather_data_generator():
-    
-    print(blue("Generating future weather data (2020-2060):", ['bold', 'underlined']))
+def save_future_weather_data(filename, df_noleap, feb28, offsets):
+
+    """
+    Saves the future weather data in a compressed numpy file (.npz): base profile, Feb 28 rows and temperature offset of
+    each year, instead of all the years.
+    """
+
+    np.savez_compressed(filename, 
+                        columns = np.array(df_noleap.columns, dtype=str), 
+                        index_name = np.array(df_noleap.index.name or 'datetime'), 
+                        base_index = df_noleap.index.values.astype('datetime64[ns]'), 
+                        base_values = df_noleap.to_numpy(dtype=float), 
+                        feb28_index = feb28.index.values.astype('datetime64[ns]'), 
+                        feb28_values = feb28.to_numpy(dtype=float), 
+                        years = np.array(list(offsets.keys()), dtype=int), 
+                        offsets = np.array(list(offsets.values()), dtype=float))
+
+#######################################################################################################################################################################
+
+def load_future_weather_data(filename):
+
+    """
+    Loads the future weather data saved by save_future_weather_data.
+
+    Returns
+    -------
+    df_noleap, feb28 : pandas.DataFrame
+        Base profile
+    offsets : dict
+        Temperature offset of each year
+    """
+
+    with np.load(filename) as data:
+        columns = list(data['columns'])
+        index_name = str(data['index_name'])
+
+        df_noleap = pd.DataFrame(data['base_values'], index=pd.DatetimeIndex(data['base_index'], name=index_name), columns=columns)
+        feb28 = pd.DataFrame(data['feb28_values'], index=pd.DatetimeIndex(data['feb28_index'], name=index_name), columns=columns)
+        offsets = dict(zip(data['years'].tolist(), data['offsets'].tolist()))
+
+    return df_noleap, feb28, offsets
+
+#######################################################################################################################################################################
+
+def generate_future_temperature_data(delta_T_future = 1, T_mean_2020 = 15.8):
 
     config = yaml.safe_load(open("config.yml", 'r'))
     df_weather_data_tmy = pd.read_csv(config['filename_weather_data'], index_col=0, parse_dates=True) # Load TMY weather data from file
 
     #--------------------------------------------------------------------------------------------------------------------
 
-    df = df_weather_data_tmy
+    # delta_T_future = 1 # °C, a simple assumption for the future temperature increase 
+    # T_mean_2020 = 15.8 # °C, mean temperature in the base year (2020)
 
     #--------------------------------------------------------------------------------------------------------------------
 
-    df.index = df.index.map(lambda t: t.replace(year=2020)) # Set index year to start_year
+    df_noleap, feb28 = future_weather_base(df_weather_data_tmy[['temp_air']])
 
-    # extract Feb 28 and Feb 29
-    feb28 = df[(df.index.month == 2) & (df.index.day == 28)]
+    offsets = future_temperature_offsets(df_noleap, feb28, FUTURE_YEARS, delta_T_future, T_mean_2020)
 
-    feb29 = feb28.copy()
-    feb29.index = feb29.index.map(
-        lambda t: t.replace(day=29)
-    )
+    #--------------------------------------------------------------------------------------------------------------------
 
-    df_2020_leap = pd.concat([df, feb29]).sort_index()
+    df_future = pd.concat([df_year for _, df_year in iter_future_weather_years(df_noleap, feb28, offsets)])
 
-    # build a non-leap-year profile (drop Feb 29)
-    df_noleap = df_2020_leap[~((df_2020_leap.index.month == 2) & (df_2020_leap.index.day == 29))]
+    df_future.rename(columns={"temp_air": "temp_air_scaled"}, inplace=True)
 
-    #--------------------------------------------------------------------------------------------------------------------
+    return df_future
+
+#######################################################################################################################################################################
+
+def future_weather_data_generator(delta_T_future = 1, T_mean_2020 = 15.8):
+    
+    print(blue("Generating future weather data (2020-2060):", ['bold', 'underlined']))
 
-    df_future = pd.concat(
-        [build_year_profile(y, df_noleap, feb28) for y in range(2020, 2061)]
-    )
+    config = yaml.safe_load(open("config.yml", 'r'))
+    df_weather_data_tmy = pd.read_csv(config['filename_weather_data'], index_col=0, parse_dates=True) # Load TMY weather data from file
 
     #--------------------------------------------------------------------------------------------------------------------
 
-    print("- Generating future temperature data (2020-2060)...")
+    # Ogni anno è il profilo base (TMY) con il giorno bisestile e lo scostamento di temperatura dell'anno: 
+    # si salvano solo il profilo base e gli scostamenti, gli anni sono generati quando servono
+    df_noleap, feb28 = future_weather_base(df_weather_data_tmy)
 
-    df_T_future = generate_future_temperature_data()
+    print("- Generating future temperature data (2020-2060)...")
 
-    df_future['temp_air'] = df_T_future['temp_air_scaled']
+    offsets = future_temperature_offsets(df_noleap, feb28, FUTURE_YEARS, delta_T_future, T_mean_2020)
 
     #--------------------------------------------------------------------------------------------------------------------
 
-    df_future.to_csv(config['folder_weather_data'] + 'weather_data_future_2020_2060.csv')
+    save_future_weather_data(config['filename_future_weather_data'], df_noleap, feb28, offsets)
 
     print(f"**** Future weather data (2020-2060) extracted and saved! ****\n")
 
@@ -272,9 +358,7 @@ def select_years_future_weather_data():
     print(blue("Selecting years from future weather data:", ['bold', 'underlined']))
 
     config = yaml.safe_load(open('config.yml'))
-    df = pd.read_csv(config['filename_future_weather_data'], index_col=0)
-
-    df.index = pd.to_datetime(df.index)
+    df_noleap, feb28, offsets = load_future_weather_data(config['filename_future_weather_data'])
 
     start_year = int(config['start_date'].year)
     n_years = config['project_lifetime_yrs']
@@ -283,31 +367,13 @@ def select_years_future_weather_data():
     print(f"- starting year: {start_year}")
     print(f"- ending year: {end_year}")
 
-    # filtro le righe del DataFrame
-    df_filtered = df[(df.index.year >= start_year) & (df.index.year <= end_year)]
-
-    df_filtered.to_csv(config['folder_weather_data'] + 'weather_data_selected_years.csv')
-
-    print("**** Done! ****")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    # genero solo gli anni selezionati, scritti uno alla volta
+    offsets = {y: offset for y, offset in offsets.items() if start_year <= y <= end_year}
 
+    filename = config['folder_weather_data'] + 'weather_data_selected_years.csv'
+    df_noleap.iloc[:0].to_csv(filename) # header
 
+    for _, df_year in iter_future_weather_years(df_noleap, feb28, offsets):
+        df_year.to_csv(filename, mode='a', header=False)
 
+    print("**** Done! ****")
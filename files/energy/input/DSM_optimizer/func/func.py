@@ -1,5 +1,4 @@
 import numpy as np
-import random
 import yaml
 # Sezione di print: 
 import pandas as pd
@@ -197,255 +196,184 @@ def first_nonzero_index(arr):
 
 ###################################################################################################################################################
 
-# Function to calculate total energy cost for a device on/off schedule
-# Precedente
-# def calculate_device_cost(device_schedule, immission_profile, max_power_contract, energy_cost_per_hour):
-    
-    # total_energy_cost = 0
-    # total_energy_consumption = 0
-    # total_energy_shared      = 0
-    # incentivo = 0.11
-    # total_cost = 0
-    
-    # num_intervals = len(device_schedule[0])
-    # for t in range(num_intervals):
-    #     total_power = sum(device[t] for device in device_schedule)
-        
-                
-    #     for device in device_schedule:
-    #         # Verifica del vincolo di potenza contrattuale massima
-    #         if device[t] > max_power_contract:
-    #             return float('inf')  # Penalità per violazione del vincolo
-        
-    #     total_energy_cost = total_power*energy_cost_per_hour[t]
-    #     total_energy_shared = min(total_power, immission_profile[t])*incentivo
-            
-    #     # # Se supero energia immessa:
-    #     # if total_power > immission_profile[t]:
-    #     #     total_energy_cost += total_power
+def pad_consumption_profiles(consumption_profiles):
+    """funzione per raccogliere i profili di consumo dei dispositivi in una matrice, completata con zeri
 
-    #     # Calcolo del costo considerando l'immissione nel profilo
-    #     total_cost += total_energy_cost - total_energy_shared
-    # return total_cost
+    Args:
+        consumption_profiles (list): profili di consumo dei dispositivi (uno per dispositivo, di lunghezza diversa)
+
+    Returns:
+        array: matrice (dispositivi x lunghezza massima) dei profili di consumo
+        array: lunghezza del profilo di consumo di ogni dispositivo
+    """
+    lengths = np.array([len(profile) for profile in consumption_profiles], dtype=int)
+    profiles = np.zeros((len(consumption_profiles), max(lengths.max(initial=0), 1)))
+    for i, profile in enumerate(consumption_profiles):
+        profiles[i, :lengths[i]] = profile
+    return profiles, lengths
 
 ###################################################################################################################################################
 
-# Post rev. NO check
-# def calculate_device_cost(device_schedule, immission_profile, energy_cost_per_hour):
-#     device_schedule = np.array(device_schedule)
-#     total_power = device_schedule.sum(axis=0)
+def calculate_possible_starts(allowed_intervals, lengths):
+    """funzione per calcolare i possibili istanti di attivazione di ogni dispositivo: il profilo deve terminare entro l'ultimo intervallo permesso
 
-#     total_energy_cost = total_power * np.array(energy_cost_per_hour)
-#     total_energy_shared = np.minimum(total_power, immission_profile) * 0.11
-#     total_cost = total_energy_cost.sum() - total_energy_shared.sum()   
-#     return total_cost
+    Args:
+        allowed_intervals (list): intervalli con immissione positiva
+        lengths (array): lunghezza del profilo di consumo di ogni dispositivo
 
-###################################################################################################################################################
+    Returns:
+        array: matrice (dispositivi x intervalli permessi) dei possibili istanti di attivazione, ogni riga è valida fino a n_starts
+        array: numero di possibili istanti di attivazione per ogni dispositivo
+    """
+    allowed_intervals = np.asarray(allowed_intervals, dtype=int)
+    if len(allowed_intervals) == 0:
+        raise ValueError("No allowed intervals: the immission profile is zero all day")
 
-def calculate_device_cost(device_schedule, immission_profile, energy_cost_per_hour):
-    
-    # device_schedule = np.asarray(device_schedule)
-    # total_power = device_schedule.sum(axis=0)
-    total_power = np.sum(device_schedule, axis=0)
-    total_energy_cost = np.dot(total_power, energy_cost_per_hour)
-    
-    total_energy_shared = np.dot(np.minimum(total_power, immission_profile), 0.11)
-    
-    total_cost = total_energy_cost.sum() - total_energy_shared.sum()
-    return total_cost
+    # gli intervalli permessi sono ordinati, quindi i possibili istanti di un dispositivo sono i primi n_starts
+    n_starts = np.searchsorted(allowed_intervals, allowed_intervals[-1] - lengths + 1, side='right')
+    if (n_starts == 0).any():
+        raise ValueError("Some consumption profiles are longer than the allowed intervals")
 
-# Objective function to calculate total energy cost for all solutions
-# def objective_function(solutions):
-#     total_costs = []
-#     for solution in solutions:
-#         total_cost = np.sum(calculate_device_cost(solution, consumption_profiles))
-#         total_costs.append(total_cost)
-#     return total_costs
+    return np.broadcast_to(allowed_intervals, (len(lengths), len(allowed_intervals))), n_starts
 
 ###################################################################################################################################################
 
-# Funzione per generare una soluzione casuale rispettando il profilo di consumo di ciascun dispositivo
-# PRE rev. 
-def generate_random_solution(num_intervals, consumption_profiles, allowed_intervals, possible_starts):
-    solution = []
-    for profile in consumption_profiles:
-        # Seleziona casualmente un punto di inizio nel profilo di consumo
-        # Integro ora il vincolo sugli istanti di tempo permessi:            
-        start_index = random.choice(possible_starts)
-        # start_index = np.random.randint(0, num_intervals - len(profile))
-        # Costruisci il programma di utilizzo del dispositivo utilizzando il profilo di consumo
-        device_schedule = [0] * num_intervals
-        device_schedule[start_index:start_index + len(profile)] = profile
-        solution.append(device_schedule)
-    return solution
+def generate_random_starts(rng, possible_starts, n_starts, size):
+    """funzione per generare istanti di attivazione casuali (uniformi tra i possibili) per ogni dispositivo
 
-###################################################################################################################################################
+    Args:
+        rng (numpy.random.Generator): generatore di numeri casuali
+        possible_starts (array): matrice (dispositivi x intervalli permessi) dei possibili istanti di attivazione
+        n_starts (array): numero di possibili istanti di attivazione per ogni dispositivo
+        size (int): numero di soluzioni da generare
 
-# def generate_random_solution(num_intervals, consumption_profiles, allowed_intervals, possible_starts):
-#     solution = np.zeros((len(consumption_profiles), num_intervals))
-#     profile_lengths = np.array([len(profile) for profile in consumption_profiles])
-    
-#     for i, profile in enumerate(consumption_profiles):
-#         start_index = np.random.choice(possible_starts)
-#         solution[i, start_index:start_index + profile_lengths[i]] = profile
-    
-#     return solution
+    Returns:
+        array: matrice (soluzioni x dispositivi) degli istanti di attivazione
+    """
+    index = (rng.random((size, len(n_starts))) * n_starts).astype(int)
+    return possible_starts[np.arange(len(n_starts)), index]
 
 ###################################################################################################################################################
 
-# #Mutation function to randomly modify an existing solution
-def mutate_solution(solution, mutation_rate, consumption_profiles, allowed_intervals, num_intervals, possible_starts):
-    for i, device_schedule in enumerate(solution):
-        if np.random.rand() < mutation_rate:
-            # Seleziona casualmente un nuovo punto di inizio per il profilo di consumo
-            # Integro ora il vincolo sugli istanti di tempo permessi:            
-            profile = consumption_profiles[i]            
-            new_start_index = random.choice(possible_starts)
-            #new_start_index = np.random.randint(0, len(device_schedule) - len(profile))
-            # Aggiorna il programma di utilizzo del dispositivo
-            new_device_schedule = [0] * len(device_schedule)
-            new_device_schedule[new_start_index:new_start_index + len(profile)] = profile
-            solution[i] = new_device_schedule
-    return solution
+def render_schedules(starts, profiles, lengths, num_intervals):
+    """funzione per costruire i programmi di utilizzo dei dispositivi a partire dagli istanti di attivazione (scatter di tutti i profili in una volta)
+
+    Args:
+        starts (array): matrice (soluzioni x dispositivi) degli istanti di attivazione
+        profiles (array): matrice (dispositivi x lunghezza massima) dei profili di consumo
+        lengths (array): lunghezza del profilo di consumo di ogni dispositivo
+        num_intervals (int): numero di intervalli del giorno
+
+    Returns:
+        array: matrice (soluzioni x dispositivi x intervalli) dei programmi di utilizzo
+    """
+    n_solutions, n_devices = starts.shape
+    schedules = np.zeros((n_solutions, n_devices, num_intervals))
+
+    k = np.arange(profiles.shape[1])
+    solution, device, step = np.nonzero(np.broadcast_to(k < lengths[:, None], (n_solutions, n_devices, len(k))))
+    schedules[solution, device, starts[solution, device] + step] = profiles[device, step]
+    return schedules
 
 ###################################################################################################################################################
 
-# def mutate_solution(solution, mutation_rate, consumption_profiles, allowed_intervals, num_intervals, possible_starts):
-#     profile_lengths = np.array([len(profile) for profile in consumption_profiles])
-    
-#     for i, device_schedule in enumerate(solution):
-#         if np.random.rand() < mutation_rate:
-#             profile = consumption_profiles[i]
-#             new_start_index = np.random.choice(possible_starts)
-#             solution[i, :] = 0
-#             solution[i, new_start_index:new_start_index + profile_lengths[i]] = profile
-    
-#     return solution
+def calculate_device_cost(schedules, immission_profile, energy_cost_per_hour):
+    """funzione obiettivo: costo dell'energia consumata meno l'incentivo sull'energia condivisa, per tutte le soluzioni in una volta
+
+    Args:
+        schedules (array): matrice (soluzioni x dispositivi x intervalli) dei programmi di utilizzo
+        immission_profile (array): profilo di immissione
+        energy_cost_per_hour (array): costo dell'energia in ogni intervallo
+
+    Returns:
+        array: costo totale di ogni soluzione
+    """
+    total_power = schedules.sum(axis=1)
+    total_energy_cost = total_power @ energy_cost_per_hour
+    total_energy_shared = np.minimum(total_power, immission_profile).sum(axis=1) * 0.11
+    return total_energy_cost - total_energy_shared
 
 ###################################################################################################################################################
 
-# PRE 
 #Algoritmo genetico
-def genetic_algorithm(num_intervals, population_size, generations, mutation_rate, consumption_profiles,immission_profile, max_power_contract, energy_cost_per_hour, allowed_intervals):
-    
+def genetic_algorithm(num_intervals, population_size, generations, mutation_rate, consumption_profiles,immission_profile, max_power_contract, energy_cost_per_hour, allowed_intervals, rng = None):
+    """algoritmo genetico per l'ottimizzazione degli istanti di attivazione dei dispositivi.
+    Ogni soluzione è rappresentata dagli istanti di attivazione dei dispositivi, quindi la popolazione è una matrice di interi (soluzioni x dispositivi)
+    e la funzione obiettivo è calcolata per tutta la popolazione in una volta.
+
+    Args:
+        rng (numpy.random.Generator, optional): generatore di numeri casuali. Se None, ne viene creato uno nuovo.
+
+    Returns:
+        array: programma di utilizzo (dispositivi x intervalli) della soluzione migliore
+        float: costo della soluzione migliore
+        list: costo della soluzione migliore di ogni generazione
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    immission_profile = np.asarray(immission_profile, dtype=float)
+    energy_cost_per_hour = np.asarray(energy_cost_per_hour, dtype=float)
+
     # calcolo possibili istanti attivazione:
-    for profile in consumption_profiles:
-        possible_starts = [i for i in allowed_intervals if i + len(profile)-1 <= allowed_intervals[-1]] #ultimo valore di allowed intervals
-        possible_starts = sorted(possible_starts, key=lambda x: -sum(immission_profile[x:x + len(profile)]))
-        
+    profiles, lengths = pad_consumption_profiles(consumption_profiles)
+    possible_starts, n_starts = calculate_possible_starts(allowed_intervals, lengths)
+    n_devices = len(lengths)
+
+    def fitness(population):
+        return calculate_device_cost(render_schedules(population, profiles, lengths, num_intervals), immission_profile, energy_cost_per_hour)
+
     # Inizializza la popolazione iniziale di soluzioni casuali
-    population = [generate_random_solution(num_intervals, consumption_profiles, allowed_intervals, possible_starts) for _ in range(population_size)]
-    
+    population = generate_random_starts(rng, possible_starts, n_starts, population_size)
+    n_parents = max(2, population_size // 2)
+    n_children = population_size - n_parents
+
     # per analisi, eliminare poi: 
     best_solution_gen_value =[]
     
     # Esegui le iterazioni per un numero fisso di generazioni
     for generation in range(generations):
         # Calcola il valore di fitness per ogni soluzione nella popolazione
-        # fitness_values = objective_function(population, consumption_profiles)
-        fitness_values = [np.sum(calculate_device_cost(solution, immission_profile, energy_cost_per_hour)) for solution in population]
+        fitness_values = fitness(population)
         
-        # Seleziona i genitori in base al loro valore di fitness
-        parents = [population[i] for i in np.argsort(fitness_values)[:int(population_size/2)]]  
+        # Seleziona i genitori in base al loro valore di fitness (il primo è il migliore)
+        parents = population[np.argsort(fitness_values, kind='stable')[:n_parents]]
         
-        # Genera nuovi individui attraverso incrocio (crossover)
-        children = []
-        for _ in range(population_size - len(parents)):
-            parent1, parent2 = random.sample(parents, 2)
-            crossover_point = np.random.randint(num_intervals)
-            child = parent1[:crossover_point] + parent2[crossover_point:]
-            #child = np.concatenate((parent1[:, :crossover_point], parent2[:, crossover_point:]), axis=1)
-            children.append(child)
+        # Genera nuovi individui attraverso incrocio (crossover) in un punto, tra coppie di genitori diversi
+        parent1 = rng.integers(n_parents, size=n_children)
+        parent2 = (parent1 + rng.integers(1, n_parents, size=n_children)) % n_parents
+        crossover_point = rng.integers(0, n_devices, size=n_children, endpoint=True)
+        children = np.where(np.arange(n_devices) < crossover_point[:, None], parents[parent1], parents[parent2])
 
         # Aggiorna la popolazione con nuovi individui generati attraverso crossover e mutazione
-        population = parents + children
-        population = [mutate_solution(solution, mutation_rate, consumption_profiles, allowed_intervals, num_intervals, possible_starts) for solution in population]
+        population = np.concatenate([parents, children])
+        mutation = rng.random(population.shape) < mutation_rate
+        population = np.where(mutation, generate_random_starts(rng, possible_starts, n_starts, len(population)), population)
         
         # Elitismo: conserva la migliore soluzione
-        best_solution = min(population, key=lambda sol: calculate_device_cost(sol, immission_profile, energy_cost_per_hour))
-        population[0] = best_solution
+        population[0] = parents[0]
         
-        # Introduci diversità ogni 10 generazioni
+        # Introduci diversità ogni 5 generazioni
         if generation % 5 == 0:
-            for i in range(len(population)):
-                if np.random.rand() < 0.1:
-                    population[i] = generate_random_solution(num_intervals, consumption_profiles,allowed_intervals, possible_starts)    
-        
+            new = rng.random(len(population)) < 0.1
+            new[0] = False
+            population[new] = generate_random_starts(rng, possible_starts, n_starts, new.sum())
         
         # Per analisi ---> da eliminare poi
-        best_solution_gen_value.append(fitness_values[np.argmin(fitness_values)])
+        best_solution_gen_value.append(fitness_values.min())
         
     # Calcola il valore di fitness per ogni soluzione nella popolazione finale
-    fitness_values = [np.sum(calculate_device_cost(solution, immission_profile, energy_cost_per_hour)) for solution in population]
+    fitness_values = fitness(population)
     
     # Trova e restituisci la migliore soluzione
     best_solution_index = np.argmin(fitness_values)
-    best_solution = population[best_solution_index]
+    best_solution = render_schedules(population[best_solution_index:best_solution_index + 1], profiles, lengths, num_intervals)[0]
     best_cost = fitness_values[best_solution_index]
     
     return best_solution, best_cost, best_solution_gen_value
 
 ###################################################################################################################################################
 
-# POST using Concurrency: too slow
-
-# from concurrent.futures import ProcessPoolExecutor
-# def calculate_fitness(solution, immission_profile, energy_cost_per_hour):
-#     return calculate_device_cost(solution, immission_profile, energy_cost_per_hour)
-
-###################################################################################################################################################
-
-# def fitness_wrapper(args):
-#     solution, immission_profile, energy_cost_per_hour = args
-#     return calculate_fitness(solution, immission_profile, energy_cost_per_hour)
-
-###################################################################################################################################################
-
-# # # # POST rev No Check
-# def genetic_algorithm(num_intervals, population_size, generations, mutation_rate, consumption_profiles, immission_profile, max_power_contract, energy_cost_per_hour, allowed_intervals):
-#     population = [generate_random_solution(num_intervals, consumption_profiles, allowed_intervals, immission_profile) for _ in range(population_size)]
-    
-#     best_solution_gen_value = []
-    
-#     with ProcessPoolExecutor() as executor:
-#         for generation in range(generations):
-#             fitness_values = list(executor.map(fitness_wrapper, [(sol, immission_profile, energy_cost_per_hour) for sol in population]))
-            
-#             parents = [population[i] for i in np.argsort(fitness_values)[:int(population_size / 2)]]
-            
-#             children = []
-#             for _ in range(population_size - len(parents)):
-#                 parent1, parent2 = random.sample(parents, 2)
-#                 crossover_point = np.random.randint(num_intervals)
-#                 if len(parent1) != len(parent2):
-#                     parent1, parent2 = np.broadcast_to(parent1, (len(parent2), len(parent2[0]))), np.broadcast_to(parent2, (len(parent1), len(parent1[0])))
-#                 child = np.concatenate((parent1[:crossover_point], parent2[crossover_point:]), axis=0)
-#                 children.append(child)
-            
-#             population = parents + children
-#             population = parents + children
-#             population = [mutate_solution(solution, mutation_rate, consumption_profiles, allowed_intervals, num_intervals, immission_profile) for solution in population]
-            
-#             best_solution = min(population, key=lambda sol: fitness_wrapper((sol, immission_profile, energy_cost_per_hour)))
-#             population[0] = best_solution
-            
-#             if generation % 5 == 0:
-#                 for i in range(len(population)):
-#                     if np.random.rand() < 0.1:
-#                         population[i] = generate_random_solution(num_intervals, consumption_profiles, allowed_intervals, immission_profile)
-            
-#             best_solution_gen_value.append(min(fitness_values))
-    
-#     fitness_values = [fitness_wrapper((sol, immission_profile, energy_cost_per_hour)) for sol in population]
-    
-#     best_solution_index = np.argmin(fitness_values)
-#     best_solution = population[best_solution_index]
-#     best_cost = fitness_values[best_solution_index]
-    
-#     return best_solution, best_cost, best_solution_gen_value
-
-###################################################################################################################################################
-
 
 
 ###################################################################################################################################################
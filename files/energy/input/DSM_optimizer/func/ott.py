@@ -2,11 +2,36 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from files.energy.input.DSM_optimizer.func.func import genetic_algorithm, stampa_result
+from files.energy.input.DSM_optimizer.func.solvers import DSM_SOLVERS, greedy_solver, milp_solver
 
 ###################################################################################################################################################
 
-def ottimizzazione(immission_profile, consumption_profiles,num_intervals, day, create_plot = True, show_plot = True):
+def device_columns(n_devices):
+    # nomi delle colonne dei dispositivi: user_0_washing_machine, user_0_dish_washer, user_1_washing_machine, ...
+    columns = []    
+    for u in range(int(n_devices/2)):
+        for key in ['washing_machine','dish_washer']:
+            columns.append(f'user_{u}_{key}')
+    return columns
+
+###################################################################################################################################################
+
+def ottimizzazione(immission_profile, consumption_profiles,num_intervals, day, create_plot = True, show_plot = True, solver = 'ga'):
     
+    assert solver in DSM_SOLVERS, "DSM solver not available: " + str(solver)
+
+    # solutori greedy e MILP: il programma di utilizzo è ottenuto direttamente, senza la seconda ottimizzazione dei dispositivi in surplus
+    if solver != 'ga':
+        if solver == 'greedy':
+            schedule = greedy_solver(immission_profile, consumption_profiles, num_intervals)
+        elif solver == 'milp':
+            schedule = milp_solver(immission_profile, consumption_profiles, num_intervals)
+
+        df_plot = pd.DataFrame(data=np.transpose(schedule), index=np.arange(num_intervals), columns=device_columns(len(consumption_profiles)))
+        if create_plot:
+            stampa_result(df_plot, immission_profile, num_intervals, day, show_plot)
+        return df_plot
+
     ##### Trovare valori permessi immissione nei quali andare a inserire elettrodomestici:
     # Trovare gli indici dei valori maggiori di zero
        
@@ -107,13 +132,7 @@ def ottimizzazione(immission_profile, consumption_profiles,num_intervals, day, c
     
     ##############
     # Creazione delle colonne in modo compatto
-    u = 0
-    #columns = [f'user_{u}_{key}' for key, count in sched_dev.items() for _ in range(1, count + 1)]
-    columns = []    
-    for count in range(int(n_devices/2)):
-        for key in ['washing_machine','dish_washer']:
-            columns.append(f'user_{u}_{key}')
-        u = u +1
+    columns = device_columns(n_devices)
 
     # Creazione del DataFrame
     df_plot = pd.DataFrame(data=np.transpose(best_solution[0]),
@@ -0,0 +1,109 @@
+import numpy as np
+import pulp as plp
+from pulp.apis.coin_api import PULP_CBC_CMD
+from numpy.lib.stride_tricks import sliding_window_view
+from files.energy.input.DSM_optimizer.func.func import pad_consumption_profiles, calculate_possible_starts, render_schedules
+
+# Solutori alternativi all'algoritmo genetico per l'ottimizzazione giornaliera degli istanti di attivazione dei dispositivi.
+# Tutti ricevono il profilo di immissione e i profili di consumo dei dispositivi e restituiscono il programma di utilizzo (dispositivi x intervalli),
+# con gli stessi istanti di attivazione permessi dell'algoritmo genetico (il profilo deve terminare entro l'ultimo intervallo con immissione positiva).
+
+DSM_SOLVERS = ['ga', 'greedy', 'milp']
+
+###################################################################################################################################################
+
+def greedy_solver(immission_profile, consumption_profiles, num_intervals):
+    """solutore greedy: i dispositivi, dal più energivoro, sono attivati uno alla volta nell'istante che massimizza
+    l'energia condivisa aggiuntiva con l'immissione residua (massima sovrapposizione)
+
+    Args:
+        immission_profile (array): profilo di immissione
+        consumption_profiles (list): profili di consumo dei dispositivi
+        num_intervals (int): numero di intervalli del giorno
+
+    Returns:
+        array: programma di utilizzo (dispositivi x intervalli)
+    """
+    immission_profile = np.asarray(immission_profile, dtype=float)
+    allowed_intervals = np.where(immission_profile > 0)[0]
+
+    profiles, lengths = pad_consumption_profiles(consumption_profiles)
+    possible_starts, n_starts = calculate_possible_starts(allowed_intervals, lengths)
+
+    starts = np.zeros(len(lengths), dtype=int)
+    residual = immission_profile.copy() # immissione non ancora condivisa
+
+    for d in np.argsort(-profiles.sum(axis=1), kind='stable'):
+        profile = profiles[d, :lengths[d]]
+        candidates = possible_starts[d, :n_starts[d]]
+
+        # energia condivisa aggiuntiva per ogni possibile istante di attivazione
+        windows = sliding_window_view(np.clip(residual, 0, None), lengths[d])[candidates]
+        gain = np.minimum(windows, profile).sum(axis=1)
+
+        starts[d] = candidates[np.argmax(gain)]
+        residual[starts[d]:starts[d] + lengths[d]] -= profile
+
+    return render_schedules(starts[None, :], profiles, lengths, num_intervals)[0]
+
+###################################################################################################################################################
+
+def milp_solver(immission_profile, consumption_profiles, num_intervals, time_limit = None):
+    """solutore MILP (PuLP/CBC): massimizza l'energia condivisa, somma su tutti gli intervalli di min(consumo totale, immissione).
+    I dispositivi con lo stesso profilo di consumo sono raggruppati, quindi le variabili sono il numero di dispositivi di ogni gruppo
+    attivati in ogni istante (variabili intere), senza soluzioni simmetriche.
+
+    Args:
+        immission_profile (array): profilo di immissione
+        consumption_profiles (list): profili di consumo dei dispositivi
+        num_intervals (int): numero di intervalli del giorno
+        time_limit (float, optional): tempo massimo di calcolo del solutore (s). Se None, senza limite.
+
+    Returns:
+        array: programma di utilizzo (dispositivi x intervalli)
+    """
+    immission_profile = np.asarray(immission_profile, dtype=float)
+    allowed_intervals = np.where(immission_profile > 0)[0]
+
+    profiles, lengths = pad_consumption_profiles(consumption_profiles)
+    possible_starts, n_starts = calculate_possible_starts(allowed_intervals, lengths)
+
+    # gruppi di dispositivi con lo stesso profilo di consumo
+    groups = {}
+    for d in range(len(lengths)):
+        groups.setdefault(tuple(profiles[d, :lengths[d]]), []).append(d)
+    groups = list(groups.values())
+
+    opt_model = plp.LpProblem("DSM", plp.LpMaximize)
+
+    n = {} # numero di dispositivi del gruppo g attivati nell'istante s
+    power = [[] for t in range(num_intervals)] # termini del consumo totale in ogni intervallo
+    for g, devices in enumerate(groups):
+        d = devices[0]
+        for s in possible_starts[d, :n_starts[d]]:
+            n[g, s] = plp.LpVariable(f"n_{g}_{s}", lowBound=0, upBound=len(devices), cat=plp.LpInteger)
+            for k in range(lengths[d]):
+                power[s + k].append(profiles[d, k] * n[g, s])
+
+        opt_model += plp.lpSum(n[g, s] for s in possible_starts[d, :n_starts[d]]) == len(devices) # ogni dispositivo è attivato una volta
+
+    # energia condivisa in ogni intervallo con immissione positiva
+    shared = {}
+    for t in allowed_intervals:
+        shared[t] = plp.LpVariable(f"shared_{t}", lowBound=0, upBound=immission_profile[t])
+        opt_model += shared[t] <= plp.lpSum(power[t])
+
+    opt_model.setObjective(plp.lpSum(shared.values()))
+    opt_model.solve(PULP_CBC_CMD(msg=False, timeLimit=time_limit))
+
+    if opt_model.sol_status not in (plp.LpSolutionOptimal, plp.LpSolutionIntegerFeasible):
+        raise ValueError("DSM MILP not solved: " + plp.LpStatus[opt_model.status])
+
+    # assegno gli istanti di attivazione ai dispositivi di ogni gruppo
+    starts = np.zeros(len(lengths), dtype=int)
+    for g, devices in enumerate(groups):
+        d = devices[0]
+        group_starts = np.repeat(possible_starts[d, :n_starts[d]], [int(round(n[g, s].varValue)) for s in possible_starts[d, :n_starts[d]]])
+        starts[devices] = group_starts
+
+    return render_schedules(starts[None, :], profiles, lengths, num_intervals)[0]
@@ -1,8 +1,13 @@
 # Import Librerie
+import os
 import yaml
+import hashlib
+import pickle
 import pandas as pd
 from files.energy.input.DSM_optimizer.func.ott import ottimizzazione
+from files.energy.input.DSM_optimizer.func.func import stampa_result
 import numpy as np 
+from concurrent.futures import ProcessPoolExecutor
 from simple_colors import *
 
 def crea_lista_consumi(directory, n_user):
@@ -19,86 +24,155 @@ def crea_lista_consumi(directory, n_user):
 
     return lista_consumi   
 
-def aggiorna_start_time_dict(user_dict, primi_positivi, cont):
-    # day_index = f'day_{cont+1}'  # Crea l'indice come 'day_0', 'day_1', ecc.
-    day_index = cont
+def primi_istanti_attivazione(df_dev_scheduled, n_user, appliances):
+    """Trova per ogni utente e per ogni elettrodomestico il primo istante di attivazione (il primo con consumo positivo)
 
-    for idx, (key, value) in enumerate(primi_positivi.items()):
-        # Dividi la stringa della colonna in 'user', numero utente, e tipo di appliance
-        parts = key.split('_')  # ['user', '0', 'washing', 'machine']
-        user = f"{parts[0]}_{parts[1]}"  # Crea user_0, user_1, etc.
-        appliance = f"{parts[2]}_{parts[3]}"  # Crea washing_machine o dish_washer
-        
-        # Se l'utente non è ancora nel dizionario, crea un nuovo DataFrame vuoto per quell'utente
-        if user not in user_dict:
-            user_dict[user] = pd.DataFrame(columns=['washing_machine', 'dish_washer'])
-
-        # Aggiungi una riga con i valori per 'washing_machine' e 'dish_washer' per il giorno corrente
-        if appliance == 'washing_machine':
-            if day_index not in user_dict[user].index:
-                user_dict[user].loc[day_index] = [value, None]  # Inizializza la riga per il giorno
-            else:
-                user_dict[user].at[day_index, 'washing_machine'] = value  # Aggiungi washing machine value
-        elif appliance == 'dish_washer':
-            if day_index not in user_dict[user].index:
-                user_dict[user].loc[day_index] = [None, value]  # Inizializza la riga per il giorno
-            else:
-                user_dict[user].at[day_index, 'dish_washer'] = value  # Aggiungi dish washer value
+    Args:
+        df_dev_scheduled (dataframe): programma di utilizzo (intervalli x dispositivi), colonne 'user_<n>_<appliance>'
+        n_user (int): numero di utenti
+        appliances (list): elettrodomestici di ogni utente
+
+    Returns:
+        array: istanti di attivazione (utenti x elettrodomestici), -1 se il dispositivo non è attivato
+    """
+    start_time = np.full((n_user, len(appliances)), -1, dtype=np.int16)
+    active = df_dev_scheduled.values > 0
+    first = np.where(active.any(axis=0), active.argmax(axis=0), -1)
+
+    for column, value in zip(df_dev_scheduled.columns, first):
+        parts = column.split('_', 2)  # ['user', '0', 'washing_machine']
+        start_time[int(parts[1]), appliances.index(parts[2])] = value
+    return start_time
+
+def ott_day(cont, immissione_giornaliera, consumption_profiles, num_intervals, solver):
+    """Ottimizzazione di un singolo giorno (eseguita anche nei processi paralleli di ott_year).
+
+    Returns:
+        cont (int): indice del giorno
+        df_dev_scheduled (dataframe): programma di utilizzo ottimizzato, None se il giorno non è ottimizzato
+        status (str): 'optimized', 'skipped' (immissione nulla) o 'failed'
+        error (str): errore dell'ottimizzazione, stringa vuota se non fallita
+    """
+    if (immissione_giornaliera == 0).all():
+        return cont, None, 'skipped', ''
 
-    return user_dict
+    try:
+        df_dev_scheduled = ottimizzazione(immission_profile=immissione_giornaliera,
+                                          consumption_profiles=consumption_profiles,
+                                          num_intervals=num_intervals,
+                                          day = cont,
+                                          create_plot = False,
+                                          show_plot = False,
+                                          solver = solver
+                                          )
+    except Exception as error:
+        return cont, None, 'failed', type(error).__name__ + ': ' + str(error)
 
+    return cont, df_dev_scheduled, 'optimized', ''
 
-def ott_year(df_immission, n_devices, create_plot = True, show_plot = True):
+def plot_ott_year(schedules, df_immission, num_intervals = 96, show_plot = True):
+    """Grafici dei giorni ottimizzati (post-processing di ott_year)
+
+    Args:
+        schedules (dict): programma di utilizzo ottimizzato di ogni giorno {indice del giorno: dataframe}
+        df_immission (series): profilo di immissione di tutti i giorni
+    """
+    immission_days = df_immission.values.reshape(-1, num_intervals)
+    for cont, df_dev_scheduled in schedules.items():
+        stampa_result(df_dev_scheduled, immission_days[cont], num_intervals, cont, show_plot)
+
+def chiave_giorno(day, immissione_giornaliera, chiave_dispositivi):
+    """Chiave della cache di un giorno: (giorno, hash del profilo di immissione del giorno, hash dei dispositivi e del solutore)"""
+    return (str(day), hashlib.sha256(np.ascontiguousarray(immissione_giornaliera, dtype=float).tobytes()).hexdigest(), chiave_dispositivi)
+
+def chiave_dispositivi(consumption_profiles, solver):
+    """Hash dell'insieme dei dispositivi (numero e profili di consumo) e del solutore: se cambia, tutti i giorni sono ottimizzati di nuovo"""
+    h = hashlib.sha256(solver.encode())
+    for profile in consumption_profiles:
+        h.update(np.asarray(profile, dtype=float).tobytes() + b'|')
+    return h.hexdigest()
+
+def ott_year(df_immission, n_devices, create_plot = True, show_plot = True, solver = 'ga', n_workers = None, cache_file = None):
+    """Ottimizzazione degli istanti di attivazione di lavatrici e lavastoviglie per tutti i giorni del profilo di immissione.
+    I giorni sono indipendenti, quindi con n_workers > 1 sono ottimizzati in parallelo.
+
+    Args:
+        df_immission (series): profilo di immissione (96 intervalli per giorno)
+        n_devices (int): numero di utenti che partecipano al DSM (ognuno con una lavatrice e una lavastoviglie)
+        create_plot (bool, optional): se vero, grafici dei giorni ottimizzati (dopo l'ottimizzazione). Defaults to True.
+        show_plot (bool, optional): se vero, mostra i grafici. Defaults to True.
+        solver (str, optional): solutore giornaliero, 'ga', 'greedy' o 'milp'. Defaults to 'ga'.
+        n_workers (int, optional): numero di processi paralleli. Se None, config['n_workers'] (1 = sequenziale). Defaults to None.
+        cache_file (str, optional): file con le soluzioni dei giorni già ottimizzati, chiave (giorno, hash dell'immissione, dispositivi e solutore).
+            Sono ottimizzati solo i giorni che non sono nella cache; il file è poi aggiornato con le soluzioni di questa esecuzione. Se None, senza cache. Defaults to None.
+
+    Returns:
+        start_time (array): istanti di attivazione (utenti x ['washing_machine', 'dish_washer'] x giorni), -1 se il giorno non è ottimizzato
+        report (dataframe): esito di ogni giorno (date, status = 'optimized' / 'cached' / 'skipped' / 'failed', error)
+    """
     
-    freq = '15min'
     config = yaml.safe_load(open("config.yml", 'r'))
     directory = config["foldername_DSM_optimizer_data"]
+    if n_workers is None:
+        n_workers = config.get("n_workers", 1)
     
-    # Ora dobbiamo fare ottimizzazione per ognuno dei 36 giorni che abbiamo, bisogna fare anche la media sull'immissione: 
-    output_dictionary = {}
     num_intervals = 96
     consumption_profiles = crea_lista_consumi(directory, n_devices)
-    
-    # output for profile emulator 
-    start_time_dict = {}
+    appliances = ['washing_machine', 'dish_washer']
     
     # Ora per iterare sui giorni:
-    for cont, (day, daily_data) in enumerate(df_immission.groupby(df_immission.index.date)):
-        # Prendiamo i 96 valori per ogni giorno
-        # consumo_giornaliero = daily_data['consumo'].values
-        immissione_giornaliera = daily_data.values
-
-        if (immissione_giornaliera == 0).all().all():
-            print("\n--------------------------------------------------------------------------------------------")
-            print(red("Day " + str(cont) + " skipped!", ['bold']))
-            print("--------------------------------------------------------------------------------------------\n")
-        
-        else:
-            try:
-                # Vera e propria ottimizzazione:
-                df_dev_scheduled = ottimizzazione(immission_profile=immissione_giornaliera,
-                                                        consumption_profiles=consumption_profiles,
-                                                        num_intervals=num_intervals,
-                                                        day = cont,
-                                                        create_plot = create_plot,
-                                                        show_plot = show_plot
-                                                        )
-                
-                if not show_plot:
-                    print("\n--------------------------------------------------------------------------------------------")
-                    print(green("Day " + str(cont) + " optimized!",  ['bold']))
-                    print("--------------------------------------------------------------------------------------------\n")
-
-                
-                # Crea output
-                # trovo per ogni utente e per ogni elettrodomestico il primo istante di attivazione
-                # Trova il primo istante in cui ogni colonna ha un valore positivo
-                primi_positivi = df_dev_scheduled.gt(0).idxmax()
-                start_time_dict = aggiorna_start_time_dict(start_time_dict, primi_positivi, cont)
-            except:
-                print("\n--------------------------------------------------------------------------------------------")
-                print(red("Day " + str(cont) + " not optimized; check injected energy in this day, maybe too low!", ['bold']))
-                print("--------------------------------------------------------------------------------------------\n")
-        
-    return start_time_dict
+    days = [(cont, day, daily_data.values) for cont, (day, daily_data) in enumerate(df_immission.groupby(df_immission.index.date))]
+
+    # output for profile emulator 
+    start_time = np.full((n_devices, len(appliances), len(days)), -1, dtype=np.int16)
+    report = pd.DataFrame({'date': [day for _, day, _ in days], 'status': '', 'error': ''})
+    schedules = {}
+
+    # soluzioni dei giorni già ottimizzati con la stessa immissione e gli stessi dispositivi
+    cache = {}
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, 'rb') as fp:
+            cache = pickle.load(fp)
+
+    chiave = chiave_dispositivi(consumption_profiles, solver)
+    keys = [chiave_giorno(day, immissione, chiave) for _, day, immissione in days]
+    new_cache = {}
 
+    for cont, key in enumerate(keys):
+        if key in cache:
+            new_cache[key] = cache[key]
+            if cache[key] is None:
+                report.loc[cont, 'status'] = 'skipped'
+            else:
+                start_time[:, :, cont] = cache[key]
+                report.loc[cont, 'status'] = 'cached'
+
+    days = [(cont, day, immissione) for cont, day, immissione in days if keys[cont] not in cache]
+
+    args = [[cont for cont, _, _ in days], [immissione for _, _, immissione in days], [consumption_profiles] * len(days), [num_intervals] * len(days), [solver] * len(days)]
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(ott_day, *args, chunksize=max(1, len(days) // (4 * n_workers))))
+    else:
+        results = map(ott_day, *args)
+
+    for cont, df_dev_scheduled, status, error in results:
+        report.loc[cont, ['status', 'error']] = [status, error]
+        if df_dev_scheduled is not None:
+            # trovo per ogni utente e per ogni elettrodomestico il primo istante di attivazione
+            start_time[:, :, cont] = primi_istanti_attivazione(df_dev_scheduled, n_devices, appliances)
+            new_cache[keys[cont]] = start_time[:, :, cont].copy()
+            if create_plot:
+                schedules[cont] = df_dev_scheduled
+        elif status == 'skipped':
+            new_cache[keys[cont]] = None
+
+    # la cache è aggiornata con i giorni di questa esecuzione (i giorni falliti saranno ottimizzati di nuovo)
+    if cache_file is not None:
+        with open(cache_file, 'wb') as fp:
+            pickle.dump(new_cache, fp)
+
+    if create_plot:
+        plot_ott_year(schedules, df_immission, num_intervals, show_plot) # solo i giorni ottimizzati in questa esecuzione
+        
+    return start_time, report
@@ -1,4 +1,5 @@
-from src.Functions_General import (check_file_status, clear_folder_content, add_to_recap_yml, check_folder_exists, get_calendar, location_italian_to_english)
+from src.Functions_General import (check_file_status, clear_folder_content, add_to_recap_yml, check_folder_exists, get_active_calendar, location_italian_to_english)
+from src.Functions_Time import rebase_index_to_year
 import pandas as pd
 import numpy as np
 import calendar
@@ -888,7 +889,7 @@ def weather_data(coordinates_dataset):
         latitude, longitude, name, altitude, timezone = location
         weather = pvlib.iotools.get_pvgis_tmy(latitude, longitude, map_variables=True)[0] # Get TMY data from PVGIS
         weather.index.name = "datetime"
-        weather.index = weather.index.map(lambda t: t.replace(year=start_year))
+        weather.index = rebase_index_to_year(weather.index, start_year)
 
         # # Convert the time column to datetime and set it to UTC
         # weather.index = pd.to_datetime(weather.index, utc=True)
@@ -950,7 +951,7 @@ def weather_data_15_min(coordinates_dataset):
         # weather = pvlib.iotools.get_psm3(latitude, longitude, api_key = key , email = email_personale , interval = 60)
         
         weather.index.name = "datetime" # setting index name
-        weather.index = weather.index.map(lambda t: t.replace(year=start_year)) # setting the correct year to the weather dataframe
+        weather.index = rebase_index_to_year(weather.index, start_year) # setting the correct year to the weather dataframe
         weather = weather[~weather.index.duplicated(keep='first')] # removing duplicates
         tmys_15_min.append(weather) # appending the data for each location
 
@@ -1324,8 +1325,8 @@ def simulate_unstacked_productivity(result_ac_energies_gens_derated):
     print ("\n\tCheck leap day completed!")
 
     # redefining the dateetimes used to index the dataframes using a calendar generated externally from a function (here it is removed the timezone)
-    cal = get_calendar() # getting the calendar with the standard format
-    result_ac_energies_to_csv_df.index = cal['datetime'] # updating the datetime index with the one from the calendar
+    cal = get_active_calendar() # getting the calendar with the standard format
+    result_ac_energies_to_csv_df.index = pd.DatetimeIndex(cal.datetime) # updating the datetime index with the one from the calendar
     result_ac_energies_to_csv_df.index.name = 'datetime' # fixing the name of the index
 
     print("\n\tcompleted!\n")
@@ -1411,8 +1412,7 @@ def check_calendar_status():
     Finally, it checks if the actual number of values in the calendar is equal to the total number of values calculated.
     If the check fails, an assert error is raised with a message asking to run the function <<generate_calendar()>> again.
     """
-    cal = get_calendar()
-    size_cal = cal.shape[0]
+    size_cal = len(get_active_calendar())
 
     config = yaml.safe_load(open("config.yml", 'r'))  
     project_life_time = int(config['project_lifetime_yrs']) # si acquisisce la vita utile dell'impianto con cui svolgere la simulazione da file yaml
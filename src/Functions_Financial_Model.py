@@ -14,8 +14,9 @@ import io
 import yaml
 import xlwings as xw
 import glob
-from src.Functions_General import check_file_status, province_to_region, get_monthly_calendar, add_to_recap_yml, clear_folder_content, get_calendar #,add_to_input_FM_yml
+from src.Functions_General import check_file_status, province_to_region, get_monthly_calendar, add_to_recap_yml, clear_folder_content, get_calendar, get_active_calendar #,add_to_input_FM_yml
 from src.Functions_Energy_Model import get_input_gens_analysis
+from src.Functions_Time import rebase_index_to_year
 import warnings
 warnings.filterwarnings("ignore")
 from simple_colors import *
@@ -104,7 +105,8 @@ def run_user_type_bill(user_type):
         else:
             me_quota_energia_dict["F2"] = me_quota_energia_dict["F1"]
             me_quota_energia_dict["F3"] = me_quota_energia_dict["F2"]
-            user_load["fascia"] = get_calendar().set_index("datetime")["fascia"]
+            cal = get_active_calendar()
+            user_load["fascia"] = pd.Series(cal.fascia.astype(float), index=cal.datetime)
             assert not  user_load["fascia"].isna().any(), "ERROR: There are NaN values in the fascia columnns"
             user_load["fascia"] = user_load["fascia"].replace({1: "F1", 2: "F2", 3: "F3"})
             user_load["energy_price"] = [me_quota_energia_dict[fascia] for fascia in user_load["fascia"]] # €/kWh, senza variazione annuale. Il prezzo giusto per la giusta fascia
@@ -794,7 +796,7 @@ def generate_PZO_values():
         current_year += 1 # updating actual year
         current_yearly_rate *= (1-yearly_variation[year]) # yearly variation of actual year
         PZO_concat = PZO_market_zone.copy() * current_yearly_rate / 1000  # [€ / kWh]
-        PZO_concat.index = PZO_input_df.index.map(lambda t: t.replace(year=current_year)) # replacing in the si rimpiazza nel datetime.index the previous year with the current year
+        PZO_concat.index = rebase_index_to_year(PZO_input_df.index, current_year) # replacing in the si rimpiazza nel datetime.index the previous year with the current year
         PZO_merged = pd.concat([PZO_merged, PZO_concat]) # concatenating data
 
     PZO_merged.index.name = 'datetime' # renaming index
@@ -854,8 +856,7 @@ def add_leap_day(PZO):
 
             leap_day = PZO_data.loc[start_day: end_day]
 
-            leap_day.index = leap_day.index.map(lambda t: t.replace(year=year))
-            leap_day.index = leap_day.index.map(lambda t: t.replace(day=29))
+            leap_day.index = rebase_index_to_year(leap_day.index, year) + pd.Timedelta(days=1) # Feb 28 -> Feb 29
 
             PZO_data = pd.concat([PZO_data, leap_day])
 
@@ -15,12 +15,17 @@ import time
 import csv
 import glob
 import shutil
+import zlib
+import hashlib
+import pickle
+import openpyxl
 import collections
 from yaml.representer import Representer
 yaml.SafeDumper.add_representer(collections.defaultdict, Representer.represent_dict)
 from ruamel.yaml import YAML
 import signal
 import psutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from simple_colors import *
 
 ##########################################################
@@ -158,93 +163,48 @@ def generate_calendar():
 
     cal['day_week']= cal.datetime.dt.dayofweek
 
-    cal["day"] = cal.datetime.dt.day 
-
     #######################################################################################################
 
+    # the holidays are evaluated once per day (few thousands) and then broadcast to all the timesteps of the same day
+    timestamps = cal["datetime"].values.astype("datetime64[ns]")
+    days = timestamps.astype("datetime64[D]")
+    unique_days, day_index = np.unique(days, return_inverse=True)
+
     it_holidays = holidays.IT() # getting italian holidays
-    cal['holiday'] = cal['datetime'].apply(lambda x: x.date() in it_holidays)
+    holiday_per_day = np.array([day in it_holidays for day in unique_days.astype(object)], dtype=bool)
+    cal['holiday'] = holiday_per_day[day_index]
 
     #######################################################################################################
 
-    # extracting days of the week
-    Lun=cal[(cal['day_week']==0) & (cal['holiday'] == False)]
-    Mar=cal[(cal['day_week']==1) & (cal['holiday'] == False)]
-    Mer=cal[(cal['day_week']==2) & (cal['holiday'] == False)]
-    Gio=cal[(cal['day_week']==3) & (cal['holiday'] == False)]
-    Ven=cal[(cal['day_week']==4) & (cal['holiday'] == False)]
-    Sab=cal[(cal['day_week']==5) & (cal['holiday'] == False)]
-    Dom=cal[(cal['day_week']==6) | (cal['holiday'] == True)]
-
-    # data ranges
-    ind_L=int(Lun['day'].shape[0]/96)
-    ind_M=int(Mar['day'].shape[0]/96)
-    ind_Me=int(Mer['day'].shape[0]/96)
-    ind_G=int(Gio['day'].shape[0]/96)
-    ind_V=int(Ven['day'].shape[0]/96)
-    ind_S=int(Sab['day'].shape[0]/96)
-    ind_D=int(Dom['day'].shape[0]/96)
-
-    # type of day
-    arr_lun=np.array([])
-    arr_mar=np.array([])
-    arr_mer=np.array([])
-    arr_gio=np.array([])
-    arr_ven=np.array([])
-    arr_sab=np.array([])
-    arr_dom=np.array([])
-
-    # establishing the tariff time slot based on type of day (working day, saturday, sunday, holiday)
-    for i in range(0,ind_L):
-        arr_lun=np.concatenate([arr_lun,giorni_tipo['Lav']])
-    #
-    for i in range(0,ind_M):
-        arr_mar=np.concatenate([arr_mar,giorni_tipo['Lav']])
-    #
-    for i in range(0,ind_Me):
-        arr_mer=np.concatenate([arr_mer,giorni_tipo['Lav']])
-    #
-    for i in range(0,ind_G):
-        arr_gio=np.concatenate([arr_gio,giorni_tipo['Lav']])
-    #
-    for i in range(0,ind_V):
-        arr_ven=np.concatenate([arr_ven,giorni_tipo['Lav']])
-    #
-    for i in range(0,ind_S):
-        arr_sab=np.concatenate([arr_sab,giorni_tipo['Sab']])
-    #
-    for i in range(0,ind_D):
-        arr_dom=np.concatenate([arr_dom,giorni_tipo['Dom']])
-    
-    Lun.insert(4, 'fascia', arr_lun)
-    Mar.insert(4, 'fascia', arr_mar) 
-    Mer.insert(4, 'fascia', arr_mer) 
-    Gio.insert(4, 'fascia', arr_gio)
-    Ven.insert(4, 'fascia', arr_ven)
-    Sab.insert(4, 'fascia', arr_sab) 
-    Dom.insert(4, 'fascia', arr_dom) 
-    #
-    cal = pd.concat([Lun,Mar,Mer,Gio,Ven,Sab,Dom], sort=False).sort_index()
-    cal.drop(columns=["day"], inplace=True)
+    # type of day: 0 = working day (Lav), 1 = saturday (Sab), 2 = sunday or holiday (Dom)
+    day_type = np.zeros(len(cal), dtype=np.int64)
+    day_type[cal["day_week"].values == 5] = 1
+    day_type[(cal["day_week"].values == 6) | cal["holiday"].values] = 2
+
+    # slot of the day, based on the resolution of the giorni_tipo table (96 quarters of hour)
+    slot_minutes = 24 * 60 // len(giorni_tipo)
+    minute_of_day = (timestamps - days).astype("timedelta64[m]").astype(np.int64)
+    slot = minute_of_day // slot_minutes
+
+    # establishing the tariff time slot based on type of day (working day, saturday, sunday, holiday) with a single lookup on the (day_type x slot) table
+    fascia_table = giorni_tipo[["Lav", "Sab", "Dom"]].values.T.astype(float)
+    cal['fascia'] = np.take(fascia_table, day_type * fascia_table.shape[1] + slot)
     
     #######################################################################################################
 
-    # preassigning value of working_day
-    cal["day_flag"] = "Working_day"
-    cal.loc[cal["day_week"] == 5,"day_flag"] = "Saturday" #overwrite the saturdays
-    cal.loc[cal["day_week"] == 6,"day_flag"] = "Sunday" #overwrite the sundays
-    cal.loc[cal["holiday"],"day_flag"] = "Sunday" #overwrite the holidays, modelled as sundays
+    cal["day_flag"] = np.array(["Working_day", "Saturday", "Sunday"])[day_type] # holidays are modelled as sundays
 
     filename_calendar = config['filename_calendar']
     cal.to_csv(filename_calendar,index=False)
+    _active_calendar.clear() # the memoized calendar must be read again
 
     #######################################################################################################
 
     # creating a calendar for the financial analysis, monthly-based
     filename_monthly_calendar = config["filename_monthly_calendar"]
-    cal["month"] = cal.datetime.dt.strftime("%Y-%m")
+    months = np.unique(unique_days.astype("datetime64[M]")) # days are sorted, so months are sorted too
 
-    monthly_calendar = pd.DataFrame(data={"month": cal["month"].unique()})
+    monthly_calendar = pd.DataFrame(data={"month": np.datetime_as_string(months, unit="M")})
     monthly_calendar["month_number"] = np.linspace(1, len(monthly_calendar),len(monthly_calendar)).astype(int)
     monthly_calendar[["month_number","month"]].to_csv(filename_monthly_calendar,index=True)
 
@@ -252,15 +212,87 @@ def generate_calendar():
 
 ##########################################################
 
+class ActiveCalendar:
+    """ typed, read-only view of the active calendar (config['filename_calendar']), as numpy arrays shared by all the modules.
+    Attributes:
+        datetime        numpy datetime64[ns] array with the timesteps
+        epoch_ns        int64 view of datetime (nanoseconds from 1970-01-01)
+        day_week        int8, 0=monday, 6=sunday
+        holiday         bool, True if the day is an italian holiday
+        day_type        int8, 0=Working_day, 1=Saturday, 2=Sunday (holidays are modelled as sundays)
+        fascia          int8, tariff time slot (1,2,3)
+        slot            int16, quarter of hour of the day (0-95), also with hourly calendars
+        week            int8, ISO week (1-53)
+        month           int8, month of the year (1-12)
+        year            int16, calendar year
+        month_index     int16, months from the first month of the calendar (0, 1, ...)
+        year_index      int16, years from the first year of the calendar (0, 1, ...)
+    """
+
+    day_flags = np.array(["Working_day", "Saturday", "Sunday"], dtype=object)
+
+    def __init__(self, cal):
+        self.datetime = cal["datetime"].values.astype("datetime64[ns]")
+        self.epoch_ns = self.datetime.view(np.int64)
+        self.day_week = cal["day_week"].values.astype(np.int8)
+        self.holiday = cal["holiday"].values.astype(bool)
+        self.day_type = pd.Series(cal["day_flag"]).map({flag: i for i, flag in enumerate(self.day_flags)}).values.astype(np.int8)
+        self.fascia = cal["fascia"].values.astype(np.int8)
+
+        days = self.datetime.astype("datetime64[D]")
+        months = self.datetime.astype("datetime64[M]")
+        years = self.datetime.astype("datetime64[Y]")
+        self.slot = ((self.datetime - days).astype("timedelta64[m]").astype(np.int64) // 15).astype(np.int16)
+        self.week = cal["datetime"].dt.isocalendar().week.values.astype(np.int8)
+        self.month = (months - years).astype(np.int64).astype(np.int8) + 1
+        self.year = (years.astype(np.int64) + 1970).astype(np.int16)
+        self.month_index = (months - months[0]).astype(np.int64).astype(np.int16)
+        self.year_index = (self.year - self.year[0]).astype(np.int16)
+
+        # the arrays are shared among the modules, so they must not be modified in place
+        for array in vars(self).values():
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.datetime)
+
+    def to_dataframe(self):
+        """ returns a new dataframe with the same columns and dtypes of config['filename_calendar'], which the caller can freely modify"""
+        return pd.DataFrame({"datetime": self.datetime.copy(),
+                             "day_week": self.day_week.astype(np.int64),
+                             "holiday": self.holiday.copy(),
+                             "fascia": self.fascia.astype(float),
+                             "day_flag": self.day_flags[self.day_type]})
+
+_active_calendar = {} # process-wide cache of the active calendar, see get_active_calendar()
+
+def get_active_calendar():
+    """ retrieves the active calendar as ActiveCalendar object. The calendar file is read only once per process, and read again only if 
+    start_date, project_lifetime_yrs or delta_t are changed in config.yml, or if the calendar file is regenerated.
+    Output:
+        cal: ActiveCalendar
+    """
+    config = yaml.safe_load(open("config.yml", 'r'))
+    filename_calendar = config['filename_calendar']
+    key = (str(config['start_date']), config['project_lifetime_yrs'], config['delta_t'], filename_calendar, os.path.getmtime(filename_calendar))
+
+    if _active_calendar.get("key") != key:
+        cal = pd.read_csv(filename_calendar)
+        cal['datetime'] = pd.to_datetime(cal['datetime'], format = "%Y-%m-%d %H:%M:%S")
+        _active_calendar["calendar"] = ActiveCalendar(cal)
+        _active_calendar["key"] = key
+
+    return _active_calendar["calendar"]
+
+##########################################################
+
 def get_calendar():
-    """ retrieves the active calendar from the file config['filename_calendar'] as a dataframe, as it is, without updating, and adjusts the datetime format
+    """ retrieves the active calendar from the file config['filename_calendar'] as a dataframe, as it is, without updating, and adjusts the datetime format.
+    The file is parsed only once per process (see get_active_calendar()), the dataframe returned is a new copy at each call.
     Output:
         cal: dataframe
     """
-    config = yaml.safe_load(open("config.yml", 'r'))
-    cal = pd.read_csv(config['filename_calendar'])
-    cal['datetime'] = pd.to_datetime(cal['datetime'], format = "%Y-%m-%d %H:%M:%S")
-    return cal
+    return get_active_calendar().to_dataframe()
 
 ##########################################################
 
@@ -590,40 +622,176 @@ def check_file_status(filename):
 
 ##########################################################
 
-def upsample_arera_dataframe_to_15min(load_user):
-    """ function to upsample from 1hr to 15min the ARERA daily load profiles (only 24 rows, one per hour!). 
-    The dataframe can have multiple columns (working day, sunday, saturday) but only 24 hourly rows, to avoid mixing different profiles
+def arera_profiles_lookup(user_load_arera, region, delta_t):
+    """ pivoting once per run the ARERA load profiles of the region into a single lookup array, from which all the ARERA user types read their slice.
+    If the calendar is quarterly, profiles are upsampled from 1hr to 15min: each hourly value is repeated on the 4 quarters of the hour and divided by 4 (same energy in each quarter of the hour).
     Inputs:
-        load_user: dataframe arera profile to upsample
+        user_load_arera     dataframe with the ARERA profiles, with "Working day" already converted in the day_flag format (Working_day, Saturday, Sunday)
+        region              region of Italy
+        delta_t             time interval of the calendar ("15Min" or "1H")
+    Outputs:
+        power_ranges        list of the power ranges ("Classe potenza") found for the region
+        lookup              array (power_range x month x day_flag x slot) = (n x 12 x 3 x 96), nan where the profile is not given
     """
-    #the load_user["Hour"] updating below creates a SettingWithCopyWarning, which seems to be a false positive. We can deactivate it temporarily to avoid getting it in the output
-    if pd.options.mode.chained_assignment == "warn": 
-        pd.options.mode.chained_assignment = None  # default='warn', disabled= None
+    load_region = user_load_arera[user_load_arera["Regione"] == region]
+    power_ranges = sorted(load_region["Classe potenza"].unique())
+
+    power_range_index = pd.Categorical(load_region["Classe potenza"], categories=power_ranges).codes
+    day_flag_index = load_region["Working day"].map({day_flag: i for i, day_flag in enumerate(ActiveCalendar.day_flags)}).values
+
+    hourly_lookup = np.full((len(power_ranges), 12, 3, 24), np.nan)
+    hourly_lookup[power_range_index, load_region["Mese"].values - 1, day_flag_index, load_region["Ora"].values] = load_region["Prelievo medio Orario Regionale (kWh)"].values
+
+    lookup = np.repeat(hourly_lookup, 4, axis=-1) # each hour is spread on its 4 quarters of hour
+    if delta_t == "15Min":
+        lookup = lookup / 4 # dividing the energy by 4
     
-    load_user["Hour"] = pd.to_datetime(load_user["Hour"], format="%H:%M:%S")
-    load_user_pivot = pd.pivot_table(load_user, values='Prelievo medio Orario Regionale (kWh)', index=['Hour'],
-                        columns=['Working day'])
-
-    # creating a new row which was needed as resampling boundary at the end of the dataframe
-    new_fake_datapoint = pd.DataFrame(load_user_pivot[-1:].values, index=load_user_pivot.index[-1:] + datetime.timedelta(hours=1), columns=load_user_pivot.columns)
-    # load_user_pivot = load_user_pivot.append(new_fake_datapoint)
-    load_user_pivot = pd.concat((load_user_pivot, new_fake_datapoint), axis = 0)
-    resampled_df = load_user_pivot.resample('15min', offset="1H", closed='left').mean().ffill() / 4 #resampling from 1hr to 15 min, and dividing the energy by 4
-    resampled_df = resampled_df[:-1] # removing the last row which was needed as resampling boundary
-    resampled_df.reset_index(inplace=True)
-    resampled_df.Hour = resampled_df.Hour.dt.time
-    pd.options.mode.chained_assignment = "warn"  # default='warn', disabled= None
-    return resampled_df
+    return power_ranges, lookup
 
 ##########################################################
 
-def load_profile_single_user(df, user):
-    """gnerating the load profile for a single user.
+def read_excel_table(rows, anchor_row=0, anchor_column=0):
+    """ reading a table of a worksheet as a dataframe, as xlwings does with options(pd.DataFrame, header=1, index=True, expand='table'): the table starts from the anchor cell 
+    and expands to the right until the first empty header, and down until the first empty cell of the index column. Numbers are converted to float.
+    Inputs:
+        rows            list of tuples with the values of the worksheet (openpyxl iter_rows(values_only=True))
+        anchor_row      row of the anchor cell (0-based)
+        anchor_column   column of the anchor cell (0-based)
+    Outputs:
+        df              dataframe with the first row as header and the first column as index
+    """
+    header = rows[anchor_row][anchor_column:]
+    n_columns = next((i for i, value in enumerate(header) if value is None), len(header))
+    
+    data = []
+    for row in rows[anchor_row + 1:]:
+        if anchor_column >= len(row) or row[anchor_column] is None:
+            break
+        data.append(row[anchor_column:anchor_column + n_columns])
+
+    df = pd.DataFrame(data, columns=header[:n_columns])
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype(float)
+    
+    return df.set_index(df.columns[0])
+
+##########################################################
+
+def load_profile_catalogue(filename, flag_cache=True):
+    """ reading once, without Excel, the file with the load profiles given as input (config['filename_carico_input']) into a catalogue of lookup arrays.
+    The sheets with the "Hour" header in A1 are load profiles: daily profiles in A1 and week factors in P1. The yearly corrections are in the "Yearly_Variation" sheet.
+    If flag_cache is True, the catalogue is saved in a binary snapshot next to the file, keyed by the hash of the file, so that the xlsx is parsed again only if it changes.
+    Inputs:
+        filename        xlsx file with the load profiles
+        flag_cache      if True, the binary snapshot is used (and updated)
+    Outputs:
+        catalogue       dictionary with:
+                            "sheets": list with the names of all the sheets of the file
+                            "year_factor": dataframe with the yearly corrections, indexed by year
+                            "profiles": dictionary {load_profile_id: {"profile": (3 x 96) lookup array of the daily profile, "weekly": (54 x 3) lookup array of the week factors}}
+    """
+    with open(filename, "rb") as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()
+    
+    filename_cache = filename + ".cache.pkl"
+    if flag_cache and os.path.exists(filename_cache):
+        with open(filename_cache, "rb") as f:
+            cache = pickle.load(f)
+        if cache["hash"] == file_hash:
+            return cache["catalogue"]
+
+    wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    catalogue = {"sheets": wb.sheetnames, "year_factor": None, "profiles": {}}
+
+    for sheet in wb.sheetnames:
+        rows = list(wb[sheet].iter_rows(values_only=True))
+        if sheet == "Yearly_Variation":
+            catalogue["year_factor"] = read_excel_table(rows)
+        elif len(rows) > 0 and rows[0][0] == "Hour":
+            catalogue["profiles"][sheet] = {"profile": daily_profile_lookup(read_excel_table(rows)),
+                                            "weekly": weekly_correction_lookup(read_excel_table(rows, anchor_column=15))} # week factors are in P1
+    wb.close()
+
+    if flag_cache:
+        with open(filename_cache, "wb") as f:
+            pickle.dump({"hash": file_hash, "catalogue": catalogue}, f)
+
+    return catalogue
+
+##########################################################
+
+def load_profile_rng(seed, user):
+    """ independent random stream of a user type, derived from the master seed and the user type ID, so that the random variation of each user type
+    does not depend on the order (or the process) in which the user types are generated.
+    Inputs:
+        seed        master seed (integer)
+        user        user type ID
+    Outputs:
+        rng         numpy.random.Generator
+    """
+    return np.random.default_rng(np.random.SeedSequence([seed, zlib.crc32(str(user).encode())]))
+
+##########################################################
+
+def load_profile_keys(cal):
+    """ encodes once the calendar into the integer keys used by the load profile engine, so that each profile is a direct np.take into a small lookup array.
+    Inputs:
+        cal         ActiveCalendar
+    Outputs:
+        keys        dictionary with the arrays of keys, one per timestep:
+                        "profile": index of the flattened (month x day_flag x slot) = (12 x 3 x 96) lookup array of the daily profiles
+                        "week": index of the flattened (week x day_flag) = (54 x 3) lookup array of the weekly corrections
+                        "year": index of the (year) lookup array of the yearly corrections, starting from the first year of the calendar
+    """
+    keys = {}
+    keys["profile"] = ((cal.month.astype(np.int32) - 1) * 3 + cal.day_type) * 96 + cal.slot
+    keys["week"] = cal.week.astype(np.int32) * 3 + cal.day_type
+    keys["year"] = cal.year_index.astype(np.int32)
+    return keys
+
+##########################################################
+
+def daily_profile_lookup(load_user):
+    """ converting a daily load profile with 96 quarters of hour (or 24 hours) as rows and the day_flag (Working_day, Saturday, Sunday) as columns into the (3 x 96) lookup array.
+    Hourly profiles are assigned to the first quarter of hour of each hour, which is the only one used in hourly calendars. Missing values are left as nan.
+    """
+    lookup = np.full((3, 96), np.nan)
+    slots = np.arange(len(load_user)) * (96 // len(load_user))
+    for i, day_flag in enumerate(ActiveCalendar.day_flags):
+        if day_flag in load_user.columns:
+            lookup[i, slots] = load_user[day_flag].values
+    return lookup
+
+##########################################################
+
+def weekly_correction_lookup(week_factor):
+    """ converting the week factors (index Week from 1 to 53, columns Working_day, Saturday, Sunday) into the (54 x 3) lookup array. Missing values are left as nan."""
+    lookup = np.full((54, 3), np.nan)
+    for i, day_flag in enumerate(ActiveCalendar.day_flags):
+        lookup[week_factor.index.values.astype(int), i] = week_factor[day_flag].values
+    return lookup
+
+##########################################################
+
+def yearly_correction_lookup(year_factor, cal):
+    """ converting the yearly corrections (index year, column yearly_correction) into a lookup array with one value per year of the calendar, starting from the first one. Missing values are left as nan."""
+    years = np.arange(cal.year[0], cal.year[-1] + 1)
+    return year_factor["yearly_correction"].reindex(years.astype(year_factor.index.dtype)).values.astype(float)
+
+##########################################################
+
+def load_profile_single_user_inputs(user):
+    """collecting the inputs needed to generate the load profile of a single user type as small lookup arrays, which can be sent to build_load_profile(), also in another process.
     Inputs:
-        df                  calendar dataframe with all the needed columns, and previous load profiles from other users
         user                user_id, same user id that we have in registry_users.keys()
     Outputs: 
-        output_all_users    list with user profiles, updated with new one just computed
+        inputs              dictionary with:
+                                "load_profile_id": load profile id of the user type
+                                "profile": (12 x 3 x 96) lookup array of the daily profiles, None for real and emulated profiles
+                                "load": load profile over the whole calendar, only for real and emulated profiles
+                                "weekly", "yearly": lookup arrays of the weekly and yearly corrections, None if not needed
+                                "random_variation": True if the random variation must be applied
     """
 
     config = yaml.safe_load(open("config.yml", 'r'))
@@ -631,121 +799,129 @@ def load_profile_single_user(df, user):
     load_profile_id = user_types_set[user]["load_profile_id"] # extract load profile id from registry_user_types.yml
     power_range = user_types_set[user]["power_range"] # extract power range from registry_user_types.yml
 
+    inputs = {"load_profile_id": load_profile_id, "profile": None, "load": None, "weekly": None, "yearly": None}
+
     # CASE 1 - arera load profile
     if load_profile_id == "arera":
-        for month in range(1,13): # month as integer from 1 to 12
-            
-            # we extract arera load for selected region, selected power range and selected month (we need to check also that this load profile exist!!!)
-            load_user_month = user_load_arera[(user_load_arera["Regione"] == region) & (user_load_arera["Classe potenza"] == power_range) & (user_load_arera["Mese"] == month)]
-            if delta_t == "15Min": 
-                load_user_month = upsample_arera_dataframe_to_15min(load_user_month) # arera is in 1hr 
-                load_user_month['month'] = month # set month in month column
-                load_user_month.index.names = ['Quarter'] # set name index as 'Quarter'
-
-            if month != 1:
-                load_user = pd.concat([load_user, load_user_month], ignore_index=True) # concat all month in a single column
-            else: 
-                load_user = load_user_month # initialization (only for the first month)
-        
-        load_user.set_index(["Hour", "month"], inplace=True) # set index as a combination of "Hour" and "month" columns
+        # we extract arera load for selected region and selected power range, already pivoted and upsampled for all the months
+        assert power_range in arera_power_ranges, "ERROR: ARERA load profile not found for region " + region + " and power range " + str(power_range)
+        inputs["profile"] = arera_lookup[arera_power_ranges.index(power_range)]
 
     # CASE 2 - real load profile
     elif load_profile_id == "real profile":
-        load_user = real_profile_df[user] # real profile for Riccomassimo CER
-        load_user = pd.DataFrame(load_user)
+        inputs["load"] = real_profile_df[user].values.astype(float) # real profile for Riccomassimo CER
 
     # CASE 3 - emulated load profile
     elif load_profile_id == "emulated profile":
-        load_user = emulated_load_profile_df[user] # emulated load profile for Riccomassimo CER
-        load_user = pd.DataFrame(load_user)
+        inputs["load"] = emulated_load_profile_df[user].values.astype(float) # emulated load profile for Riccomassimo CER
 
     # CASE 4 - other load profiles
     else: # when we have our profiles given as input
-        load_user = wb.sheets[load_profile_id].range('A1').options(pd.DataFrame, header=1, index=True, expand='table').value
-        load_user["Hour"] = pd.date_range("00:00", "23:45", freq = "15min").time # ATTENZIONE, avevo problemi a importare correttamente il formato del time della colonna HOUR, quindi per semplicita ne ho creato uno nuovo, assumendo che tanto va da 00:00 a 23:45
-        load_user.set_index("Hour", inplace = True)
+        # the same daily profiles are used for all the months
+        inputs["profile"] = np.broadcast_to(profile_catalogue["profiles"][load_profile_id]["profile"], (12, 3, 96))
 
     # If not real profile and not emulated profile and rand_factor is different by 0, we just consider updating_random_variation_flag = True! 
     # So the random variation is considered in arera profile cases and other profiles cases!
-    updating_random_variation_flag = rand_factor != 0 and load_profile_id != "real profile" and load_profile_id != "emulated profile"
+    inputs["random_variation"] = rand_factor != 0 and load_profile_id != "real profile" and load_profile_id != "emulated profile"
 
     # If not arera profile and not real profile and not emulated profile, we just define a week_factor variation imported from external file! 
     if load_profile_id != "arera" and load_profile_id != "real profile" and load_profile_id != "emulated profile":
-        week_factor = wb.sheets[load_profile_id].range('P1').options(pd.DataFrame, header=1, index=True, expand='table').value#.to_dict()
-
-    # random factor for peak fluctuation: update the random_variation for each datapoint, as fluctuation + or - x% if (updating_random_variation_flag == True). If not, random_variation will remain 0 
-    df["random_variation"] = 0 # initialize the random variation to zero value
-    if updating_random_variation_flag:
-        df["random"] = np.random.uniform(0, 1, [len(df),1]) # random values from 0 to 1
-        df["random_variation"] = rand_factor / 100 * (df["random"] * 2 - 1) # random values between -rand_factor to +rand_factor
+        inputs["weekly"] = profile_catalogue["profiles"][load_profile_id]["weekly"]
+        inputs["yearly"] = yearly_correction_lookup(profile_catalogue["year_factor"], calendar_active)
 
+    return inputs
 
-    if load_profile_id == "arera":
-        # we prepare the load profile for the merge, stacking the hour and the day_flag, and calling the values "load_active"
-        load_user_stack = load_user.stack().reset_index().rename(columns={"Working day":'day_flag', 
-                                                        "Hour":"hour", 
-                                                        0:"load_active"})
-        df = pd.merge(df, load_user_stack, on=["hour", "month", 'day_flag'], how='inner').sort_values("datetime").reset_index(drop = True)
+##########################################################
 
-    elif load_profile_id == "real profile" or load_profile_id == "emulated profile":
-        
-        load_user = load_user.reset_index()
-        load_user = load_user.drop(columns=['datetime'])
-        load_user = load_user.rename(columns={user:"load_active"})
-        df = pd.concat([df, load_user], axis=1)
-        df = df.sort_values("datetime").reset_index(drop = True)
+def build_load_profile(keys, inputs, user, seed, rand_factor, out=None):
+    """generating the load profile of a single user type from its lookup arrays. It does not depend on any global variable, so it can run in worker processes.
+    Inputs:
+        keys                lookup keys of the calendar, from load_profile_keys()
+        inputs              lookup arrays of the user type, from load_profile_single_user_inputs()
+        user                user type ID
+        seed                master seed of the random variation, see load_profile_rng()
+        rand_factor         random factor for peak fluctuation, in %
+        out                 optional preallocated array (or memory-mapped row) where the load profile is written
+    Outputs: 
+        load                array with the load profile of the user, one value per timestep of the calendar
+    """
+    if out is None:
+        out = np.empty(len(keys["profile"]))
+    load = out
 
+    # the load_active values corresponding to the month, hour and day_flag of each timestep are taken directly from the lookup array
+    if inputs["load"] is None:
+        np.take(inputs["profile"], keys["profile"], out=load)
     else:
-        
-        # Arera case has the monthly profiles, while the other cases have the hourly profiles non depending on the month. Thus the method is different, as the structuree
-        # of theload_user in this case has also the "month" column.
-        # we prepare the load profile for the merge, stacking the hour and the day_flag, and calling the values "load_active"
-        load_user_stack = load_user.stack().reset_index().rename(columns={"level_1":'day_flag', 
-                                                        "Hour":"hour", 
-                                                        0:"load_active"})
-        
-        # updating the df with the load_active values corresponding to the hour and day_flag
-        df = pd.merge(df, load_user_stack, on=["hour", 'day_flag'], how = 'inner').sort_values("datetime").reset_index(drop = True)
+        assert len(inputs["load"]) == len(keys["profile"]), "ERROR: the " + inputs["load_profile_id"] + " of " + user + " has not the same number of timesteps of the calendar"
+        load[:] = inputs["load"]
 
     # if not arera profile and not real profile and not emulated profile, we update week_factor_active and year_factor_active!
-    if load_profile_id != "arera" and load_profile_id != "real profile" and load_profile_id != "emulated profile": 
-
-        week_factor_stack = week_factor.stack().reset_index().rename(columns={"level_1":'day_flag', 
-                                                    "Week":"week",
-                                                    0:"weekly_correction"})
+    if inputs["weekly"] is not None: 
+        load *= np.take(inputs["weekly"], keys["week"]) # weekly correction corresponding to the week and day_flag
+        load *= np.take(inputs["yearly"], keys["year"]) # yearly correction corresponding to the year
+
+    # random factor for peak fluctuation: the load of each datapoint fluctuates + or - x% if (updating_random_variation_flag == True). If not, the load is not modified
+    if inputs["random_variation"]:
+        random_variation = load_profile_rng(seed, user).random(len(load), dtype=np.float32) # random values from 0 to 1, from the stream of the user type
+        random_variation *= 2 * rand_factor / 100
+        random_variation += 1 - rand_factor / 100 # random values between 1-rand_factor and 1+rand_factor
         
-        # updating the df with the load_active values corresponding to the week and day_flag
-        df = pd.merge(df, week_factor_stack, on=["week", 'day_flag'], how='inner').sort_values("datetime").reset_index(drop=True)
-        
-        # updating the df with the load_active values corresponding to the year
-        year_factor_stack = year_factor["yearly_correction"]
-        df = pd.merge(df, year_factor_stack, on=["year"], how='inner').sort_values("datetime").reset_index(drop=True)
+        # CALCULATION
+        # we calculate the energy consumption for the specific datapoint
+        load *= random_variation
 
-    else:
-        df["weekly_correction"] = 1
-        df["yearly_correction"] = 1
+    return load # the load adjusted, one value per timestep of the calendar
+
+##########################################################
 
-    # CALCULATION
-    # we calculate the energy consumption for the specific datapoint
-    df["load_active_adjusted"] = df["load_active"] * df["weekly_correction"] * df["yearly_correction"] * (1 + df["random_variation"])
+def load_profile_single_user(keys, user, seed, rand_factor, out=None):
+    """gnerating the load profile for a single user.
+    Inputs:
+        keys                lookup keys of the calendar, from load_profile_keys()
+        user                user_id, same user id that we have in registry_users.keys()
+        seed                master seed of the random variation, see load_profile_rng()
+        rand_factor         random factor for peak fluctuation, in %
+        out                 optional preallocated array where the load profile is written
+    Outputs: 
+        load                array with the load profile of the user, one value per timestep of the calendar
+    """
+    inputs = load_profile_single_user_inputs(user)
+    load = build_load_profile(keys, inputs, user, seed, rand_factor, out=out)
+
+    print("user created: ", blue(user), "\t\t user type: ", inputs["load_profile_id"])
+
+    return load
+
+##########################################################
 
-    print("user created: ", blue(user), "\t\t user type: ", load_profile_id )
+def _load_profile_worker_init(keys, filename_results, seed, rand_factor):
+    """initializer of the worker processes of load_profile_all_users(): the calendar keys are received once and the results file is memory-mapped once per worker"""
+    global _load_profile_worker_data
+    _load_profile_worker_data = {"keys": keys, "results": np.load(filename_results, mmap_mode="r+"), "seed": seed, "rand_factor": rand_factor}
 
-    return df.set_index("datetime")["load_active_adjusted"] #returning the load adjusted with the datetime as the unique index, same format of the df_results
+def _load_profile_worker(i, user, inputs):
+    """generating the load profile of a user type in a worker process, writing it directly in its row of the memory-mapped results"""
+    data = _load_profile_worker_data
+    build_load_profile(data["keys"], inputs, user, data["seed"], data["rand_factor"], out=data["results"][i])
+    data["results"].flush()
+    return user
 
 ##########################################################
 
-def load_profile_all_users():
+def load_profile_all_users(n_workers=None):
     
     """
     Loop over all user types, to create the 15min or 1H load profiles.
+    Inputs:
+        n_workers       number of worker processes generating the user type profiles in parallel. If None, config['n_workers'] is used (1 = sequential)
     Exports:
 
     """
 
     print(blue("\nGenerate load profile for user types added:", ['bold', 'underlined']), '\n')
 
-    global xls, month_factor, year_factor, user_load_arera, region, delta_t, wb, output_all_users, rand_factor, real_profile_df, emulated_load_profile_df
+    global profile_catalogue, arera_power_ranges, arera_lookup, region, delta_t, rand_factor, real_profile_df, emulated_load_profile_df, calendar_active
 
     ########### INPUTS ##############
 
@@ -758,6 +934,10 @@ def load_profile_all_users():
     region = province_to_region() # region of Italy
     rand_factor = config['rand_factor'] # random factor for peak fluctuation
     print("Random factor: " + str(rand_factor) + " %")
+    seed = config.get('random_seed') # master seed of the random variation. If not given, a new one is drawn at each run
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Random seed: " + str(seed))
     delta_t = config['delta_t'] 
 
     user_types_set = yaml.safe_load(open(filename_registry_user_types_yml, 'r')) # file yaml with user type data
@@ -766,25 +946,19 @@ def load_profile_all_users():
 
     print(len(users_consuming_energy), "user types consuming found")
 
-    df = get_calendar() # importing the calendar
-    df.drop(columns=["fascia"], inplace=True)
-
-    # generating columns needed for calculation  
-    df["hour"] = df["datetime"].dt.time # create hour column
-    df["week"] = df["datetime"].dt.isocalendar().week # create week column
-    df["month"] = df["datetime"].dt.month # create month column
-    df["year"] = df["datetime"].dt.year # create year column
+    calendar_active = get_active_calendar() # importing the calendar
+    keys = load_profile_keys(calendar_active) # (month, day_flag, slot), (week, day_flag) and year keys of each timestep, computed once for all the users
 
     # import load profile arera
     if "arera" in load_profiles_list:
         user_load_arera = pd.read_csv(filename_user_load_arera) # si importano i profili di consumo arera
 
-        user_load_arera["Hour"] = pd.to_datetime(user_load_arera.Ora, format="%H").dt.time # create the Hour column in the arera df with the correct format
-        
         # replace day type with the correct format
         vals_to_replace = {"Giorno feriale": "Working_day", "Sabato": "Saturday", "Domenica": "Sunday"} 
         user_load_arera["Working day"] = user_load_arera["Working day"].map(vals_to_replace) 
 
+        arera_power_ranges, arera_lookup = arera_profiles_lookup(user_load_arera, region, delta_t) # pivoting and upsampling once for all the ARERA user types
+
     # import real load profile
     if "real profile" in load_profiles_list:
         filename = config["filename_load"]
@@ -802,11 +976,8 @@ def load_profile_all_users():
         filename = config["filename_emulated_load_profile"]
         emulated_load_profile_df = pd.read_csv(filename, index_col = 'datetime')
 
-    # import other load profiles
-    app = xw.App(visible = False)
-    wb = xw.Book(filename_carico_input)
-
-    year_factor = wb.sheets['Yearly_Variation'].range('A1').options(pd.DataFrame, header=1, index=True, expand='table').value
+    # import other load profiles (parsed without Excel, and only if the file changed since the last run)
+    profile_catalogue = load_profile_catalogue(filename_carico_input)
 
     # check on load profile name, to make sure they are all given
     for user in users_consuming_energy:
@@ -815,27 +986,53 @@ def load_profile_all_users():
             continue
         else:
             # if profile does not come from any of the above sources, it must come from the input file, meaning the load_profile_id must be in one of the document's sheets
-            sheets = [sheet.name for sheet in wb.sheets] 
             # If not present, then error must be triggered
-            assert load_profile_id in sheets, print("ATTENTION: the", load_profile_id, "load profile given as input was not found!")
+            assert load_profile_id in profile_catalogue["profiles"], print("ATTENTION: the", load_profile_id, "load profile given as input was not found!")
+
+    if n_workers is None:
+        n_workers = config.get("n_workers", 1)
 
     #Start the loop over the consuming user types
 
-    # initializing the results datafame, as copy of df (calendar imported) but with "datetime" as index
-    df_results = df.copy(deep=True)
-    df_results = df_results.set_index("datetime")
+    # initializing the results, one row per user type (so that each profile is written contiguously), one column per timestep of the calendar
+    shape = (len(users_consuming_energy), len(calendar_active))
+
+    if n_workers > 1:
+        # the results are preallocated in a memory-mapped file, where the worker processes write directly the profiles
+        filename_results = os.path.splitext(config["filename_carichi"])[0] + ".npy"
+        results = np.lib.format.open_memmap(filename_results, mode="w+", dtype=np.float64, shape=shape)
+        results.flush()
+    else:
+        results = np.empty(shape)
+
+    df_results = None
+
+    try:
+        if n_workers > 1:
+            print("Generating the load profiles with", n_workers, "worker processes")
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_load_profile_worker_init, initargs=(keys, filename_results, seed, rand_factor)) as executor:
+                futures = [executor.submit(_load_profile_worker, i, user, load_profile_single_user_inputs(user)) for i, user in enumerate(users_consuming_energy)]
+                for future in as_completed(futures):
+                    user = future.result()
+                    print("user created: ", blue(user), "\t\t user type: ", user_types_set[user]["load_profile_id"])
+        else:
+            for i, user in enumerate(users_consuming_energy): # loop on user types
 
-    for user in users_consuming_energy: # loop on user types
+                # we generate the load profile of the selected user type for all the timestep over the project lifetime
+                load_profile_single_user(keys, user, seed, rand_factor, out=results[i])
 
-        # we generate the load profile of the selected user type for all the timestep over the project lifetime and append it in the output_all_users
-        df_results[user] = load_profile_single_user(df, user)
-        assert not df_results[user].isna().any(), "ERROR: Indexing failure! NaN found in " + user
+        for i, user in enumerate(users_consuming_energy):
+            assert not np.isnan(results[i]).any(), "ERROR: Indexing failure! NaN found in " + user
 
-    wb.close()
-    app.quit()
+        # #################### EXIT ################
+        df_results = pd.DataFrame(results.T, index=pd.DatetimeIndex(calendar_active.datetime, name="datetime"), columns=users_consuming_energy)
+        df_results.to_csv(config["filename_carichi"])
 
-    # #################### EXIT ################
-    df_results.drop(columns=["hour", "week", "month", "year", "holiday", "day_week", "day_flag"]).to_csv(config["filename_carichi"])
+    finally:
+        # the memory-mapped file is removed also if the run fails, releasing it first (the dataframe can be a view of it)
+        df_results = results = None
+        if n_workers > 1:
+            os.remove(filename_results)
 
     print("\n**** Load profiles successfully exported! ****")
 
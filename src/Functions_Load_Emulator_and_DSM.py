@@ -4,6 +4,8 @@ import numpy as np
 import pandas as pd
 import numpy as np
 import math
+import os
+import zlib
 import random
 from datetime import date, datetime, timedelta
 import yaml
@@ -15,6 +17,7 @@ from tqdm.auto import tqdm
 from simple_colors import *
 import contextlib
 import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from files.energy.input.DSM_optimizer.main import ott_year
 from simple_colors import *
 
@@ -115,7 +118,170 @@ def datetime_range(start, end, delta):
 
 ###################################################################################################################
 
-def create_appliance_start_time(num_days, calendario, flag_daily_activation = True, flag_multi_use = True): 
+_load_emulator_inputs = {} # process-wide cache of the load emulator inputs, see get_load_emulator_inputs()
+
+def get_load_emulator_inputs():
+    """Read the appliance load profiles and usage probabilities needed by the load emulator. The excel files are read only once per process,
+    and read again only if they are modified.
+
+    Outputs:
+        inputs (dict): dictionary with
+            "appliance_load": dataframe (96 x appliances) with the load profile of each appliance from its start time
+            "num_timestep_load_profile": series with the number of timesteps of the load profile of each appliance
+            "usage_probability": dataframe (96 x appliances) with the daily usage probability of each appliance
+            "usage_probability_DSM": dataframe (96 x appliances) with the daily usage probability of each appliance in the DSM case
+            "num_of_uses": dataframe (3 x appliances) with the probability of 1, 2 or 3 uses in a day
+            "wm_week_usage_probability": series with the probability (%) of using the washing machine in a Working_day, Saturday or Sunday
+    """
+
+    config = yaml.safe_load(open("config.yml", 'r'))
+    filename_appliance_load = config['filename_appliances_load']
+    filename_usage_probability = config['filename_usage_probability']
+    key = (filename_appliance_load, os.path.getmtime(filename_appliance_load), filename_usage_probability, os.path.getmtime(filename_usage_probability))
+
+    if _load_emulator_inputs.get("key") != key:
+        inputs = {}
+        inputs["appliance_load"] = pd.read_excel(filename_appliance_load, header = 0, index_col = 0, sheet_name = "load_profile") # we import the load profile for all appliances
+        inputs["num_timestep_load_profile"] = (inputs["appliance_load"] != 0).sum() # we calculate the number of timesteps for each appliance
+
+        usage_probability = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = ["daily_usage_probability", "daily_usage_probability_DSM", "num_of_uses", "week_usage_probability"])
+        inputs["usage_probability"] = usage_probability["daily_usage_probability"] # usage probability for dish washer, washing machine, oven, tv e microwaves
+        inputs["usage_probability_DSM"] = usage_probability["daily_usage_probability_DSM"] # DSM usage probability for dish washer, washing machine, oven, tv e microwaves
+        inputs["num_of_uses"] = usage_probability["num_of_uses"] # daily usage probability with different number of uses
+        inputs["wm_week_usage_probability"] = usage_probability["week_usage_probability"].loc['washing_machines'].copy() # weekly usage probability for the washing machine
+
+        _load_emulator_inputs["inputs"] = inputs
+        _load_emulator_inputs["key"] = key
+
+    return _load_emulator_inputs["inputs"]
+
+###################################################################################################################
+
+def sample_from_weights(rng, weights):
+    """Inverse-CDF sampling of one index per row of a weights matrix (each row can have different weights, not normalized).
+
+    Inputs:
+        rng (numpy.random.Generator): random generator
+        weights (array): 2D array (samples x values) with non negative weights
+
+    Outputs:
+        index (array): sampled index for each row, -1 for the rows with all weights equal to zero
+    """
+
+    cdf = np.cumsum(weights, axis = 1)
+    total = cdf[:, -1]
+    values = rng.random(len(weights)) * total # one uniform value for each row, scaled on the total weight of the row
+    index = (cdf <= values[:, None]).sum(axis = 1) # the sampled index is the first one with cdf greater than the value
+    index[total <= 0] = -1 
+    return index
+
+###################################################################################################################
+
+def sample_appliance_start_time(rng, usage_probability, num_days, delta, num_of_uses_probability = None, activation_probability = None):
+    """Sample the start timesteps of an appliance for all the days at once.
+    The second and third uses are sampled from the usage probability renormalized after setting to zero the timesteps in the range [index - delta, index + delta] 
+    around the previous activations, in way to avoid overlapping activations.
+
+    Inputs:
+        rng (numpy.random.Generator): random generator
+        usage_probability (array): daily usage probability of the appliance (96 values, not normalized)
+        num_days (int): number of days to sample
+        delta (int): number of timesteps of the appliance load profile (half width of the excluded range around previous activations)
+        num_of_uses_probability (array, optional): probability of 1, 2 or 3 uses in a day. If None, the appliance is used once a day. Defaults to None.
+        activation_probability (array, optional): probability (0-1) that the appliance is used, for each day. If None, the appliance is used every day. Defaults to None.
+
+    Outputs:
+        start_time (array): int16 array (uses x days) = (3 x num_days) with the start timestep of each use, -1 if the appliance is not used
+    """
+
+    start_time = np.full((3, num_days), -1, dtype = np.int16)
+    
+    # number of uses for each day (0 if the appliance is not activated in the day)
+    num_of_uses = np.ones(num_days, dtype = int)
+    if num_of_uses_probability is not None:
+        num_of_uses = sample_from_weights(rng, np.broadcast_to(np.asarray(num_of_uses_probability, dtype = float), (num_days, 3))) + 1
+    if activation_probability is not None:
+        num_of_uses[rng.random(num_days) >= activation_probability] = 0
+
+    weights = np.tile(np.asarray(usage_probability, dtype = float), (num_days, 1)) # usage probability for each day, updated after each use
+    timesteps = np.arange(weights.shape[1])
+
+    for use in range(3):
+        days = np.flatnonzero(num_of_uses > use)
+        if len(days) == 0:
+            break
+
+        selected = sample_from_weights(rng, weights[days])
+        if (selected < 0).any():
+            warnings.warn("All values in probability are zeros in the case with " + str(use + 1) + " number of uses!", UserWarning)
+        
+        start_time[use, days] = selected
+
+        # we set to zero the probability in the range [index - delta, index + delta] around the selected timestep, in way to consider the previous activations of the appliance
+        excluded = (np.abs(timesteps[None, :] - selected[:, None]) <= delta) & (selected[:, None] >= 0)
+        weights[days] = np.where(excluded, 0, weights[days])
+
+    return start_time
+
+###################################################################################################################
+
+def start_time_array_to_df(start_time, appliances_list):
+    """Convert the start times of one use (days x appliances array, -1 if not used) in the dataframe format used by the emulator (object dtype, nan if not used)."""
+
+    start_time_df = pd.DataFrame(start_time.astype(object), index = np.arange(start_time.shape[0]), columns = appliances_list)
+    return start_time_df.mask(start_time < 0)
+
+###################################################################################################################
+
+def save_start_time_store(filename, start_time, users_list, appliances_list):
+    """Save the start times of all users in a columnar store: the int16 array in a .npy file (memory-mappable) and the users and appliances ids in a .yml file.
+
+    Inputs:
+        filename (str): path of the store, without extension
+        start_time (array): int16 array (users x appliances x uses x days) with the start timestep of each use, -1 if the appliance is not used
+        users_list (list): users ids, in the order of the first axis of start_time
+        appliances_list (list): appliances ids, in the order of the second axis of start_time
+    """
+
+    np.save(filename + ".npy", np.asarray(start_time, dtype = np.int16))
+    with open(filename + ".yml", 'w') as fp:
+        yaml.safe_dump({"users": [str(user) for user in users_list], "appliances": list(appliances_list)}, fp)
+
+def load_start_time_store(filename, mmap_mode = "r"):
+    """Load the start times of all users saved by save_start_time_store().
+
+    Inputs:
+        filename (str): path of the store, without extension
+        mmap_mode (str, optional): memory-map mode of the start time array (see numpy.load). If None, the array is read in memory. Defaults to "r".
+
+    Outputs:
+        start_time: int16 array (users x appliances x uses x days) with the start timestep of each use, -1 if the appliance is not used
+        users_list: users ids, in the order of the first axis of start_time
+        appliances_list: appliances ids, in the order of the second axis of start_time
+    """
+
+    start_time = np.load(filename + ".npy", mmap_mode = mmap_mode)
+    index = yaml.safe_load(open(filename + ".yml", 'r'))
+    return start_time, index["users"], index["appliances"]
+
+def start_time_store_to_dict(start_time, users_list, appliances_list):
+    """Convert the start time array (users x appliances x uses x days) in the dictionaries of dataframes used by the emulator, one for each number of uses.
+
+    Outputs:
+        start_time_dict_1: dictionary with the start time for the first use of the appliances of each user (days on rows and appliances on columns)
+        start_time_dict_2: dictionary with the start time for the second use of the appliances of each user (if activated)
+        start_time_dict_3: dictionary with the start time for the third use of the appliances of each user (if activated)
+    """
+
+    output = ({}, {}, {})
+    for u, user in enumerate(users_list):
+        for use in range(3):
+            output[use][user] = start_time_array_to_df(start_time[u, :, use, :].T, appliances_list)
+    return output
+
+###################################################################################################################
+
+def create_appliance_start_time(num_days, calendario, flag_daily_activation = True, flag_multi_use = True, rng = None): 
     """This function create a dataframe with the start time for the appliance under exam.
 
     Inputs:
@@ -123,6 +289,7 @@ def create_appliance_start_time(num_days, calendario, flag_daily_activation = Tr
         calendario (dataframe): calendar
         flag_daily_activation (bool, optional): if false we dont'use a daily usage activation for some specified appliances. Defaults to True.
         flag_multi_use (bool, optional): if true we activate the possibility to have multiple activations for the selected appliances during the day. Defaults to True.
+        rng (numpy.random.Generator, optional): random generator. If None, a new unseeded generator is used. Defaults to None.
 
     Outputs:
         start_time_df_1: dataframe with the start time for the first use of the appliance
@@ -130,122 +297,114 @@ def create_appliance_start_time(num_days, calendario, flag_daily_activation = Tr
         start_time_df_3: dataframe with the start time for the third use of the appliance (if activated)
     """
 
-    config = yaml.safe_load(open("config.yml", 'r'))
-    filename_appliance_load = config['filename_appliances_load']
-    appliance_load_df = pd.read_excel(filename_appliance_load, header = 0, index_col = 0, sheet_name = "load_profile") # we import the load profile for all appliances
-    num_timestep_load_profile = (appliance_load_df != 0).sum() # we calculate the number of timesteps for each appliance
+    start_time = create_appliance_start_time_array(num_days, calendario, flag_daily_activation, flag_multi_use, rng)
 
-    ##########################################################################################################################################
+    appliances_list = ["electricity_mains", "fridge", "washing_machine", "dish_washer", "microwaves", "tv", "oven"] # list of all appliance
 
-    filename_usage_probability = config['filename_usage_probability']
-    usage_probability_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "daily_usage_probability") # we import usage probability for dish washer, washing machine, oven, tv e microwaves
+    start_time_df_1 = start_time_array_to_df(start_time[:, 0, :].T, appliances_list) # number of uses equal to 1
+    start_time_df_2 = start_time_array_to_df(start_time[:, 1, :].T, appliances_list) # number of uses equal to 2
+    start_time_df_3 = start_time_array_to_df(start_time[:, 2, :].T, appliances_list) # number of uses equal to 3
+    
+    return (start_time_df_1, start_time_df_2, start_time_df_3)
 
-    num_daily_usage_probability_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "num_of_uses") # we import daily usage probability with different number of uses
+###################################################################################################################
 
-    week_usage_probability_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "week_usage_probability") # we import weekly usage probability
-    wm_week_usage_probability_df = week_usage_probability_df.loc['washing_machines'].copy() # we extract the weekly usage probability for the washing machine
+def create_appliance_start_time_array(num_days, calendario, flag_daily_activation = True, flag_multi_use = True, rng = None, flag_DSM = False, appliances_list = None): 
+    """This function samples the start time of all the appliances of a user, for all the days at once.
 
-    boolean_list = [True, False]
+    Inputs:
+        num_days (int): number of days to create
+        calendario (dataframe): calendar, with 96 timesteps per day
+        flag_daily_activation (bool, optional): if false we dont'use a daily usage activation for some specified appliances (if true in the DSM case). Defaults to True.
+        flag_multi_use (bool, optional): if true we activate the possibility to have multiple activations for the selected appliances during the day. Defaults to True.
+        rng (numpy.random.Generator, optional): random generator. If None, a new unseeded generator is used. Defaults to None.
+        flag_DSM (bool, optional): if true we use the DSM usage probability. Defaults to False.
+        appliances_list (list, optional): appliances to sample. If None, all the appliances. Defaults to None.
 
-    ##########################################################################################################################################
+    Outputs:
+        start_time: int16 array (appliances x uses x days) with the start timestep of each use, -1 if the appliance is not used
+    """
 
-    appliances_list = ["electricity_mains", "fridge", "washing_machine", "dish_washer", "microwaves", "tv", "oven"] # list of all appliance
+    if rng is None:
+        rng = np.random.default_rng()
 
-    ##########################################################################################################################################
+    if appliances_list is None:
+        appliances_list = ["electricity_mains", "fridge", "washing_machine", "dish_washer", "microwaves", "tv", "oven"] # list of all appliance
 
-    start = datetime(2025,1,1)
-    end = datetime(2025,1,2)
+    inputs = get_load_emulator_inputs()
+    usage_probability_df = inputs["usage_probability_DSM"] if flag_DSM else inputs["usage_probability"]
 
-    list_timestep_dt = []
+    # day type of each day (the calendar has 96 timesteps per day): Working_day; Saturday; Sunday
+    day_types = calendario['day_flag'].values[::96][:num_days]
 
-    for dt in datetime_range(start, end, {'days': 0, 'minutes' : 15}):
-        list_timestep_dt.append(dt)
+    # the daily activation of the washing machine is modified with a probability, if the external flag is setted to false (true in the DSM case)
+    flag_wm_activation = flag_daily_activation if flag_DSM else not flag_daily_activation
 
     ##########################################################################################################################################
 
-    # we extract a random value for the start time for each appliance for every day for the user under exam and save all values in a specific df
+    start_time = np.full((len(appliances_list), 3, num_days), -1, dtype = np.int16)
 
-    time_list = np.arange(0, 96 , 1).tolist() # we create a list with all timesteps
-    num_of_uses_list = np.arange(1, 4 , 1).tolist() # we create a list with all number of uses
-    
-    start_time_df_1 = pd.DataFrame(index = np.arange(num_days), columns = appliances_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 1)
-    start_time_df_2 = pd.DataFrame(index = np.arange(num_days), columns = appliances_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 2)
-    start_time_df_3 = pd.DataFrame(index = np.arange(num_days), columns = appliances_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 3)
+    for i, appliance in enumerate(appliances_list):
 
-    for day in range(num_days):  
-        
-        for appliance in appliances_list:
-            
-            activation_probability_flag = True # we initialize the flag probability for the daily usage for the selected day and appliance
-
-            # if the appliance is in list (only washing machine for the moment) and the external flag is setted to true, we modifify with a probability the daily activation of the appliance
-            if appliance in ["washing_machine"] and not flag_daily_activation:
+        activation_probability = None
+        if appliance in ["washing_machine"] and flag_wm_activation:
+            activation_probability = inputs["wm_week_usage_probability"][day_types].values / 100 # weekly usage probability for the washing machine in each day type
 
-                day_type = calendario.iloc[day]['day_flag'] # Working_day; Saturday; Sunday
-                activation_wm_probability = wm_week_usage_probability_df[day_type] # we extract the weekly usage probability for the washing machine in the selected day type
-                activation_wm_probability_list = [activation_wm_probability, 100 - activation_wm_probability] # we create a list with the weekly usage probability for the washing machine in the selected day type
-                activation_probability_flag = random.choices(boolean_list, weights = activation_wm_probability_list, k = 1)[0] # we randomly choose the start time for the selected appliance
+        num_of_uses_probability = None
+        if flag_multi_use:
+            num_of_uses_probability = inputs["num_of_uses"][appliance].values # number of uses probability for the selected appliance
 
-            #############################################################################
-
-            # if the appliance is activated in the selected days
-            if activation_probability_flag:
-                
-                num_of_uses_selected = 1 # we initialize the number of uses for the selected appliance
-
-                # if the external flag for the multiple usages during the day is true
-                if flag_multi_use:
-                    num_of_uses = num_daily_usage_probability_df[appliance].tolist() # we import the number of uses probability for the selected appliance
-                    num_of_uses_selected = random.choices(num_of_uses_list, weights = num_of_uses, k = 1)[0] # we randomly choose the number of uses for the selected appliance
-
-                #############################################################################
+        start_time[i] = sample_appliance_start_time(rng, usage_probability_df[appliance].values, num_days, inputs["num_timestep_load_profile"][appliance], 
+                                                    num_of_uses_probability, activation_probability)
+    
+    return start_time
 
-                # number of uses equal to 1
+###################################################################################################################
 
-                probability_1 = usage_probability_df[appliance].tolist() # we import the usage probability for the selected appliance
-                
-                timestep_selected_1 = random.choices(time_list, weights = probability_1, k = 1)[0] # we randomly choose the start time for the selected appliance
-                start_time_df_1.loc[day, appliance] = timestep_selected_1 # we save the start time for the selected day
+def emulator_rng(seed, user, flag_DSM = False):
+    """Independent random stream of an emulated user, derived from the master seed and the user ID, so that the start times of each user
+    do not depend on the order (or on the process) in which the users are simulated. The DSM start times use a different stream.
 
-                #############################################################################
+    Inputs:
+        seed (int): master seed
+        user (str): emulated user ID
+        flag_DSM (bool, optional): if true we return the stream of the DSM start times. Defaults to False.
 
-                # number of uses equal to 2
+    Outputs:
+        rng: numpy.random.Generator
+    """
 
-                if num_of_uses_selected > 1:
-                    
-                    # we set to zero the probability for the selected appliance in the selected day for all timesteps in the range [index - delta, index + delta] in way to consider the previous activations of the appliance
-                    index = timestep_selected_1 
-                    delta = num_timestep_load_profile[appliance]
-                    probability_2 = set_values_to_zero(probability_1, index, delta) 
+    return np.random.default_rng(np.random.SeedSequence([seed, zlib.crc32(str(user).encode())], spawn_key = (1 + int(flag_DSM),)))
 
-                    timestep_selected_2 = random.choices(time_list, weights = probability_2, k = 1)[0] # we randomly choose the start time for the selected appliance
-                    start_time_df_2.loc[day, appliance] = timestep_selected_2 # we save the start time for the selected day
+###################################################################################################################
 
-                    assert (timestep_selected_1 != timestep_selected_2), "The timesteps are equal!"
-                    assert (abs(timestep_selected_1 - timestep_selected_2) > num_timestep_load_profile[appliance]), "The timesteps are equal!"
+def _emulator_worker_init(data):
+    """Initializer of the worker processes of the load emulator: the inputs shared by all the users (calendar, flags, seed, results file) are received once per worker."""
 
-                #############################################################################
+    global _emulator_worker_data
+    _emulator_worker_data = dict(data)
+    if "filename_results" in data:
+        _emulator_worker_data["results"] = np.load(data["filename_results"], mmap_mode = "r+")
 
-                # number of uses equal to 3
+def _start_time_worker(user):
+    """Sample the appliance start times of an emulated user in a worker process."""
 
-                if num_of_uses_selected > 2:
+    data = _emulator_worker_data
+    rng = emulator_rng(data["seed"], user)
+    return create_appliance_start_time_array(data["num_days"], data["calendario"], data["flag_daily_activation"], data["flag_multi_use"], rng)
 
-                    # we set to zero the probability for the selected appliance in the selected day for all timesteps in the range [index - delta, index + delta] in way to consider the previous activations of the appliance
-                    index = timestep_selected_2 
-                    delta = num_timestep_load_profile[appliance]
-                    probability_3 = set_values_to_zero(probability_2, index, delta)
+def _user_load_profile_worker(i, start_time_df_1, start_time_df_2, start_time_df_3):
+    """Create the load profile of an emulated user in a worker process, writing it directly in its row of the memory-mapped results."""
 
-                    timestep_selected_3 = random.choices(time_list, weights = probability_3, k = 1)[0] # we randomly choose the start time for the selected appliance
-                    start_time_df_3.loc[day, appliance] = timestep_selected_3 # we save the start time for the selected day
-                
-                    assert (timestep_selected_1 != timestep_selected_2 or timestep_selected_1 != timestep_selected_3 or timestep_selected_2 != timestep_selected_3), "The timesteps are equal!"
-                    assert (abs(timestep_selected_1 - timestep_selected_2) > num_timestep_load_profile[appliance]  or abs(timestep_selected_1 - timestep_selected_3) > num_timestep_load_profile[appliance]  or abs(timestep_selected_2 - timestep_selected_3) > num_timestep_load_profile[appliance] ), "The timesteps are equal!"
-    
-    return (start_time_df_1, start_time_df_2, start_time_df_3)
+    data = _emulator_worker_data
+    user_consumption_df = create_single_user_load_profile(start_time_df_1, start_time_df_2, start_time_df_3, data["num_days"], data["appliances_list"])
+    data["results"][i] = user_consumption_df.values.T.ravel() # days one after the other
+    data["results"].flush()
+    return i
 
 ###################################################################################################################
 
-def create_all_user_appliance_start_time(emulated_users_list, num_days, calendario, flag_daily_activation = True, flag_multi_use = True):
+def create_all_user_appliance_start_time(emulated_users_list, num_days, calendario, flag_daily_activation = True, flag_multi_use = True, n_workers = None):
     """Create all user appliance start time for all days fixed.
     
     Inputs:
@@ -254,6 +413,7 @@ def create_all_user_appliance_start_time(emulated_users_list, num_days, calendar
         calendario (dataframe): calendar
         flag_daily_activation (bool, optional): if false we dont'use a daily usage activation for some specified appliances. Defaults to True.
         flag_multi_use (bool, optional): if true we activate the possibility to have multiple activations for the selected appliances during the day. Defaults to True.
+        n_workers (int, optional): number of worker processes sampling the users in parallel. If None, config['n_workers'] is used (1 = sequential). Defaults to None.
     
     Outputs:
         all_user_appliance_start_time_dict_1: dictionary with the start time for the first use of the appliance
@@ -263,80 +423,72 @@ def create_all_user_appliance_start_time(emulated_users_list, num_days, calendar
 
     print(blue("\nGenerate all user appliance start time:\n"))
 
-    # initialize the dictionaries
-    output = {}
-    all_user_appliance_start_time_dict_1 = {} # number of uses equal to 1
-    all_user_appliance_start_time_dict_2 = {} # number of uses equal to 2
-    all_user_appliance_start_time_dict_3 = {} # number of uses equal to 3
+    config = yaml.safe_load(open("config.yml", 'r'))
 
-    all_user_appliance_start_time_dict = {}
+    seed = config.get('random_seed') # master seed of the start times. If not given, a new one is drawn at each run
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("     Random seed: " + str(seed) + "\n")
 
-    # we create the start time for the appliance for each user
-    for id_user in tqdm(emulated_users_list):
-        
-        output = create_appliance_start_time(num_days, calendario, flag_daily_activation, flag_multi_use)
+    if n_workers is None:
+        n_workers = config.get("n_workers", 1)
 
-        all_user_appliance_start_time_dict_1[id_user] = output[0] # number of uses equal to 1
-        all_user_appliance_start_time_dict_2[id_user] = output[1] # number of uses equal to 2
-        all_user_appliance_start_time_dict_3[id_user] = output[2] # number of uses equal to 3
+    appliances_list = ["electricity_mains", "fridge", "washing_machine", "dish_washer", "microwaves", "tv", "oven"] # list of all appliance
+
+    # we create the start time for the appliance for each user, each one with its own random stream
+    if n_workers > 1:
+        data = {"num_days": num_days, "calendario": calendario, "flag_daily_activation": flag_daily_activation, "flag_multi_use": flag_multi_use, "seed": seed}
+        with ProcessPoolExecutor(max_workers = n_workers, initializer = _emulator_worker_init, initargs = (data,)) as executor:
+            start_time_list = list(tqdm(executor.map(_start_time_worker, emulated_users_list, chunksize = max(1, len(emulated_users_list) // (4 * n_workers))), total = len(emulated_users_list)))
+    else:
+        start_time_list = [create_appliance_start_time_array(num_days, calendario, flag_daily_activation, flag_multi_use, emulator_rng(seed, id_user)) for id_user in tqdm(emulated_users_list)]
 
-    all_user_appliance_start_time_dict[0] = all_user_appliance_start_time_dict_1 # number of uses equal to 1
-    all_user_appliance_start_time_dict[1] = all_user_appliance_start_time_dict_2 # number of uses equal to 2
-    all_user_appliance_start_time_dict[2] = all_user_appliance_start_time_dict_3 # number of uses equal to 3
+    start_time = np.stack(start_time_list) # (users x appliances x uses x days)
 
     #############################################################################
     
-    # export dictionary in external file
-    config = yaml.safe_load(open("config.yml", 'r'))
+    # export start time in external file
     folder = config["foldername_result_emulator"]
-    # now = datetime.now().strftime("(%Y-%m-%d_%H-%M)")
-    with open(folder + 'all_user_appliance_start_time_dict.pkl', 'wb') as fp:
-        pickle.dump(all_user_appliance_start_time_dict, fp)
+    save_start_time_store(folder + 'all_user_appliance_start_time', start_time, emulated_users_list, appliances_list)
 
     #############################################################################
 
     print("\n     **** All appliance start time created! ****")
 
-    return (all_user_appliance_start_time_dict_1, all_user_appliance_start_time_dict_2, all_user_appliance_start_time_dict_3)
+    return start_time_store_to_dict(start_time, emulated_users_list, appliances_list)
 
 ###################################################################################################################
 
-def add_appliance(appliance_profile, start_time, day, user_consumption_df, df_2):
-    """Add the appliance to the user consumption dataframe.
-    
+def superpose_appliance_profile(appliance_profile, start_time, num_days, out = None):
+    """Superpose the load profile of an appliance for all its activations in a flat array with all timesteps of the simulation.
+    Each activation writes the appliance profile from its start timestep on, so the part of the profile after the midnight
+    is added to the following day (the part after the last day of the simulation is lost).
+
     Inputs:
-        appliance_profile (dataframe): appliance load profile
-        start_time (int): start time of the appliance
-        day (int): day of the simulation
-        user_consumption_df (dataframe): user consumption dataframe
-        df_2 (dataframe): dataframe to add the appliance
+        appliance_profile (array): appliance load profile from the start time (96 values)
+        start_time (array): start timesteps of the appliance (any shape, days on the last axis), -1 or nan if the appliance is not used
+        num_days (int): number of days to simulate
+        out (array, optional): flat array (num_days * 96) where to add the appliance load profile. If None, a new array is created. Defaults to None.
     
     Outputs:
-        user_consumption_df: updated user consumption dataframe
-        df_2: updated dataframe to add the appliance
+        out: flat array (num_days * 96) with the appliance load profile added
     """
 
-    df_1 = appliance_profile.head(96 - start_time).to_frame() # we extract the load profile for the selected appliance (from the 00:00 to the start time)
-    new_rows = pd.DataFrame(0, index=range(start_time), columns=df_1.columns) # we create a df with zeros for the timesteps from the start time to the end of the day
-    df_1 = pd.concat([new_rows, df_1], ignore_index=True) # we concatenate the two df (before zeros and after load profile)
-
-    #############################################################################
-
-    user_consumption_df[day] += df_1.iloc[:, 0] # we add df_1 to the user consumption dataframe
+    if out is None:
+        out = np.zeros(num_days * 96)
 
-    #############################################################################
+    appliance_profile = np.asarray(appliance_profile, dtype = float)
+    length = np.flatnonzero(appliance_profile)[-1] + 1 if appliance_profile.any() else 0 # we only superpose the timesteps with a consumption
 
-    # if day>0 we add the previous day load profile (df_2) to the current day
-    if day>0:
-        user_consumption_df[day] += df_2.iloc[:, 0] # we add df_2 to the user consumption dataframe
+    start_time = np.asarray(start_time, dtype = float).reshape(-1, num_days)
+    use, day = np.nonzero(start_time >= 0) # nan and -1 are the days without activation
+    first_index = day * 96 + start_time[use, day].astype(np.int64) # flat index of each activation
 
-    #############################################################################
+    index = first_index[:, None] + np.arange(length)[None, :] # flat index of each timestep of each activation
+    valid = index < len(out)
+    np.add.at(out, index[valid], np.broadcast_to(appliance_profile[:length], index.shape)[valid])
 
-    df_2 = appliance_profile.tail(start_time).to_frame() # we extract the load profile for the selected appliance (from the start time to the end of the day)
-    new_rows = pd.DataFrame(0, index=range(96 - start_time), columns=df_2.columns) # we create a df with zeros for the timesteps from the 00:00 to the start time
-    df_2 = pd.concat([df_2, new_rows], ignore_index=True) # we concatenate the two df (load profile and after zeros)
-
-    return user_consumption_df, df_2
+    return out
 
 ###################################################################################################################
 
@@ -351,68 +503,41 @@ def create_single_user_load_profile(start_time_df_1, start_time_df_2, start_time
         appliances_list (list): list of appliances to simulate
     
     Outputs:
-        user_consumption_df: user load profile
+        user_consumption_df: user load profile (96 timesteps on rows and num_days days on columns)
     """
 
-    config = yaml.safe_load(open("config.yml", 'r'))
-    filename_appliances_load = config['filename_appliances_load']
-    appliances_load_df = pd.read_excel(filename_appliances_load, header=0, index_col=0) # we import the load profile for all appliances
+    appliances_load_df = get_load_emulator_inputs()["appliance_load"] # we import the load profile for all appliances
 
     #############################################################################
 
-    # Create an empty DataFrame to hold aggregated load profiles for each day
-    # rows: 96 timesteps, columns: num_days days
-    num_years = config['project_lifetime_yrs']
-    user_consumption_df = pd.DataFrame(0, index=range(96), columns=range(num_days))
+    # flat array with all the timesteps of the simulation (day after day), to hold aggregated load profiles
+    user_consumption = np.zeros(num_days * 96)
 
     ############################################################################
 
-    # Iterate over each appliance and day
+    # Iterate over each appliance, adding all its uses in all the days at once
     for appliance in appliances_list:
 
-        appliance_profile = appliances_load_df[appliance] # we extract the load profile for the selected appliance
-
-        df_2 = df_3 = df_4 = pd.DataFrame(0, index=range(96), columns=range(1)) # we create an empty df to save the load profile for the selected appliance
-
-        for day in range(num_days):
-
-            # number of uses equal to 1
-
-            start_time_1 = start_time_df_1[appliance][day] # Read the start time for the current appliance and day
-
-            # if the start time is not nan we add the appliance to the user consumption dataframe
-            if not math.isnan(start_time_1):
-                user_consumption_df, df_2 = add_appliance(appliance_profile, start_time_1, day, user_consumption_df, df_2) 
-
-            #############################################################################
-
-            if appliance not in ["electricity_mains", "fridge"]:
-
-                # number of uses equal to 2
-
-                start_time_2 = start_time_df_2[appliance][day] # Read the start time for the current appliance and day
+        # the electricity mains and the fridge have a single use per day
+        if appliance in ["electricity_mains", "fridge"]:
+            start_time_list = [start_time_df_1]
+        else:
+            start_time_list = [start_time_df_1, start_time_df_2, start_time_df_3]
 
-                # if the start time is not nan we add the appliance to the user consumption dataframe
-                if not math.isnan(start_time_2):
-                    user_consumption_df, df_3 = add_appliance(appliance_profile, start_time_2, day, user_consumption_df, df_3)
-            
-                #############################################################################
+        start_time = np.array([start_time_df[appliance].to_numpy(dtype = float)[:num_days] for start_time_df in start_time_list]) # (uses x days), nan if the appliance is not used
 
-                # number of uses equal to 3
+        superpose_appliance_profile(appliances_load_df[appliance].values, start_time, num_days, out = user_consumption)
 
-                start_time_3 = start_time_df_3[appliance][day] # Read the start time for the current appliance and day
-                
-                # if the start time is not nan we add the appliance to the user consumption dataframe
-                if not math.isnan(start_time_3):
-                    user_consumption_df, df_4 = add_appliance(appliance_profile, start_time_2, day, user_consumption_df, df_4)
+    #############################################################################
 
-                #############################################################################
+    # rows: 96 timesteps, columns: num_days days
+    user_consumption_df = pd.DataFrame(user_consumption.reshape(num_days, 96).T, index = range(96), columns = range(num_days))
 
     return user_consumption_df
 
 ###################################################################################################################
 
-def create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_time_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance = True):
+def create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_time_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance = True, n_workers = None):
     """Create all user load profile over all days fixed using the start time simulated.
 
     Inputs:
@@ -423,6 +548,7 @@ def create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_tim
         num_days (float): number of days to simulate
         flag_DSM (bool): if true we simulate a demand side management scenario
         flag_all_appliance (bool, optional): if false we don't use all appliances in the user load profile simulation. Defaults to True.
+        n_workers (int, optional): number of worker processes creating the user load profiles in parallel. If None, config['n_workers'] is used (1 = sequential). Defaults to None.
 
     Outputs:
         all_user_load_profile_dict: dictionary with all load profile for all days simulated for all users fixed
@@ -432,6 +558,17 @@ def create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_tim
 
     all_user_load_profile_dict = {} # we create a dict with all load profile for each day for every users (timesteps on rows and user_id on columns)
 
+    config = yaml.safe_load(open("config.yml", 'r'))
+    folder = config["foldername_result_emulator"]
+
+    if flag_DSM:
+        title_flag = 'DSM_'
+    else:
+        title_flag = ''
+
+    if n_workers is None:
+        n_workers = config.get("n_workers", 1)
+
     # if true we use all appliances for the user load profile simulation
     if flag_all_appliance:
         # List of all appliances. The order of the appliances needs to be equal to the order of the columns in appliance_load_df to work correctly.
@@ -442,25 +579,38 @@ def create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_tim
         # List of all appliances. The order of the appliances needs to be equal to the order of the columns in appliance_load_df to work correctly.
         appliances_list = ["electricity_mains", "fridge", "microwaves", "tv", "oven"]
 
-    for id_user in tqdm(emulated_users_list):
-        
-        start_time_df_1 = start_time_dict_1[id_user] # we extract the start time for the first use of the appliance for the user under exam
-        start_time_df_2 = start_time_dict_2[id_user] # we extract the start time for the second use of the appliance for the user under exam
-        start_time_df_3 = start_time_dict_3[id_user] # we extract the start time for the third use of the appliance for the user under exam
+    if n_workers > 1:
+        # the workers write the load profile of each user (days one after the other) in its row of a memory-mapped file
+        filename_results = folder + title_flag + "all_user_load_profile.npy"
+        results = np.lib.format.open_memmap(filename_results, mode = "w+", dtype = np.float64, shape = (len(emulated_users_list), num_days * 96))
+        results.flush()
 
-        # we create the load profile for the user under exam
-        all_user_load_profile_dict[id_user] = create_single_user_load_profile(start_time_df_1, start_time_df_2, start_time_df_3, num_days, appliances_list)
+        try:
+            data = {"num_days": num_days, "appliances_list": appliances_list, "filename_results": filename_results}
+            with ProcessPoolExecutor(max_workers = n_workers, initializer = _emulator_worker_init, initargs = (data,)) as executor:
+                futures = [executor.submit(_user_load_profile_worker, i, start_time_dict_1[id_user], start_time_dict_2[id_user], start_time_dict_3[id_user]) for i, id_user in enumerate(emulated_users_list)]
+                for future in tqdm(as_completed(futures), total = len(futures)):
+                    future.result()
 
-    #############################################################################
+            for i, id_user in enumerate(emulated_users_list):
+                # the profile is copied out of the memory-mapped file, so that no dataframe keeps it open
+                all_user_load_profile_dict[id_user] = pd.DataFrame(np.array(results[i]).reshape(num_days, 96).T, index = range(96), columns = range(num_days)) # rows: 96 timesteps, columns: num_days days
 
-    # export dictionary in external file
-    config = yaml.safe_load(open("config.yml", 'r'))
-    folder = config["foldername_result_emulator"]
+        finally:
+            del results # releasing the memory-mapped file before removing it, also if a worker fails
+            os.remove(filename_results)
 
-    if flag_DSM:
-        title_flag = 'DSM_'
     else:
-        title_flag = ''
+        for id_user in tqdm(emulated_users_list):
+            
+            start_time_df_1 = start_time_dict_1[id_user] # we extract the start time for the first use of the appliance for the user under exam
+            start_time_df_2 = start_time_dict_2[id_user] # we extract the start time for the second use of the appliance for the user under exam
+            start_time_df_3 = start_time_dict_3[id_user] # we extract the start time for the third use of the appliance for the user under exam
+
+            # we create the load profile for the user under exam
+            all_user_load_profile_dict[id_user] = create_single_user_load_profile(start_time_df_1, start_time_df_2, start_time_df_3, num_days, appliances_list)
+
+    #############################################################################
 
     # export dictionary in external file
     # now = datetime.now().strftime("(%Y-%m-%d_%H-%M)")
@@ -483,9 +633,7 @@ def create_appliance_load_profile(start_time_df, num_days):
         appliance_consumption_dict: dictionary with all appliance load profile for each day for the user under exam
     """
 
-    config = yaml.safe_load(open("config.yml", 'r'))
-    filename_appliances_load = config['filename_appliances_load'] 
-    appliances_load_df = pd.read_excel(filename_appliances_load, header = 0, index_col = 0) # we import the load profile for all appliances
+    appliances_load_df = get_load_emulator_inputs()["appliance_load"] # we import the load profile for all appliances
 
     ##########################################################################################################################################
 
@@ -499,36 +647,11 @@ def create_appliance_load_profile(start_time_df, num_days):
 
     for appliance in appliances_list:
 
-        appliance_consumption_df = pd.DataFrame(0.0, index = np.arange(96), columns = np.arange(num_days)) # we create a df with all timesteps on rows and days on columns
-
-        for day in range(num_days):
-            
-            time = start_time_df[appliance][day] # we extract the start time for the selected appliance and day
-
-            #############################################################################
-
-            df_1 = appliances_load_df[appliance].head(96 - time).to_frame() # we extract the load profile for the selected appliance (from the 00:00 to the time)
-            new_rows = pd.DataFrame(0, index=range(time), columns=df_1.columns) # we create a df with zeros for the timesteps from the time to the end of the day
-            df_1 = pd.concat([new_rows, df_1], ignore_index=True) # we concatenate the two df (before zeros and after load profile)
-            
-            #############################################################################
-
-            appliance_consumption_df[day] = appliance_consumption_df[day].to_frame() + df_1.values # we add df_1 to the appliance consumption dataframe
-
-            #############################################################################
-
-            if day>0:
-                appliance_consumption_df[day] = appliance_consumption_df[day].to_frame() + df_2.values # we add df_2 to the appliance consumption dataframe
+        start_time = start_time_df[appliance].to_numpy(dtype = float)[:num_days] # we extract the start time for the selected appliance in all days
 
-            #############################################################################
+        appliance_consumption = superpose_appliance_profile(appliances_load_df[appliance].values, start_time, num_days)
 
-            df_2 = appliances_load_df[appliance].tail(time).to_frame() # we extract the load profile for the selected appliance (from the time to the end of the day)
-            new_rows = pd.DataFrame(0, index=range(96 - time), columns=df_2.columns) # we create a df with zeros for the timesteps from the 00:00 to the time
-            df_2 = pd.concat([df_2, new_rows], ignore_index=True) # we concatenate the two df (load profile and after zeros)
-        
-        #############################################################################
-
-        appliance_consumption_dict[appliance] = appliance_consumption_df # we save the appliance consumption dataframe in the dictionary
+        appliance_consumption_dict[appliance] = pd.DataFrame(appliance_consumption.reshape(num_days, 96).T, index = np.arange(96), columns = np.arange(num_days)) # timesteps on rows and days on columns
     
     return appliance_consumption_dict
 
@@ -597,33 +720,9 @@ def create_single_user_load_profile_df(all_user_load_profile_dict, calendario, f
 
     print(blue("Generate single user load profile df:\n"))
 
-    all_user_df = pd.DataFrame() # we create a df to save all load profile for each days for every users (timesteps on rows and user_id on columns)
-
-    for user in tqdm(all_user_load_profile_dict.keys()):
-
-        df_load_profile_user = all_user_load_profile_dict[user].copy() # we extract the df_load_profile_user for the user under exam
-
-        df = pd.DataFrame() # we create a df to save the load profile for each days for the user under exam (timesteps on rows and a unique column)
-
-        i = 0 # flag first iteration
-
-        for column in df_load_profile_user.columns:
-            
-            df_1 = df_load_profile_user[column].copy() # we extract a colum (corresponding to a single day load profile)
-            
-            # if first iteration
-            if i == 0:
-                df = df_1.copy(deep = False) # we save the first day load profile in the df
-            # if not first iteration
-            else:
-                df = pd.concat([df, df_1], axis = 0, ignore_index = True).copy() # we concatenate the two df (before and after)
-
-            i = 1 # update flag first iteration
-
-        all_user_df[user] = df.values # add df single user load profile to all_user_df
-
-        all_user_df.set_index(calendario['datetime'].values, inplace = True) # set right index with calendar
-        all_user_df.index.names = ['datetime'] # rename index
+    # we put the days of each user one after the other (timesteps on rows and user_id on columns)
+    all_user_df = pd.DataFrame({user: all_user_load_profile_dict[user].values.T.ravel() for user in tqdm(all_user_load_profile_dict.keys())}, 
+                               index = pd.Index(calendario['datetime'].values, name = 'datetime'))
 
     ###################################################################################################################
 
@@ -665,174 +764,51 @@ def create_all_user_appliance_DSM_start_time(DSM_emulated_users_list, num_days,
     """
 
     config = yaml.safe_load(open("config.yml", 'r'))
-    filename_appliance_load = config['filename_appliances_load']
-    appliance_load_df = pd.read_excel(filename_appliance_load, header = 0, index_col = 0, sheet_name = "load_profile") # we import the load profile for all appliances
-    num_timestep_load_profile = (appliance_load_df != 0).sum() # we calculate the number of timesteps for each appliance
-
-    filename_usage_probability = config['filename_usage_probability']
-    usage_probability_DSM_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "daily_usage_probability_DSM") # import of DSM usage probability for dish washer, washing machine, oven, tv e microwaves
-    num_daily_usage_probability_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "num_of_uses") # import daily usage probability with different number of uses
 
-    week_usage_probability_df = pd.read_excel(filename_usage_probability, header = 0, index_col = 0, sheet_name = "week_usage_probability") # import weekly usage probability
-    wm_week_usage_probability_df = week_usage_probability_df.loc['washing_machines'].copy() # extract the weekly usage probability for the washing machine
-
-    boolean_list = [True, False] # list of boolean values
-    time_list = np.arange(0, 96 , 1).tolist() # we create a list with all timesteps
-    num_of_uses_list = np.arange(1, 4 , 1).tolist() # we create a list with all number of uses
+    seed = config.get('random_seed') # master seed of the start times. If not given, a new one is drawn at each run
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("     Random seed: " + str(seed) + "\n")
 
     ##################################################################################################
     
-    # import dictionary from external file with the start time calculated for the reference case (no DSM)
+    # import the start time calculated for the reference case (no DSM) and copy them in memory
     folder = config['foldername_result_emulator']
-    with open(folder + "all_user_appliance_start_time_dict.pkl", 'rb') as fp:
-        start_time_dict = pickle.load(fp)
-        print("     Dictionary appliance start time imported!\n")
-
-    ##################################################################################################
-
-    # split dictionaries in different part (dict_1 are the start time for the first activation; dict_2 are the start time for the second activation, etc.)
-    start_time_dict_1 = start_time_dict[0] # number of uses equal to 1
-    start_time_dict_2 = start_time_dict[1] # number of uses equal to 2
-    start_time_dict_3 = start_time_dict[2] # number of uses equal to 3
-
-    # copy the dictionaries
-    start_time_DSM_dict_1 = start_time_dict_1.copy() # number of uses equal to 1
-    start_time_DSM_dict_2 = start_time_dict_2.copy() # number of uses equal to 2
-    start_time_DSM_dict_3 = start_time_dict_3.copy() # number of uses equal to 3
+    start_time, users_list, appliances_list = load_start_time_store(folder + "all_user_appliance_start_time", mmap_mode = None)
+    print("     Appliance start time imported!\n")
 
     ##################################################################################################
     ##################################################################################################
 
     appliances_flex_list = ['washing_machine', "dish_washer"] # set the list for the flexible appliances; name appliances --> ["washing_machine", "dish_washer", "microwaves", "tv", "oven"]
+    appliances_flex_index = [appliances_list.index(appliance) for appliance in appliances_flex_list]
 
     ##################################################################################################
     ##################################################################################################
 
     for user in tqdm(DSM_emulated_users_list):
 
-        for appliance in appliances_flex_list:
-
-            # we extract a random value for the start time for each appliance for every day for the user under exam and save all values in a specific df
-            start_time_DSM_df_1 = pd.DataFrame(index = np.arange(num_days), columns = appliances_flex_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 1)
-            start_time_DSM_df_2 = pd.DataFrame(index = np.arange(num_days), columns = appliances_flex_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 2)
-            start_time_DSM_df_3 = pd.DataFrame(index = np.arange(num_days), columns = appliances_flex_list) # create an empty df to save the start timestep for each day that we would like to create (num_uses = 3)
-
-            ##################################################################################################
-
-            for day in range(num_days):  
-
-                activation_probability_flag = True # we initialize the flag probability for the daily usage for the selected day and appliance
-
-                # if the appliance is in list (only washing machine for the moment) and the external flag is setted to true, we modifify with a probability the daily activation of the appliance
-                if appliance in ["washing_machine"] and flag_daily_activation:
-
-                    day_type = calendario.iloc[day]['day_flag'] # Working_day; Saturday; Sunday
-                    activation_wm_probability = wm_week_usage_probability_df[day_type]
-                    activation_wm_probability_list = [activation_wm_probability, 100 - activation_wm_probability]
-                    activation_probability_flag = random.choices(boolean_list, weights = activation_wm_probability_list, k = 1)[0] # we randomly choose the start time for the selected appliance
-
-                #############################################################################
-
-                # if the appliance is activated in the selected days
-                if activation_probability_flag:
-                    
-                    num_of_uses_selected = 1
-                
-                    # number of uses equal to 1
-
-                    probability_1 = usage_probability_DSM_df[appliance].tolist() # we import the usage probability for the selected appliance
-
-                    timestep_selected_1 = random.choices(time_list, weights = probability_1, k = 1)[0] # we randomly choose the start time for the selected appliance
-                    start_time_DSM_df_1[appliance][day] = timestep_selected_1 # we save the start time for the selected day
-
-                    ##################################################################################################
-
-                    # if the external flag for the multiple usages during the day is true
-                    if flag_multi_use:
-
-                        num_of_uses = num_daily_usage_probability_df[appliance].tolist() # we import the number of uses probability for the selected appliance
-                        num_of_uses_selected = random.choices(num_of_uses_list, weights = num_of_uses, k = 1)[0] # we randomly choose the number of uses for the selected appliance
-
-                        # number of uses equal to 2
-
-                        if num_of_uses_selected > 1:
-                            
-                            # we set to zero the probability for the selected appliance in the selected day for all timesteps in the range [index - delta, index + delta] in way to consider the previous activations of the appliance
-                            index = timestep_selected_1
-                            delta = num_timestep_load_profile[appliance]
-                            probability_2 = set_values_to_zero(probability_1, index, delta)
+        # we extract a random value for the start time of each flexible appliance for every day, with the DSM usage probability concentrated in the productivity period
+        start_time_DSM = create_appliance_start_time_array(num_days, calendario, flag_daily_activation, flag_multi_use, emulator_rng(seed, user, flag_DSM = True), flag_DSM = True, appliances_list = appliances_flex_list)
 
-                            # we check if the probability is different from zero
-                            if not all(x == 0 for x in probability_2):
-
-                                timestep_selected_2 = random.choices(time_list, weights = probability_2, k = 1)[0] # we randomly choose the start time for the selected appliance
-                                start_time_DSM_df_2[appliance][day] = timestep_selected_2 # we save the start time for the selected day
-
-                                assert (timestep_selected_1 != timestep_selected_2), "The timesteps are equal!"
-                                assert (abs(timestep_selected_1 - timestep_selected_2) > num_timestep_load_profile[appliance]), "The timesteps are equal!"
-                            
-                            else:
-                                warnings.warn("All values in probability are zeros in the case with 2 number of uses!", UserWarning)
-                                print("")
-
-                        #############################################################################
-
-                        # number of uses equal to 3
-
-                        if num_of_uses_selected > 2:
-                            
-                            # we set to zero the probability for the selected appliance in the selected day for all timesteps in the range [index - delta, index + delta] in way to consider the previous activations of the appliance
-                            index = timestep_selected_2 
-                            delta = num_timestep_load_profile[appliance]
-                            probability_3 = set_values_to_zero(probability_2, index, delta)
-
-                            # we check if the probability is different from zero
-                            if not all(x == 0 for x in probability_3):
-
-                                timestep_selected_3 = random.choices(time_list, weights = probability_3, k = 1)[0] # we randomly choose the start time for the selected appliance
-                                start_time_DSM_df_3[appliance][day] = timestep_selected_3 # we save the start time for the selected day
-                            
-                                assert (timestep_selected_1 != timestep_selected_2 or timestep_selected_1 != timestep_selected_3 or timestep_selected_2 != timestep_selected_3), "The timesteps are equal!"
-                                assert (abs(timestep_selected_1 - timestep_selected_2) > num_timestep_load_profile[appliance]  or abs(timestep_selected_1 - timestep_selected_3) > num_timestep_load_profile[appliance]  or abs(timestep_selected_2 - timestep_selected_3) > num_timestep_load_profile[appliance] ), "The timesteps are equal!"
-
-                            else:
-                                warnings.warn("All values in probability are zeros in the case with 3 number of uses!", UserWarning)
-                                print("")
-
-            ##################################################################################################
-
-            # we set the new dataframe with the start time in the DSM case for the selected appliance
-            start_time_DSM_dict_1[user][appliance] = start_time_DSM_df_1[appliance] # number of uses equal to 1
-            start_time_DSM_dict_2[user][appliance] = start_time_DSM_df_2[appliance] # number of uses equal to 2
-            start_time_DSM_dict_3[user][appliance] = start_time_DSM_df_3[appliance] # number of uses equal to 3
+        # we overwrite the start time of the flexible appliances of the user (all uses and days at once)
+        start_time[users_list.index(user), appliances_flex_index] = start_time_DSM
 
     ##################################################################################################
 
-    # create an aggregated dictionary with all the start time for the different number of uses
-    start_time_DSM_dict = {}
-
-    start_time_DSM_dict[0] = start_time_DSM_dict_1 # number of uses equal to 1
-    start_time_DSM_dict[1] = start_time_DSM_dict_2 # number of uses equal to 2
-    start_time_DSM_dict[2] = start_time_DSM_dict_3 # number of uses equal to 3 
-
-    ##################################################################################################
-
-    # export dictionary in external file
-    folder = config["foldername_result_emulator"]
-    # now = datetime.now().strftime("(%Y-%m-%d_%H-%M)")
-    with open(folder + 'DSM_all_user_appliance_start_time_dict.pkl', 'wb') as fp:
-        pickle.dump(start_time_DSM_dict, fp)
+    # export start time in external file
+    save_start_time_store(folder + 'DSM_all_user_appliance_start_time', start_time, users_list, appliances_list)
 
     ##################################################################################################
 
     print("\n     All users start time DSM completed!")
 
-    return (start_time_DSM_dict_1, start_time_DSM_dict_2, start_time_DSM_dict_3)
+    return start_time_store_to_dict(start_time, users_list, appliances_list)
 
 ###################################################################################################################
 ###################################################################################################################
 
-def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dict = False, flag_optDSM = False, flag_all_appliance = True, flag_daily_activation = True, flag_multi_use = True):
+def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dict = False, flag_optDSM = False, flag_all_appliance = True, flag_daily_activation = True, flag_multi_use = True, n_workers = None):
     """Simulate all user load profile.
 
     Inputs:
@@ -844,6 +820,7 @@ def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dic
         flag_all_appliance (bool, optional): if false we use as input file the modified appliance load profile. Defaults to True.
         flag_daily_activation (bool, optional): if false we dont'use a daily usage activation for some specified appliances. Defaults to True.
         flag_multi_use (bool, optional): if true we activate the possibility to have multiple activations for the selected appliances during the day. Defaults to True.
+        n_workers (int, optional): number of worker processes simulating the users in parallel. If None, config['n_workers'] is used (1 = sequential). Defaults to None.
     Outputs:
         all_user_df: This dataframe has an unstacked structure and is created with timestep on rows (entire time range) and users
     """
@@ -880,21 +857,19 @@ def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dic
     if flag_last_dict:
         config = yaml.safe_load(open("config.yml", 'r'))
         folder = config['foldername_result_emulator']
-        with open(folder + 'all_user_appliance_start_time_dict.pkl', 'rb') as fp:
-            output = pickle.load(fp)
-            print("     All appliance start time imported!")
+        output = start_time_store_to_dict(*load_start_time_store(folder + 'all_user_appliance_start_time'))
+        print("     All appliance start time imported!")
     
     # if true we use the optimized simulated appliance start time to create the load profile
     elif flag_optDSM:
         config = yaml.safe_load(open("config.yml", 'r'))
         folder = config['foldername_result_emulator']
-        with open(folder + 'opt_DSM_all_user_appliance_start_time_dict.pkl', 'rb') as fp:
-            output = pickle.load(fp)
-            print("     Optimized all appliance start time imported!")
+        output = start_time_store_to_dict(*load_start_time_store(folder + 'opt_DSM_all_user_appliance_start_time'))
+        print("     Optimized all appliance start time imported!")
     
     # else we create the appliance start time
     else:
-        output = create_all_user_appliance_start_time(emulated_users_list, num_days, calendario, flag_daily_activation, flag_multi_use)
+        output = create_all_user_appliance_start_time(emulated_users_list, num_days, calendario, flag_daily_activation, flag_multi_use, n_workers)
 
     #########################################################################
 
@@ -911,7 +886,7 @@ def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dic
 
     flag_DSM = False
 
-    all_user_load_profile_dict = create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_time_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance)
+    all_user_load_profile_dict = create_all_user_load_profile(start_time_dict_1, start_time_dict_2, start_time_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance, n_workers)
 
     print('\n-----------------------------------------\n')
 
@@ -930,7 +905,7 @@ def load_profile_emulator(emulated_users_list, start_day, end_day, flag_last_dic
 ###################################################################################################################
 ###################################################################################################################
 
-def DSM_load_profile_emulator(emulated_users_list, DSM_emulated_users_list, start_day, end_day, flag_all_appliance = True, flag_daily_activation = True, flag_multi_use = True):
+def DSM_load_profile_emulator(emulated_users_list, DSM_emulated_users_list, start_day, end_day, flag_all_appliance = True, flag_daily_activation = True, flag_multi_use = True, n_workers = None):
     """Simulate all user load profile with DSM (Demand Side Management).
     Inputs:
         emulated_users_list (list): list of users to simulate
@@ -940,6 +915,7 @@ def DSM_load_profile_emulator(emulated_users_list, DSM_emulated_users_list, star
         flag_all_appliance (bool, optional): if false we use as input file the modified appliance load profile. Defaults to True.
         flag_daily_activation (bool, optional): if false we dont'use a daily usage activation for some specified appliances. Defaults to True.
         flag_multi_use (bool, optional): if true we activate the possibility to have multiple activations for the selected appliances during the day. Defaults to True.
+        n_workers (int, optional): number of worker processes creating the user load profiles in parallel. If None, config['n_workers'] is used (1 = sequential). Defaults to None.
     Outputs:
         all_user_df: This dataframe has an unstacked structure and is created with timestep on rows (entire time range) and users
     """
@@ -972,7 +948,7 @@ def DSM_load_profile_emulator(emulated_users_list, DSM_emulated_users_list, star
 
     flag_DSM = True
 
-    all_user_load_profile_dict = create_all_user_load_profile(start_time_DSM_dict_1, start_time_DSM_dict_2, start_time_DSM_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance)
+    all_user_load_profile_dict = create_all_user_load_profile(start_time_DSM_dict_1, start_time_DSM_dict_2, start_time_DSM_dict_3, emulated_users_list, num_days, flag_DSM, flag_all_appliance, n_workers)
 
     print('\n-----------------------------------------\n')
 
@@ -1468,8 +1444,14 @@ def plot_all_day_appliance_load_profile(user, appliance):
 ###################################################################################################################
 ###################################################################################################################
 
-def create_optimal_appliance_start_time_dictionary():
+def create_optimal_appliance_start_time_dictionary(solver = 'ga', create_plot = True, flag_cache = True):
     """Create the optimal appliance start time dictionary for the users that partecipate to DSM in CER.
+
+    Inputs:
+        solver (str, optional): DSM solver used for each day: 'ga' (genetic algorithm), 'greedy' (max overlap with the injected energy) or 'milp' (exact, PuLP/CBC). Defaults to 'ga'.
+        create_plot (bool, optional): if true we export the graphs of the optimized days, after the optimization. Defaults to True.
+        flag_cache (bool, optional): if true we reuse the solutions of the days already optimized with the same injected energy and the same DSM users (opt_DSM_cache.pkl),
+            so that only the days that changed are optimized again. Defaults to True.
     
     Outputs:
         optimal appliance start time dictionary for the users that partecipate to DSM in CER
@@ -1515,31 +1497,30 @@ def create_optimal_appliance_start_time_dictionary():
     ################################################################################################################
     ################################################################################################################
 
-    print("Start optimization of the loads (DSM optimizer)...")
+    print("Start optimization of the loads (DSM optimizer, solver: " + solver + ")...")
 
     # optimzize start time of washing-machines and dishwashers respect to the net injected energy
-    start_time_dict = suppress_printing(ott_year, immissione, n_device, create_plot = True, show_plot = False)
+    folder = config['foldername_result_emulator']
+    cache_file = folder + 'opt_DSM_cache.pkl' if flag_cache else None
+    optimal_start_time, report = suppress_printing(ott_year, immissione, n_device, create_plot = create_plot, show_plot = False, solver = solver, cache_file = cache_file)
 
     print("\nOptimization completed!")
 
-    ################################################################################################################
     ################################################################################################################
 
-    # we export the optimized all users appliance start time dictionary
-    folder = config['foldername_result_emulator']
-    with open(folder + 'opt_DSM_start_time_dict.pkl', 'wb') as file:
-        pickle.dump(start_time_dict, file)
+    # we export the report of the optimization (status of each day) and print a summary
+    report.to_csv(folder + 'opt_DSM_report.csv', index_label = 'day')
 
-    print("\nExport optimal start time dictionary!")
+    print("\n     days optimized: " + str((report['status'] == 'optimized').sum()) + ", reused from cache: " + str((report['status'] == 'cached').sum()) + ", skipped (no injected energy): " + str((report['status'] == 'skipped').sum()) + ", failed: " + str((report['status'] == 'failed').sum()))
+    if (report['status'] == 'failed').any():
+        print(red("     Days not optimized (see opt_DSM_report.csv): " + str(report.index[report['status'] == 'failed'].tolist())))
 
     ################################################################################################################
 
-    # we import the last dictionary created before the optimization 
-    folder = config['foldername_result_emulator']
-    with open(folder + 'all_user_appliance_start_time_dict.pkl', 'rb') as file:  # 'rb' is for reading in binary mode
-        all_user_appliance_start_time_dict = pickle.load(file)
+    # we import the last start time created before the optimization, in memory
+    start_time, users_list, appliances_list = load_start_time_store(folder + 'all_user_appliance_start_time', mmap_mode = None)
 
-    print("\nImport all users appliance start time dictionary!")
+    print("\nImport all users appliance start time!")
 
     ################################################################################################################
 
@@ -1547,30 +1528,22 @@ def create_optimal_appliance_start_time_dictionary():
 
     ################################################################################################################
 
-    # we modify the all user appliance start time dictionary just for the users that partecipate to optimal DSM
+    # we modify the first use start time just for the users that partecipate to optimal DSM, writing all the optimized days at once
     
-    count = 0
-
-    for user in DSM_emulated_users_list:
-
-        user_id = "user_" + str(count)
-        
-        for appliance in ['washing_machine', 'dish_washer']:
+    users_index = np.array([users_list.index(user) for user in DSM_emulated_users_list])[:, None]
+    appliances_index = np.array([appliances_list.index(appliance) for appliance in ['washing_machine', 'dish_washer']])[None, :] # order of the appliances in the optimizer output
 
-            for i in start_time_dict[user_id][appliance].index:
-
-                all_user_appliance_start_time_dict[0][user][appliance].iloc[i] = int(start_time_dict[user_id][appliance].loc[i]) # we modify the start time for the selected appliance
-
-        count+=1
+    num_days = min(optimal_start_time.shape[2], start_time.shape[3])
+    optimal_start_time = optimal_start_time[:, :, :num_days]
+    start_time_DSM = start_time[users_index, appliances_index, 0, :num_days] # (DSM users x appliances x days)
+    start_time[users_index, appliances_index, 0, :num_days] = np.where(optimal_start_time >= 0, optimal_start_time, start_time_DSM) # we keep the start time of the days not optimized
 
     ################################################################################################################
 
-    # we export the optimized all users appliance start time dictionary
-    folder = config['foldername_result_emulator']
-    with open(folder + 'opt_DSM_all_user_appliance_start_time_dict.pkl', 'wb') as file:
-        pickle.dump(all_user_appliance_start_time_dict, file)
+    # we export the optimized all users appliance start time
+    save_start_time_store(folder + 'opt_DSM_all_user_appliance_start_time', start_time, users_list, appliances_list)
 
-    print("**** Optimized all users appliance start time dictionary exported! ****")
+    print("**** Optimized all users appliance start time exported! ****")
 
 ###################################################################################################################
 
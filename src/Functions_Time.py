@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9 # nanoseconds in a day
+
+LEAP_DAY_POLICIES = ['raise', 'feb28', 'mar1'] # what to do with Feb 29 when the target year is not a leap year
+
+##########################################################
+
+def rebase_to_year(ns, year, leap_day = 'raise'):
+
+    """
+    Moves timestamps to another year, keeping month, day and time of the day (vectorized equivalent of t.replace(year=year)).
+
+    Parameters
+    ----------
+    ns : array of int64
+        Timestamps as nanoseconds since 1970-01-01 (NaT allowed)
+    year : int or array of int
+        Target year, scalar or one for each timestamp
+    leap_day : str, optional
+        Policy for Feb 29 when the target year is not a leap year:
+        'raise' (ValueError, as datetime.replace), 'feb28' (moved to Feb 28) or 'mar1' (moved to Mar 1)
+
+    Returns
+    -------
+    array of int64
+        Rebased timestamps as nanoseconds since 1970-01-01
+    """
+
+    if leap_day not in LEAP_DAY_POLICIES:
+        raise ValueError(f"leap_day must be one of {LEAP_DAY_POLICIES}, got {leap_day!r}")
+
+    ns = np.asarray(ns, dtype=np.int64)
+    year = np.broadcast_to(np.asarray(year, dtype=np.int64), ns.shape)
+    nat = ns == np.iinfo(np.int64).min
+
+    days = ns // NS_PER_DAY # giorni dal 1970-01-01 (floor, anche prima del 1970)
+    time_of_day = ns - days * NS_PER_DAY
+
+    date = days.astype('datetime64[D]')
+    month_start = date.astype('datetime64[M]')
+    day_of_month = (date - month_start).astype(np.int64) # 0 = primo giorno del mese
+    month = month_start.astype(np.int64) % 12 # 0 = gennaio
+
+    leap_year = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    feb29 = (month == 1) & (day_of_month == 28) & ~leap_year & ~nat
+
+    if feb29.any():
+        if leap_day == 'raise':
+            raise ValueError(f"day is out of range for month: Feb 29 in non-leap year {year[feb29][0]}")
+        elif leap_day == 'feb28':
+            day_of_month = np.where(feb29, 27, day_of_month)
+        # 'mar1': 28 giorni dopo il 1 febbraio di un anno non bisestile è il 1 marzo
+
+    new_month_start = ((year - 1970) * 12 + month).astype('datetime64[M]')
+    new_days = new_month_start.astype('datetime64[D]').astype(np.int64) + day_of_month
+
+    return np.where(nat, ns, new_days * NS_PER_DAY + time_of_day)
+
+##########################################################
+
+def rebase_index_to_year(index, year, leap_day = 'raise'):
+
+    """
+    Moves a datetime index to another year (see rebase_to_year). Timezone-aware indexes are rebased on their local time.
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+        Datetime index
+    year : int or array of int
+        Target year, scalar or one for each timestamp
+    leap_day : str, optional
+        Policy for Feb 29 when the target year is not a leap year (see rebase_to_year)
+
+    Returns
+    -------
+    pandas.DatetimeIndex
+        Rebased index, with the same name, timezone and unit
+    """
+
+    index = pd.DatetimeIndex(index)
+    local = index.tz_localize(None) if index.tz is not None else index
+
+    ns = rebase_to_year(local.as_unit('ns').asi8, year, leap_day)
+    rebased = pd.DatetimeIndex(ns.view('datetime64[ns]'), name=index.name).as_unit(index.unit)
+
+    if index.tz is not None:
+        rebased = rebased.tz_localize(index.tz)
+
+    return rebased
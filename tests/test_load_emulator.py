@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import src.Functions_Load_Emulator_and_DSM as load_emulator
+
+APPLIANCE_PROFILE = np.r_[1.0, 2.0, 3.0, np.zeros(93)] # 3 timesteps with consumption from the start time
+
+def test_third_use_starts_at_its_own_start_time(monkeypatch):
+    monkeypatch.setattr(load_emulator, "get_load_emulator_inputs", lambda: {"appliance_load": pd.DataFrame({"washing_machine": APPLIANCE_PROFILE})})
+
+    num_days = 3
+    # day 0: three uses at different start times; day 1: one use starting in the last timestep of the day
+    start_time_df_1 = pd.DataFrame({"washing_machine": [10, 95, np.nan]})
+    start_time_df_2 = pd.DataFrame({"washing_machine": [40, np.nan, np.nan]})
+    start_time_df_3 = pd.DataFrame({"washing_machine": [70, np.nan, np.nan]})
+
+    user_consumption_df = load_emulator.create_single_user_load_profile(start_time_df_1, start_time_df_2, start_time_df_3, num_days, ["washing_machine"])
+
+    expected = np.zeros((96, num_days))
+    expected[10:13, 0] = [1, 2, 3] # first use
+    expected[40:43, 0] = [1, 2, 3] # second use
+    expected[70:73, 0] = [1, 2, 3] # third use, not a copy of the second one
+    expected[95, 1] = 1 # activation at the last timestep of day 1...
+    expected[0:2, 2] = [2, 3] # ...carried over to the following day
+
+    np.testing.assert_array_equal(user_consumption_df.to_numpy(), expected)
+
+def test_activation_after_last_day_is_cut():
+    out = load_emulator.superpose_appliance_profile(APPLIANCE_PROFILE, [[np.nan, 95]], num_days = 2)
+
+    expected = np.zeros(2 * 96)
+    expected[-1] = 1 # the rest of the profile is after the end of the simulation
+
+    np.testing.assert_array_equal(out, expected)
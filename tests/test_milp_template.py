@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from HVAC_simulator.functions.milp_model.milp_io import milp_intervals
+from HVAC_simulator.functions.milp_model.milp_template import milp_day_model, milp_update_day
+
+# the MILP model is written with the PuLP 3 API (LpVariable, constraints by name), deprecated in the latest releases
+pytestmark = pytest.mark.filterwarnings("ignore:.*in PuLP 4.0:DeprecationWarning")
+
+N_INTERVALS = 8
+N_DAYS = 3
+N_CONSUMERS = 2
+
+def milp_data(cacer_type, storage, rng):
+    n_total = N_INTERVALS * N_DAYS + 2
+
+    hp_users_list = []
+    for i in range(N_CONSUMERS):
+        building = SimpleNamespace(A=np.full((3, 3), 0.1) + np.eye(3) * 0.5, B=rng.uniform(1e-4, 1e-3, (3, 3)), H_ve=50 + i, H_tr_w=30, H_tr_em=80, U_ground=0.3, A_floor=100)
+        hp_aux = SimpleNamespace(q_heater=2000, pel_fans=50, eta_fans=0.9, pel_pumps=30, eta_pumps=0.8, cp_water=4186, rho_water=1, v_tank=300, t_cut_in=40, t_dead_band=5)
+        hp_users_list.append(SimpleNamespace(building=building, hp_aux=hp_aux))
+
+    # heating and cooling days alternate, so that the coefficients that depend on the mode change from one day to the next
+    mode_pdc = np.array(['heating' if (k // N_INTERVALS) % 2 == 0 or storage else 'cooling' for k in range(n_total)])
+
+    data = dict(cacer_type=cacer_type, sets=milp_intervals(1, N_CONSUMERS, N_INTERVALS), n_intervals=N_INTERVALS, dt=1,
+                e_cast_pv=rng.uniform(0, 3000, n_total), t_ext=rng.uniform(-5, 30, n_total),
+                phi_ia=rng.uniform(0, 300, (n_total, N_CONSUMERS)), phi_st=rng.uniform(0, 300, (n_total, N_CONSUMERS)), phi_m=rng.uniform(0, 300, (n_total, N_CONSUMERS)),
+                hp_users_list=hp_users_list, prosumer_p_contr=[3000], consumer_p_contr=[3000] * N_CONSUMERS, mode_pdc=mode_pdc,
+                M=1e5, T_MAX=1e3, T_MIN=-1e3, INC=0.1, costo_prel=[[0.25] * N_INTERVALS] * N_CONSUMERS, rid=[[0.1] * N_INTERVALS])
+
+    if cacer_type == 'CER':
+        data.update(eta=rng.uniform(2, 4, (n_total, N_CONSUMERS)), q_max=rng.uniform(4000, 6000, (n_total, N_CONSUMERS)), q_min=rng.uniform(500, 1000, (n_total, N_CONSUMERS)),
+                    pe_defrost=rng.uniform(0, 100, (n_total, N_CONSUMERS)), q_crankcase_activation=rng.integers(0, 2, (n_total, N_CONSUMERS)))
+    else:
+        data.update(eta=rng.uniform(2, 4, n_total), q_max=rng.uniform(8000, 12000, n_total), q_min=rng.uniform(1000, 2000, n_total))
+
+    return data
+
+def day_state(storage, rng):
+    state = {'t_start_dayahead': rng.uniform(18, 24, (N_CONSUMERS, 3))}
+    if storage:
+        state.update(t_water_tank_0=rng.uniform(40, 50), k_compressor_status_0=int(rng.integers(0, 2)))
+    return state
+
+def assert_same_model(updated, fresh):
+    assert updated.constraints.keys() == fresh.constraints.keys()
+
+    for name, constraint in fresh.constraints.items():
+        updated_constraint = updated.constraints[name]
+        assert updated_constraint.sense == constraint.sense, name
+        assert updated_constraint.constant == pytest.approx(constraint.constant, rel=1e-12, abs=1e-12), name
+
+        # the template can keep a coefficient set to 0 where the model built from scratch has no term
+        coefficients = {var.name: coef for var, coef in constraint.items() if coef != 0}
+        updated_coefficients = {var.name: coef for var, coef in updated_constraint.items() if coef != 0}
+        assert updated_coefficients.keys() == coefficients.keys(), name
+        for var_name, coef in coefficients.items():
+            assert updated_coefficients[var_name] == pytest.approx(coef, rel=1e-12), (name, var_name)
+
+    assert {var.name: (var.lowBound, var.upBound, var.cat) for var in updated.variables()} == {var.name: (var.lowBound, var.upBound, var.cat) for var in fresh.variables()}
+
+@pytest.mark.parametrize("cacer_type, storage", [('CER', False), ('AUC', False), ('AUC', True)])
+def test_updated_template_equals_fresh_model(cacer_type, storage):
+    rng = np.random.default_rng(0)
+    data = milp_data(cacer_type, storage, rng)
+
+    template = milp_day_model(data, 0, storage=storage, **day_state(storage, rng))
+
+    for day in range(1, N_DAYS):
+        state = day_state(storage, rng)
+
+        milp_update_day(template, data, N_INTERVALS * day, **state)
+        fresh = milp_day_model(data, N_INTERVALS * day, storage=storage, **state)
+
+        assert_same_model(template['opt_model'], fresh['opt_model'])
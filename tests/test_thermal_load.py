@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import HVAC_simulator.functions.thermal_load as thermal_load
+
+N_BUILDINGS = 40 # more than _MIN_BATCH_BUILDINGS, so that without numba the vectorized loop is used
+N_INTERVALS = 96 * 4
+
+def building(rng):
+    # 5R3C model with a 15 min time step, discretized as in BuildingModel
+    b = SimpleNamespace(H_ve=rng.uniform(50, 150), H_tr_w=rng.uniform(20, 60), H_tr_em=rng.uniform(80, 200), U_ground=0.5, A_floor=100.0)
+    H_is, H_ms = 3.45 * 300, 9.1 * 250
+    C_i, C_s, C_m, tau = 3.6e5, 2e6, 2e7, 900
+
+    A = np.zeros((3, 3))
+    A[0, 0], A[0, 1] = -(H_is + b.H_ve) - C_i / tau, H_is
+    A[1, 0], A[1, 1], A[1, 2] = H_is, -(H_is + b.H_tr_w + H_ms) - C_s / tau, H_ms
+    A[2, 1], A[2, 2] = H_ms, -b.H_tr_em - H_ms - C_m / tau
+    A_inv = np.linalg.inv(A)
+
+    b.A = A_inv @ np.diag([-C_i / tau, -C_s / tau, -C_m / tau])
+    b.B = A_inv.copy()
+    return b
+
+@pytest.fixture
+def inputs():
+    rng = np.random.default_rng(0)
+    hours = np.arange(N_INTERVALS) / 4
+
+    # two cold days with heating, then two hot days with cooling
+    t_ext = np.where(hours < 48, 2.0, 30.0) + 6 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 1, N_INTERVALS)
+    heat_on = (hours < 48) & (hours % 24 >= 6)
+    cool_on = (hours >= 48) & (hours % 24 >= 8)
+
+    return dict(buildings = [building(rng) for _ in range(N_BUILDINGS)],
+                t_ext = t_ext,
+                phi_ia = rng.uniform(0, 500, (N_INTERVALS, N_BUILDINGS)),
+                phi_st = rng.uniform(0, 1500, (N_INTERVALS, N_BUILDINGS)),
+                phi_m = rng.uniform(0, 1500, (N_INTERVALS, N_BUILDINGS)),
+                cool_on = cool_on,
+                heat_on = heat_on,
+                t_int_min = rng.uniform(19, 21, N_BUILDINGS),
+                t_int_max = rng.uniform(25, 27, N_BUILDINGS),
+                t_start = rng.uniform(15, 22, (N_BUILDINGS, 3)))
+
+def simulate(monkeypatch, inputs, compiled, min_batch_buildings):
+    if not compiled:
+        monkeypatch.setattr(thermal_load, "njit", None)
+    monkeypatch.setattr(thermal_load, "_MIN_BATCH_BUILDINGS", min_batch_buildings)
+    return thermal_load.thermal_nodes_simulation(**inputs, return_state = True)
+
+def test_python_loops_give_the_same_results(monkeypatch, inputs):
+    t_int, phi_hc_nd_ac, t_end = simulate(monkeypatch, inputs, compiled = False, min_batch_buildings = N_BUILDINGS + 1) # one building at a time
+    batch = simulate(monkeypatch, inputs, compiled = False, min_batch_buildings = N_BUILDINGS) # all the buildings together
+
+    assert (phi_hc_nd_ac > 0).any() and (phi_hc_nd_ac < 0).any() # both heating and cooling are exercised
+    for result, expected in zip(batch, (t_int, phi_hc_nd_ac, t_end)):
+        np.testing.assert_array_equal(result, expected)
+
+@pytest.mark.skipif(thermal_load.njit is None, reason = "numba not installed")
+def test_compiled_loop_gives_the_same_results(monkeypatch, inputs):
+    compiled = simulate(monkeypatch, inputs, compiled = True, min_batch_buildings = N_BUILDINGS)
+    expected = simulate(monkeypatch, inputs, compiled = False, min_batch_buildings = N_BUILDINGS + 1)
+
+    for result, expected in zip(compiled, expected):
+        np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Functions_Time import rebase_index_to_year, rebase_to_year
+
+def random_index(n, unit, tz=None):
+    rng = np.random.default_rng(0)
+    ns = rng.integers(pd.Timestamp("1901-01-01").value, pd.Timestamp("2090-01-01").value, n) # also before 1970
+    index = pd.DatetimeIndex(ns.view("datetime64[ns]"), name="datetime").as_unit(unit)
+    index = index[~((index.month == 2) & (index.day == 29))]
+    return index.tz_localize(tz) if tz is not None else index
+
+@pytest.mark.parametrize("unit", ["ns", "us"])
+@pytest.mark.parametrize("tz", [None, "UTC", "Etc/GMT+2"])
+@pytest.mark.parametrize("year", [1904, 1999, 2000, 2023, 2024, 2100])
+def test_same_as_timestamp_replace(unit, tz, year):
+    index = random_index(2000, unit, tz)
+
+    expected = index.map(lambda t: t.replace(year=year))
+    rebased = rebase_index_to_year(index, year)
+
+    assert rebased.equals(expected)
+    assert (rebased.name, rebased.tz, rebased.unit) == (expected.name, expected.tz, expected.unit)
+
+def test_year_for_each_timestamp():
+    index = pd.date_range("2020-12-31 22:00", periods=4, freq="h")
+
+    rebased = rebase_index_to_year(index, [2030, 2030, 2031, 2031])
+
+    assert list(rebased) == list(pd.to_datetime(["2030-12-31 22:00", "2030-12-31 23:00", "2031-01-01 00:00", "2031-01-01 01:00"]))
+
+def test_leap_day_policies():
+    index = pd.DatetimeIndex(["2024-02-28 23:00", "2024-02-29 00:00", "2024-02-29 23:45", "2024-03-01 00:00"])
+
+    with pytest.raises(ValueError):
+        rebase_index_to_year(index, 2023)
+
+    feb28 = rebase_index_to_year(index, 2023, leap_day="feb28")
+    assert list(feb28) == list(pd.to_datetime(["2023-02-28 23:00", "2023-02-28 00:00", "2023-02-28 23:45", "2023-03-01 00:00"]))
+
+    mar1 = rebase_index_to_year(index, 2023, leap_day="mar1")
+    assert list(mar1) == list(pd.to_datetime(["2023-02-28 23:00", "2023-03-01 00:00", "2023-03-01 23:45", "2023-03-01 00:00"]))
+
+    # Feb 29 is kept in a leap year, whatever the policy
+    assert rebase_index_to_year(index, 2028).equals(index.map(lambda t: t.replace(year=2028)))
+
+    with pytest.raises(ValueError):
+        rebase_index_to_year(index, 2028, leap_day="drop")
+
+def test_nat():
+    index = pd.DatetimeIndex(["2021-05-01 12:00", None, "1960-02-28 06:00"])
+
+    rebased = rebase_index_to_year(index, 2023)
+
+    assert rebased[1] is pd.NaT
+    assert list(rebased[[0, 2]]) == list(pd.to_datetime(["2023-05-01 12:00", "2023-02-28 06:00"]))
+
+    ns = rebase_to_year(index.as_unit("ns").asi8, 2023)
+    assert ns.dtype == np.int64 and ns[1] == index.as_unit("ns").asi8[1]